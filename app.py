@@ -23,9 +23,12 @@ APP_DIR = os.path.dirname(os.path.abspath(__file__))
 if APP_DIR not in sys.path:
     sys.path.insert(0, APP_DIR)
 
-from views.home_page     import render_home
-from views.analysis_page import render_analysis
+# Chỉ import module nhẹ ở đây — views (và analysis_engine → groq, pydub,
+# joblib, numpy) được import lười ở router để home hiển thị nhanh nhất
 from src.upload_handler  import clear_upload_state
+from src.http_sidecar    import start_sidecar
+from src.import_profile  import timed_import
+from src.warmup          import start_warmup
 
 # ── Cấu hình trang ────────────────────────────────────────────────────────
 st.set_page_config(
@@ -45,6 +48,11 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# ── Endpoint /metrics (chỉ chạy khi đặt SIDECAR_PORT, 1 lần mỗi process) ──
+start_sidecar()
+# ── Warm-up nền (model, matcher từ khoá, Groq client) — không chặn trang ──
+start_warmup()
+
 # ── Session state mặc định ────────────────────────────────────────────────
 st.session_state.setdefault("page", "home")
 st.session_state.setdefault("filename", "")
@@ -52,14 +60,22 @@ st.session_state.setdefault("filename", "")
 # ── Xử lý go_home query param (từ nút Home trong analysis page) ───────────
 if st.query_params.get("go_home") == "1":
     st.query_params.clear()
+    audio_hash = st.session_state.get("audio_sha256")
+    if audio_hash and "src.job_runner" in sys.modules:
+        # Huỷ job nền đang chạy → ngừng gọi STT, không ghi đè session_state
+        # (job_runner chưa từng import → chắc chắn không có job nào)
+        from src.job_runner import get_job_runner, get_session_id
+        get_job_runner().cancel(get_session_id(), audio_hash)
     clear_upload_state()
-    for key in ("chunk_scores", "diem_nghi_ngo", "keywords_count"):
+    for key in ("chunk_scores", "diem_nghi_ngo", "keywords_count", "result_hash",
+                "advice_task", "llm_advice", "refine_job", "refine_version",
+                "job_poll", "partial_dashboard", "analysis_failed", "followup_shown"):
         st.session_state.pop(key, None)
     st.session_state["page"] = "home"
     st.rerun()
 
 # ── Router ────────────────────────────────────────────────────────────────
 if st.session_state.page == "home":
-    render_home()
+    timed_import("views.home_page").render_home()
 else:
-    render_analysis()
\ No newline at end of file
+    timed_import("views.analysis_page").render_analysis()
\ No newline at end of file
@@ -0,0 +1,37 @@
+"""
+serve.py – Khởi động server có warm-up
+────────────────────────────────────────────────────────────────
+    python serve.py [tham số streamlit ...]
+  ≡ streamlit run app.py [tham số ...], nhưng sidecar (/metrics, /ready)
+    và warm-up nền (model, matcher từ khoá, Groq client) chạy NGAY khi
+    process khởi động — không đợi session đầu tiên mở trang.
+
+Streamlit chạy app.py trong cùng process → app.py gọi lại
+start_sidecar() / start_warmup() chỉ là no-op.
+────────────────────────────────────────────────────────────────
+"""
+
+import os
+import sys
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+from src.http_sidecar import start_sidecar
+from src.warmup       import start_warmup
+
+
+if __name__ == "__main__":
+    start_sidecar()
+    start_warmup()
+
+    from streamlit.web import cli as stcli
+    sys.argv = ["streamlit", "run", os.path.join(APP_DIR, "app.py"), *sys.argv[1:]]
+    sys.exit(stcli.main())
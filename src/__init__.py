@@ -4,11 +4,32 @@ Source modules cho Phan tich Lua dao Demo.
 
 Modules:
 - analysis_engine:       Pipeline chinh audio -> ket qua
+- streaming_analysis:    Phan tich streaming PCM cho cuoc goi dang dien ra
+- job_runner:            Chay analysis trong thread nen, poll tien do
+- singleflight:          Lock file gop phan tich trung file giua nhieu process
+- cancellation:          CancelToken huy pipeline giua chung
+- deadline:              Deadline end-to-end + ngan sach tung stage (STT/cham diem/LLM)
+- result_store:          Luu ket qua da phan tich vao SQLite (theo sha256 audio)
 - multilabel_predictor:  Multi-label Classification
 - llm_client:            Trich xuat tu khoa va giai thich ket qua
+- prompt_builder:        Chon doan transcript nghi ngo nhat cho LLM theo ngan sach token
+- llm_cache:             Cache phan hoi LLM tren SQLite (TTL + gioi han dung luong)
+- llm_advice:            Loi khuyen LLM chay nen song song STT (ban tam -> chinh thuc)
 - speech_to_text:        Chuyen doi audio thanh text (Groq Whisper)
+- request_hedging:       Hedge request STT cham hon p95 (ngan sach ban sao moi phien)
+- mock_groq:             Server gia lap Groq API (do tre, 429/5xx) + benchmark offline
+- http_pool:             HTTP client dung chung (pool + keep-alive) cho moi Groq client
 - chart_builder:         Ve SVG line chart tu chunk_scores
 - loading_screen:        Loading overlay toan man hinh
 - upload_handler:        Validate va xu ly file upload
-- assets_loader:         Load icons/decorations duoi dang base64
+- assets_loader:         URL icons/decorations (static co hash, fallback base64)
+- progress_bus:          Tien do job (throttle, chi gui field doi) + ETA
+- page_template:         Template HTML bien dich san (minify 1 lan, chi thay slot)
+- render_cache:          LRU cache HTML fragment theo hash ket qua
+- result_api:            API JSON chunk theo trang (tooltip chart, ...) qua sidecar
+- media_api:             Audio upload qua sidecar theo sha256 (HTTP Range, cache immutable)
+- warmup:                Warm-up nen model/tu khoa/Groq client, co /ready
+- import_profile:        Do chi phi import luc khoi dong (cold start)
+- metrics:               Span do thoi gian tung stage + xuat Prometheus
+- http_sidecar:          HTTP server phu (/metrics, ...) chay cung process
 """
@@ -17,8 +17,19 @@ Mỗi ChunkResult là dict:
         "diem":       0.72,      # diem_nghi_ngo từ multilabel_predictor (0-1)
         "text":       "...",     # transcript câu thoại
         "keywords":   [...],     # keywords trích xuất
+        "spans":      [[s, e, k], ...],  # vị trí ký tự mỗi lần khớp trong text; k = chỉ số trong keywords
         "loai":       [...],     # loai_du_doan từ model
+        "timed_out":  True,      # CHỈ có khi chunk bị bỏ vì hết ngân sách STT (xem deadline.py)
+        "error":      "...",     # CHỈ có khi STT chunk lỗi (401 / 429 / 5xx / timeout ...)
+        "degraded":   True,      # CHỈ có khi chunk chấm rule-based vì hết ngân sách "scoring"
     }
+
+Chunk "error" / "timed_out" (không biết nội dung — KHÔNG phải "an toàn")
+không được tính vào diem_nghi_ngo tổng khi còn chunk khác; chunk "degraded"
+vẫn có điểm rule-based thật nên vẫn được tính — xem verdict_scores().
+
+Kết quả có chunk "timed_out" / "error" / "degraded" hoặc có báo cáo
+"deadline" là kết quả KHÔNG đầy đủ → không được lưu vào result_store.
 """
 
 from __future__ import annotations
@@ -29,10 +40,14 @@ import re
 from collections import Counter
 import streamlit as st
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 
+from .cancellation import CancelToken
+from .deadline import STAGE_TIMEOUT, Deadline, budget_stage
+from .metrics import METRICS_TIMING_BREAKDOWN, inc, span, stage_timeline, timed, write_metrics_file
 from .speech_to_text import DEFAULT_CHUNK_DURATION, get_stt_client
 from .multilabel_predictor import MultilabelPredictor, get_multilabel_predictor
+from .render_cache import content_hash
 
 
 _predefined_keywords: List[str] | None = None
@@ -57,25 +72,89 @@ def _load_predefined_keywords() -> List[str]:
     return _predefined_keywords
 
 
+# Khoá đánh dấu node kết thúc 1 từ khoá trong trie (giá trị = chỉ số trong predefined)
+_TRIE_END = ""
+
+_keyword_trie: Dict | None = None
+
+
+def _is_word_char(ch: str) -> bool:
+    """Cùng lớp ký tự với regex cũ [a-zA-ZÀ-ỹ] dùng làm word-boundary."""
+    return "a" <= ch <= "z" or "A" <= ch <= "Z" or "\u00c0" <= ch <= "\u1ef9"
+
+
+def _get_keyword_trie() -> Dict:
+    """
+    Trie ký tự (lowercase) của toàn bộ từ khoá — build 1 lần mỗi process
+    thay cho ~1.4k regex mỗi lần quét (vượt cache 512 pattern của module re).
+    """
+    global _keyword_trie
+    if _keyword_trie is None:
+        trie: Dict = {}
+        for idx, kw in enumerate(_load_predefined_keywords()):
+            node = trie
+            for ch in kw.lower():
+                node = node.setdefault(ch, {})
+            # Trùng dạng lowercase → giữ từ khoá đứng trước (như `seen` cũ)
+            node.setdefault(_TRIE_END, idx)
+        _keyword_trie = trie
+    return _keyword_trie
+
+
+def _lower_same_length(text: str) -> str:
+    """text.lower() nhưng giữ nguyên độ dài (vd 'İ' → 2 ký tự) để span khớp text gốc."""
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return "".join(ch.lower() if len(ch.lower()) == 1 else ch for ch in text)
+
+
+@timed("keyword_match")
+def _match_keywords_with_spans(text: str) -> Tuple[List[str], List[List[int]]]:
+    """
+    Quét text 1 lượt qua trie → (keywords, spans).
+
+    keywords: từ khoá CÓ TRONG keywords.json, theo thứ tự danh sách định sẵn
+              (cụm dài trước) — giống hệt kết quả regex word-boundary cũ.
+    spans:    [[start, end, k], ...] mọi lần khớp (kể cả chồng nhau, vd
+              "chuyển tiền" và "tiền"), k = chỉ số từ khoá trong keywords.
+    """
+    if not text:
+        return [], []
+    predefined = _load_predefined_keywords()
+    trie = _get_keyword_trie()
+    text_lower = _lower_same_length(text)
+    n = len(text_lower)
+
+    hits: List[Tuple[int, int, int]] = []
+    for i in range(n):
+        # Word-boundary trái: không khớp giữa chừng một từ (vd: "an" trong "khan")
+        if i and _is_word_char(text_lower[i - 1]):
+            continue
+        node = trie
+        j = i
+        while j < n:
+            node = node.get(text_lower[j])
+            if node is None:
+                break
+            j += 1
+            idx = node.get(_TRIE_END)
+            if idx is not None and (j == n or not _is_word_char(text_lower[j])):
+                hits.append((i, j, idx))
+
+    order = sorted({idx for _, _, idx in hits})
+    position = {idx: k for k, idx in enumerate(order)}
+    keywords = [predefined[idx] for idx in order]
+    spans = [[start, end, position[idx]] for start, end, idx in hits]
+    return keywords, spans
+
+
 def _match_keywords_from_text(text: str) -> List[str]:
     """
     Quét text và trả về những từ khoá CÓ TRONG danh sách keywords.json.
     Dùng word-boundary matching (không khớp giữa chừng một từ).
     """
-    if not text:
-        return []
-    predefined = _load_predefined_keywords()
-    text_lower = text.lower()
-    matched: List[str] = []
-    seen: set = set()
-    for kw in predefined:
-        kw_lower = kw.lower()
-        # Dùng regex word-boundary để tránh khớp sai (vd: "an" trong "khan")
-        pattern = r'(?<![a-zA-ZÀ-ỹ])' + re.escape(kw_lower) + r'(?![a-zA-ZÀ-ỹ])'
-        if re.search(pattern, text_lower) and kw_lower not in seen:
-            matched.append(kw)
-            seen.add(kw_lower)
-    return matched
+    return _match_keywords_with_spans(text)[0]
 
 
 # ── Helpers ─────────────────────────────────────────────────────────────────
@@ -86,7 +165,7 @@ def _fmt_time(sec: float) -> str:
     return f"{sec // 60:02d}:{sec % 60:02d}"
 
 
-def _score_chunk(text: str, predictor: MultilabelPredictor) -> Dict:
+def _score_chunk(text: str, predictor: MultilabelPredictor, deadline: Optional[Deadline] = None) -> Dict:
     """
     Từ transcript text của 1 chunk → trả về keywords + diem + loai.
     Nếu text rỗng → trả về diem = 0.
@@ -95,12 +174,15 @@ def _score_chunk(text: str, predictor: MultilabelPredictor) -> Dict:
     với danh sách từ khoá định sẵn trong config/keywords.json —
     KHÔNG dùng LLM để tránh trích từ khoá ngoài danh sách.
     LLM vẫn được gọi để lấy signals/scammer_quote (phục vụ giải thích).
+    Hết ngân sách "scoring" của deadline → predictor chấm bằng rule-based.
     """
     if not text or not text.strip():
-        return {"keywords": [], "diem": 0.0, "loai": []}
+        return {"keywords": [], "spans": [], "diem": 0.0, "loai": []}
+    degraded = False
 
     # 1. Trích từ khoá bằng quét trực tiếp danh sách định sẵn (keywords.json)
-    keywords: List[str] = _match_keywords_from_text(text)
+    #    + ghi lại vị trí khớp để view highlight không phải regex lại
+    keywords, spans = _match_keywords_with_spans(text)
 
     # 2. Multilabel predict → diem_nghi_ngo
     # Chuẩn hoá từ khoá về dạng gạch dưới TRƯỚC khi đưa vào TF-IDF
@@ -109,36 +191,198 @@ def _score_chunk(text: str, predictor: MultilabelPredictor) -> Dict:
         kw_text = " ".join(
             re.sub(r'\s+', '_', kw.lower().strip()) for kw in keywords
         )
-        pred = predictor.predict(text=kw_text, keywords=keywords)
+        with budget_stage(deadline, "scoring"):
+            pred = predictor.predict(text=kw_text, keywords=keywords, deadline=deadline)
         diem  = float(pred.get("diem_nghi_ngo", 0.0))
         loai  = pred.get("loai_du_doan", [])
+        degraded = bool(pred.get("degraded"))
     except Exception:
         diem = 0.0
         loai = []
 
-    return {"keywords": keywords, "diem": diem, "loai": loai}
+    scored = {"keywords": keywords, "spans": spans, "diem": diem, "loai": loai}
+    if degraded:
+        scored["degraded"] = True
+    return scored
 
 
 # ── API chính ────────────────────────────────────────────────────────────────
 
-def run_analysis(
+def _chunk_result(start_sec: float, end_sec: float, text: str, scored: Dict) -> Dict:
+    """Đóng gói 1 ChunkResult theo đúng format mô tả ở đầu module."""
+    chunk = {
+        "time_label": _fmt_time(start_sec),
+        "time_end":   _fmt_time(end_sec),
+        "time_range": f"{_fmt_time(start_sec)}-{_fmt_time(end_sec)}",
+        "diem":       scored["diem"],
+        "text":       text,
+        "keywords":   scored["keywords"],
+        "spans":      scored.get("spans", []),
+        "loai":       scored["loai"],
+    }
+    if scored.get("degraded"):
+        chunk["degraded"] = True
+    return chunk
+
+
+def chunk_result_from_text(
+    start_sec: float,
+    end_sec: float,
+    text: Optional[str],
+    predictor: Optional[MultilabelPredictor] = None,
+    deadline: Optional[Deadline] = None,
+) -> Dict:
+    """
+    ChunkResult cho 1 đoạn transcript: trích keywords + chấm điểm.
+    Dùng chung cho mọi nguồn audio (file upload, streaming_analysis).
+    """
+    predictor = predictor or get_multilabel_predictor()
+    return _chunk_result(start_sec, end_sec, text or "", _score_chunk(text, predictor, deadline))
+
+
+def missing_chunk_result(start_sec: float, end_sec: float, error: str) -> Dict:
+    """
+    ChunkResult cho chunk không có transcript (diem = 0): error == STAGE_TIMEOUT
+    → "timed_out" (hết ngân sách, không gửi STT), còn lại → "error" (STT lỗi).
+    """
+    empty = {"keywords": [], "diem": 0.0, "loai": []}
+    if error == STAGE_TIMEOUT:
+        chunk = _chunk_result(start_sec, end_sec, "[Hết thời gian xử lý]", empty)
+        chunk["timed_out"] = True
+    else:
+        chunk = _chunk_result(start_sec, end_sec, f"[Lỗi chunk: {error}]", empty)
+        chunk["error"] = error
+    return chunk
+
+
+def aggregate_score(scores: List[float]) -> float:
+    """
+    Tính diem_nghi_ngo tổng thể: Weighted Temporal Aggregation.
+
+    Công thức:
+      S = α·max(sᵢ) + β·Σ(wᵢ·sᵢ)/Σwᵢ + γ·|{i: sᵢ≥θ}|/N
+    Trong đó:
+      α=0.40  → đỉnh nguy hiểm cao nhất (chunk kẻ lừa đảo đang "chốt")
+      β=0.40  → mật độ trung bình có trọng số vị trí (Gaussian, tâm giữa)
+      γ=0.20  → tỷ lệ chunk vượt ngưỡng (chống 1 chunk outlier kéo điểm giả)
+      θ=0.40  → nhất quán với NGUONG_CANH_BAO của MultilabelPredictor
+      wᵢ     → phân phối Gaussian: chunk giữa cuộc gọi có trọng số cao hơn
+    """
+    if not scores:
+        return 0.0
+
+    ALPHA, BETA, GAMMA = 0.40, 0.40, 0.20
+    THETA = 0.40   # khớp NGUONG_CANH_BAO trong multilabel_predictor.py
+
+    N = len(scores)
+
+    # Trọng số Gaussian theo vị trí: wᵢ = 1 + 0.5·exp(-(i-μ)²/(2σ²))
+    mu    = (N - 1) / 2.0
+    sigma = max(N / 4.0, 0.5)   # tránh chia 0 khi N=1
+    weights = [
+        1.0 + 0.5 * math.exp(-((i - mu) ** 2) / (2 * sigma ** 2))
+        for i in range(N)
+    ]
+
+    s_max      = max(scores)
+    w_sum      = sum(weights)
+    s_weighted = sum(w * s for w, s in zip(weights, scores)) / w_sum
+    coverage   = sum(1 for s in scores if s >= THETA) / N
+
+    diem_tong = ALPHA * s_max + BETA * s_weighted + GAMMA * coverage
+    return min(diem_tong, 1.0)   # clip về [0, 1]
+
+
+def verdict_scores(chunk_scores: List[Dict]) -> List[float]:
+    """
+    diem của các chunk dùng cho kết luận tổng: bỏ chunk STT lỗi / quá hạn
+    (diem 0 chỉ vì không có transcript) khi còn chunk khác. Chunk "degraded"
+    (rule-based vì hết ngân sách "scoring") vẫn được tính — bỏ đi thì phần
+    nội dung đáng ngờ nhất có thể biến mất khỏi kết luận.
+    """
+    scores = [
+        c["diem"] for c in chunk_scores
+        if not (c.get("error") or c.get("timed_out"))
+    ]
+    return scores if scores else [c["diem"] for c in chunk_scores]
+
+
+# Nhãn kết luận theo diem_nghi_ngo tổng — cùng ngưỡng với badge trên trang analysis
+VERDICT_LABELS = ((0.60, "Dấu hiệu lừa đảo"), (0.30, "Nghi ngờ"), (0.0, "An toàn"))
+
+
+def verdict_label(score: float) -> str:
+    return next(label for threshold, label in VERDICT_LABELS if score >= threshold)
+
+
+def count_keywords(chunk_scores: List[Dict], top_n: int = 20) -> List:
+    """Tổng hợp keywords toàn cuộc gọi với tần suất (dùng cho kw-card)."""
+    all_kw: List[str] = []
+    for c in chunk_scores:
+        all_kw.extend(c["keywords"])
+    # Sắp xếp theo tần suất giảm dần, giữ tối đa top_n từ
+    return Counter(all_kw).most_common(top_n)
+
+
+def analyze_audio(
     audio_bytes: bytes,
     filename: str,
     chunk_duration: int = DEFAULT_CHUNK_DURATION,
     progress_callback=None,
-) -> List[Dict]:
+    chunk_callback=None,
+    cancel_token: Optional[CancelToken] = None,
+    deadline: Optional[Deadline] = None,
+    quality: Optional[str] = None,
+) -> Dict:
     """
-    Chạy toàn bộ pipeline phân tích cho 1 file audio.
+    Chạy toàn bộ pipeline cho 1 file audio — KHÔNG đụng tới session_state.
+
+    Dùng được từ thread nền (job_runner) vì không cần ScriptRunContext.
 
     Args:
-        audio_bytes:       Raw bytes của file audio (từ session_state["uploaded_file"].getvalue())
+        audio_bytes:       Raw bytes của file audio
         filename:          Tên file gốc (để detect format cho pydub)
         chunk_duration:    Độ dài mỗi chunk tính bằng giây (mặc định 10s)
-        progress_callback: Hàm nhận (done, total) để cập nhật progress bar (optional)
+        progress_callback: Hàm nhận (done, total) để cập nhật progress (optional)
+        chunk_callback:    Hàm nhận ChunkResult ngay khi 1 chunk xong (optional)
+        cancel_token:      Token huỷ — kiểm tra giữa các chunk (optional)
+        deadline:          Deadline + ngân sách từng stage (mặc định: Deadline() mới,
+                           cấu hình theo ANALYSIS_DEADLINE_S / ANALYSIS_BUDGET_*_S)
+        quality:           Mức chất lượng STT — "fast" cho bản xem trước (xem refine_audio)
 
     Returns:
-        List[ChunkResult] — đã được lưu vào st.session_state["chunk_scores"]
+        Dict {"chunk_scores", "diem_nghi_ngo", "keywords_count"}
+        (+ "deadline": báo cáo từng stage khi có stage vượt ngân sách)
+        (+ "quality": "fast" khi là bản xem trước — không được lưu vào result_store)
+
+    Raises:
+        AnalysisCancelled: token bị huỷ trước khi pipeline chạy xong
     """
+    if deadline is None:
+        deadline = Deadline()
+    with stage_timeline() as timeline:
+        result = _analyze_audio(
+            audio_bytes, filename, chunk_duration, progress_callback, chunk_callback, cancel_token,
+            deadline, quality,
+        )
+    inc("analyses_total")
+    if quality == "fast":
+        result["quality"] = "fast"
+    report = deadline.report()
+    overruns = [name for name, stage in report["stages"].items() if stage["overrun"]]
+    if overruns:
+        result["deadline"] = report
+        print(f"[WARN] {filename}: vuot ngan sach {', '.join(overruns)} sau {report['elapsed_s']:.1f}s")
+    write_metrics_file()
+    if METRICS_TIMING_BREAKDOWN:
+        result["timings"] = timeline.as_dict()
+        print(f"[TIMING] {filename}: {result['timings']}")
+    return result
+
+
+def _analyze_audio(
+    audio_bytes, filename, chunk_duration, progress_callback, chunk_callback, cancel_token, deadline, quality
+) -> Dict:
     stt       = get_stt_client()
     predictor = get_multilabel_predictor()
 
@@ -153,84 +397,145 @@ def run_analysis(
 
     done = 0
     for chunk_idx, start_sec, end_sec, text, error in stt.transcribe_chunks_from_bytes(
-        audio_bytes, filename, chunk_duration
+        audio_bytes, filename, chunk_duration, cancel_token=cancel_token, deadline=deadline, quality=quality
     ):
+        if cancel_token is not None and cancel_token.cancelled:
+            continue   # generator tự dừng ở vòng kế tiếp và đếm request tiết kiệm được
         done += 1
+
+        if error:
+            # Hết ngân sách STT / chunk lỗi → vẫn hiện trên timeline, diem = 0
+            chunk = missing_chunk_result(start_sec, end_sec, error)
+        else:
+            chunk = chunk_result_from_text(start_sec, end_sec, text, predictor, deadline)
+
+        chunk_scores.append(chunk)
+        if chunk_callback:
+            chunk_callback(chunk)
         if progress_callback:
             progress_callback(done, total_chunks)
 
-        if error:
-            # Chunk lỗi → ghi nhận nhưng diem = 0
-            chunk_scores.append({
-                "time_label": _fmt_time(start_sec),
-                "time_end":   _fmt_time(end_sec),
-                "time_range": f"{_fmt_time(start_sec)}-{_fmt_time(end_sec)}",
-                "diem":       0.0,
-                "text":       f"[Lỗi chunk: {error}]",
-                "keywords":   [],
-                "loai":       [],
-            })
-            continue
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled()
 
-        scored = _score_chunk(text, predictor)
+    with span("aggregation"):
+        return _result_from_chunks(chunk_scores)
 
-        chunk_scores.append({
-            "time_label": _fmt_time(start_sec),
-            "time_end":   _fmt_time(end_sec),
-            "time_range": f"{_fmt_time(start_sec)}-{_fmt_time(end_sec)}",
-            "diem":       scored["diem"],
-            "text":       text or "",
-            "keywords":   scored["keywords"],
-            "loai":       scored["loai"],
-        })
 
-    # Cache kết quả vào session_state để không chạy lại khi re-render
-    st.session_state["chunk_scores"] = chunk_scores
-
-    # ── Tính diem_nghi_ngo tổng thể: Weighted Temporal Aggregation ────────
-    # Công thức:
-    #   S = α·max(sᵢ) + β·Σ(wᵢ·sᵢ)/Σwᵢ + γ·|{i: sᵢ≥θ}|/N
-    # Trong đó:
-    #   α=0.40  → đỉnh nguy hiểm cao nhất (chunk kẻ lừa đảo đang "chốt")
-    #   β=0.40  → mật độ trung bình có trọng số vị trí (Gaussian, tâm giữa)
-    #   γ=0.20  → tỷ lệ chunk vượt ngưỡng (chống 1 chunk outlier kéo điểm giả)
-    #   θ=0.40  → nhất quán với NGUONG_CANH_BAO của MultilabelPredictor
-    #   wᵢ     → phân phối Gaussian: chunk giữa cuộc gọi có trọng số cao hơn
-    if chunk_scores:
-        ALPHA, BETA, GAMMA = 0.40, 0.40, 0.20
-        THETA = 0.40   # khớp NGUONG_CANH_BAO trong multilabel_predictor.py
-
-        scores = [c["diem"] for c in chunk_scores]
-        N = len(scores)
-
-        # Trọng số Gaussian theo vị trí: wᵢ = 1 + 0.5·exp(-(i-μ)²/(2σ²))
-        mu    = (N - 1) / 2.0
-        sigma = max(N / 4.0, 0.5)   # tránh chia 0 khi N=1
-        weights = [
-            1.0 + 0.5 * math.exp(-((i - mu) ** 2) / (2 * sigma ** 2))
-            for i in range(N)
-        ]
-
-        s_max      = max(scores)
-        w_sum      = sum(weights)
-        s_weighted = sum(w * s for w, s in zip(weights, scores)) / w_sum
-        coverage   = sum(1 for s in scores if s >= THETA) / N
-
-        diem_tong = ALPHA * s_max + BETA * s_weighted + GAMMA * coverage
-        diem_tong = min(diem_tong, 1.0)   # clip về [0, 1]
-    else:
-        diem_tong = 0.0
-    st.session_state["diem_nghi_ngo"] = diem_tong
+def refine_audio(
+    audio_bytes: bytes,
+    filename: str,
+    result: Dict,
+    chunk_duration: int = DEFAULT_CHUNK_DURATION,
+    update_callback=None,
+    cancel_token: Optional[CancelToken] = None,
+    deadline: Optional[Deadline] = None,
+) -> Dict:
+    """
+    Lượt 2 của chế độ 2 lượt: transcribe lại bằng model chính xác rồi chấm lại.
 
-    # Tổng hợp keywords toàn cuộc gọi với tần suất (dùng cho kw-card)
-    all_kw: List[str] = []
-    for c in chunk_scores:
-        all_kw.extend(c["keywords"])
-    kw_counter = Counter(all_kw)
-    # Sắp xếp theo tần suất giảm dần, giữ tối đa 20 từ
-    st.session_state["keywords_count"] = kw_counter.most_common(20)
+    Chỉ chunk có keywords hoặc diem khác bản xem trước mới bị thay (text đổi
+    nhưng kết quả chấm như cũ → giữ nguyên, view không phải vẽ lại).
+    Chunk lỗi / hết thời gian ở lượt 2 → giữ kết quả lượt 1, và kết quả vẫn
+    mang quality="fast" (chưa được model chính xác kiểm tra hết).
 
-    return chunk_scores
+    Args:
+        result:          Kết quả analyze_audio(quality="fast")
+        update_callback: Hàm nhận Dict kết quả mới mỗi khi 1 chunk thay đổi (optional)
+
+    Returns:
+        Dict kết quả mới + "refine": {"checked", "changed", "verdict_changed"}
+
+    Raises:
+        AnalysisCancelled: token bị huỷ giữa chừng
+    """
+    stt       = get_stt_client()
+    predictor = get_multilabel_predictor()
+    chunks    = list(result["chunk_scores"])
+    checked = changed = 0
+
+    with span("refine"):
+        for chunk_idx, start_sec, end_sec, text, error in stt.transcribe_chunks_from_bytes(
+            audio_bytes, filename, chunk_duration, cancel_token=cancel_token, deadline=deadline,
+            quality="accurate",
+        ):
+            if cancel_token is not None and cancel_token.cancelled:
+                continue
+            if error or chunk_idx >= len(chunks):
+                continue
+            checked += 1
+            old = chunks[chunk_idx]
+            new = chunk_result_from_text(start_sec, end_sec, text, predictor, deadline)
+            if new["keywords"] == old["keywords"] and abs(new["diem"] - old["diem"]) < 1e-6:
+                continue
+            changed += 1
+            chunks[chunk_idx] = new
+            if update_callback:
+                update_callback(_result_from_chunks(chunks))
+
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled()
+
+    refined = _result_from_chunks(chunks)
+    if checked < len(chunks):
+        refined["quality"] = "fast"
+    if result.get("deadline"):
+        refined["deadline"] = result["deadline"]   # lượt 1 đã vượt ngân sách → vẫn là kết quả không đầy đủ
+    refined["refine"] = {
+        "checked":         checked,
+        "changed":         changed,
+        "verdict_changed": verdict_label(refined["diem_nghi_ngo"]) != verdict_label(result["diem_nghi_ngo"]),
+    }
+    inc("stt_refine_chunks_total", changed, result="changed")
+    inc("stt_refine_chunks_total", checked - changed, result="unchanged")
+    inc("stt_refine_verdicts_total", changed="true" if refined["refine"]["verdict_changed"] else "false")
+    write_metrics_file()
+    return refined
+
+
+def _result_from_chunks(chunk_scores: List[Dict]) -> Dict:
+    return {
+        "chunk_scores":   list(chunk_scores),
+        "diem_nghi_ngo":  aggregate_score(verdict_scores(chunk_scores)),
+        "keywords_count": count_keywords(chunk_scores),
+    }
+
+
+def store_result_in_session(result: Dict) -> None:
+    """Ghi kết quả analyze_audio() vào session_state để các view đọc lại."""
+    st.session_state["chunk_scores"]   = result["chunk_scores"]
+    st.session_state["diem_nghi_ngo"]  = result["diem_nghi_ngo"]
+    st.session_state["keywords_count"] = result["keywords_count"]
+    # Hash kết quả — key cho cache HTML của trang analysis
+    st.session_state["result_hash"]    = content_hash(
+        result["chunk_scores"], result["diem_nghi_ngo"], result["keywords_count"]
+    )
+
+
+def run_analysis(
+    audio_bytes: bytes,
+    filename: str,
+    chunk_duration: int = DEFAULT_CHUNK_DURATION,
+    progress_callback=None,
+    deadline: Optional[Deadline] = None,
+) -> List[Dict]:
+    """
+    Chạy toàn bộ pipeline phân tích cho 1 file audio (đồng bộ, trong script run).
+
+    Args:
+        audio_bytes:       Raw bytes của file audio (từ session_state["uploaded_file"].getvalue())
+        filename:          Tên file gốc (để detect format cho pydub)
+        chunk_duration:    Độ dài mỗi chunk tính bằng giây (mặc định 10s)
+        progress_callback: Hàm nhận (done, total) để cập nhật progress bar (optional)
+        deadline:          Deadline + ngân sách từng stage (optional, xem analyze_audio)
+
+    Returns:
+        List[ChunkResult] — đã được lưu vào st.session_state["chunk_scores"]
+    """
+    result = analyze_audio(audio_bytes, filename, chunk_duration, progress_callback, deadline=deadline)
+    # Cache kết quả vào session_state để không chạy lại khi re-render
+    store_result_in_session(result)
+    return result["chunk_scores"]
 
 
 def get_chunk_scores() -> List[Dict]:
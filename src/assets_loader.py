@@ -1,20 +1,36 @@
 """
 src/assets_loader.py
 ────────────────────────────────────────────────────────────────
-Load icon và deco assets dưới dạng base64 data URI
-để nhúng trực tiếp vào HTML (tránh lỗi đường dẫn tương đối).
+Trả về URL cho icon và deco assets để nhúng vào HTML.
+
+Sidecar HTTP đang chạy (SIDECAR_PORT) → URL tĩnh có hash nội dung:
+    /static/deco_green.3f2a9c1b7e4d.png
+    Cache-Control: public, max-age=31536000, immutable
+  → trình duyệt tải mỗi file đúng 1 lần; đổi file = đổi hash = URL mới.
+
+Không có sidecar → fallback base64 data URI nhúng thẳng vào HTML
+(như trước — tránh lỗi đường dẫn tương đối, nhưng không cache được).
 ────────────────────────────────────────────────────────────────
 """
 
 import base64
+import hashlib
 import os
 
+from .http_sidecar import public_url, register_route, send_bytes
+from .metrics import inc
+
 # Thư mục assets ngang cấp với src/
 # src/assets_loader.py → lên 1 cấp → project root → vào assets/
 ASSETS_DIR = os.path.join(os.path.dirname(__file__), "..", "assets")
 
+_STATIC_PREFIX = "/static/"
+_STATIC_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
 # Cache module-level: mỗi file chỉ đọc disk 1 lần per process
 _cache: dict = {}
+# Tên file có hash → (bytes, mime, etag) phục vụ qua sidecar
+_static_files: dict = {}
 
 
 def _load_b64(filepath: str, mime: str) -> str:
@@ -26,13 +42,52 @@ def _load_b64(filepath: str, mime: str) -> str:
     return _cache[filepath]
 
 
+def _static_name(filepath: str, mime: str) -> str:
+    """Đăng ký file với route /static/, trả về tên có hash nội dung."""
+    key = ("static", filepath)
+    if key not in _cache:
+        with open(filepath, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        stem, ext = os.path.splitext(os.path.basename(filepath))
+        name = f"{stem}.{digest}{ext}"
+        _static_files[name] = (data, mime, f'"{digest}"')
+        _cache[key] = name
+    return _cache[key]
+
+
+def _asset_url(filepath: str, mime: str) -> str:
+    url = public_url(_STATIC_PREFIX + _static_name(filepath, mime))
+    return url or _load_b64(filepath, mime)
+
+
 def icon(filename: str, mime: str = "image/svg+xml") -> str:
-    """Load icon từ thư mục assets/icons/."""
+    """URL icon từ thư mục assets/icons/."""
     path = os.path.join(ASSETS_DIR, "icons", filename)
-    return _load_b64(path, mime)
+    return _asset_url(path, mime)
 
 
 def deco(filename: str, mime: str = "image/png") -> str:
-    """Load decoration image từ thư mục assets/decorations/."""
+    """URL decoration image từ thư mục assets/decorations/."""
     path = os.path.join(ASSETS_DIR, "decorations", filename)
-    return _load_b64(path, mime)
\ No newline at end of file
+    return _asset_url(path, mime)
+
+
+def _static_route(req) -> None:
+    name = req.path.split("?", 1)[0][len(_STATIC_PREFIX):]
+    entry = _static_files.get(name)
+    if entry is None:
+        send_bytes(req, b"not found", "text/plain", status=404)
+        return
+    data, mime, etag = entry
+    headers = {"Cache-Control": _STATIC_CACHE_CONTROL, "ETag": etag}
+    if req.headers.get("If-None-Match") == etag:
+        inc("static_requests_total", status="not_modified")
+        send_bytes(req, b"", mime, status=304, headers=headers)
+        return
+    inc("static_requests_total", status="ok")
+    inc("static_bytes_sent_total", len(data))
+    send_bytes(req, data, mime, headers=headers)
+
+
+register_route(_STATIC_PREFIX, _static_route)
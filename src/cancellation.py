@@ -0,0 +1,44 @@
+# src/cancellation.py
+"""
+Cancellation token cho pipeline phân tích (hợp tác — cooperative).
+
+Script thread (nút Home / upload file khác) gọi token.cancel();
+worker thread kiểm tra token giữa các chunk và dừng sớm:
+không gửi thêm request STT, giải phóng audio đã decode.
+
+Giới hạn: request Whisper ĐANG bay không huỷ được giữa chừng (httpx đồng
+bộ, dùng chung pool kết nối) — sau khi bấm Home vẫn có thể tốn tối đa
+1 request / job (≤ STT_REQUEST_TIMEOUT_S). Bản sao hedge chưa gửi thì bị bỏ.
+"""
+
+from __future__ import annotations
+
+import threading
+
+
+class AnalysisCancelled(Exception):
+    """Pipeline bị huỷ giữa chừng — kết quả dở dang phải bỏ đi."""
+
+
+class CancelToken:
+    """Cờ huỷ dùng chung giữa script thread và worker thread."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason = ""
+
+    def cancel(self, reason: str = "") -> None:
+        self.reason = reason
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise AnalysisCancelled(self.reason or "cancelled")
+
+    def wait(self, timeout: float) -> bool:
+        """Ngủ tối đa timeout giây, thức dậy ngay khi bị huỷ. Trả về True nếu đã huỷ."""
+        return self._event.wait(timeout)
@@ -9,11 +9,23 @@ Màu sắc:
 
 Kích thước chart cố định vừa với trend-card (width 849px, height 216px):
   padding: 20px title → chart area W=760, H=130
+
+Cuộc gọi dài (hàng nghìn chunk) được downsample bằng LTTB
+(Largest-Triangle-Three-Buckets) xuống tối đa CHART_MAX_POINTS điểm;
+mọi chunk >= 0.60 (Lừa đảo) luôn được vẽ. Mỗi điểm vẽ đại diện cho 1
+bucket chunk gốc — tooltip độ phân giải gốc của bucket được fetch lazy
+qua data_url (src/result_api.py) khi hover.
+
+Cấu hình qua biến môi trường:
+    CHART_MAX_POINTS   số điểm tối đa vẽ trên chart (mặc định 240)
 """
 
 from __future__ import annotations
-from typing import List, Dict
+from typing import List, Dict, Optional
 import json
+import os
+
+from .metrics import set_gauge, timed
 
 
 # ── Hằng số layout ──────────────────────────────────────────────────────────
@@ -24,6 +36,9 @@ PAD_RIGHT = 12
 PAD_TOP   = 10
 PAD_BOT   = 28     # padding dưới (chỗ label thời gian trục X)
 
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "240"))
+DANGER_THRESHOLD = 0.60   # chunk từ ngưỡng này trở lên không bao giờ bị downsample bỏ
+
 # Màu theo ngưỡng
 def _point_color(diem: float) -> str:
     if diem < 0.30:
@@ -38,24 +53,103 @@ def _segment_gradient_id(idx: int) -> str:
 
 
 # ── Helpers tọa độ ───────────────────────────────────────────────────────────
-def _coords(chunk_scores: List[Dict]):
-    """Tính tọa độ SVG (x, y) cho mỗi điểm."""
+def _coords(chunk_scores: List[Dict], indices: Optional[List[int]] = None):
+    """Tính tọa độ SVG (x, y) cho các điểm indices (mặc định: mọi chunk).
+
+    Trục X theo chỉ số chunk gốc → downsample không làm lệch thời gian.
+    """
     n = len(chunk_scores)
     if n == 0:
         return []
+    if indices is None:
+        indices = range(n)
     draw_w = CHART_W - PAD_LEFT - PAD_RIGHT
     draw_h = CHART_H - PAD_TOP  - PAD_BOT
     coords = []
-    for i, c in enumerate(chunk_scores):
+    for i in indices:
         x = PAD_LEFT + (i / max(n - 1, 1)) * draw_w
-        y = PAD_TOP  + (1.0 - c["diem"]) * draw_h
+        y = PAD_TOP  + (1.0 - chunk_scores[i]["diem"]) * draw_h
         coords.append((x, y))
     return coords
 
 
+def _label_seconds(label: str) -> int:
+    """"MM:SS" (phút có thể > 59) → số giây; nhãn lạ → 0."""
+    try:
+        mins, secs = label.split(":")
+        return int(mins) * 60 + int(secs)
+    except ValueError:
+        return 0
+
+
+# ── Downsampling ─────────────────────────────────────────────────────────────
+def _lttb_indices(values: List[float], threshold: int) -> List[int]:
+    """
+    Largest-Triangle-Three-Buckets: chọn threshold chỉ số giữ hình dạng đường.
+    Luôn giữ điểm đầu + cuối; mỗi bucket giữa chọn điểm tạo tam giác lớn nhất
+    với điểm đã chọn trước đó và trung bình bucket kế tiếp.
+    """
+    n = len(values)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    every = (n - 2) / (threshold - 2)
+    picked = [0]
+    a = 0
+    for b in range(threshold - 2):
+        # Trung bình bucket kế tiếp
+        avg_lo = int((b + 1) * every) + 1
+        avg_hi = min(int((b + 2) * every) + 1, n)
+        avg_x = (avg_lo + avg_hi - 1) / 2
+        avg_y = sum(values[avg_lo:avg_hi]) / (avg_hi - avg_lo)
+
+        # Điểm trong bucket hiện tại tạo tam giác lớn nhất
+        lo = int(b * every) + 1
+        hi = int((b + 1) * every) + 1
+        ax, ay = a, values[a]
+        best, best_area = lo, -1.0
+        for i in range(lo, hi):
+            area = abs((ax - avg_x) * (values[i] - ay) - (ax - i) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = i, area
+        picked.append(best)
+        a = best
+    picked.append(n - 1)
+    return picked
+
+
+def downsample_indices(chunk_scores: List[Dict], max_points: int = CHART_MAX_POINTS) -> List[int]:
+    """
+    Chỉ số chunk sẽ vẽ (tăng dần): LTTB trên phần ngân sách còn lại
+    + toàn bộ chunk >= DANGER_THRESHOLD (có thể vượt max_points nếu nhiều chunk đỏ).
+    """
+    n = len(chunk_scores)
+    if n <= max_points:
+        return list(range(n))
+    danger = {i for i, c in enumerate(chunk_scores) if c["diem"] >= DANGER_THRESHOLD}
+    budget = max(3, max_points - len(danger))
+    keep = set(_lttb_indices([c["diem"] for c in chunk_scores], budget)) | danger
+    return sorted(keep)
+
+
+def _bucket_bounds(indices: List[int], n: int) -> List[tuple]:
+    """Mỗi điểm vẽ đại diện cho [lo, hi) chunk gốc gần nó nhất."""
+    bounds = []
+    for j, i in enumerate(indices):
+        lo = 0 if j == 0 else (indices[j - 1] + i + 1) // 2
+        hi = n if j == len(indices) - 1 else (i + indices[j + 1] + 1) // 2
+        bounds.append((lo, hi))
+    return bounds
+
+
 # ── Builder chính ────────────────────────────────────────────────────────────
 
-def build_line_chart_html(chunk_scores: List[Dict]) -> str:
+@timed("html_chart")
+def build_line_chart_html(
+    chunk_scores: List[Dict],
+    data_url: str = "",
+    max_points: int = CHART_MAX_POINTS,
+) -> str:
     """
     Nhận chunk_scores (List[Dict]) → trả về HTML string chứa SVG line chart.
 
@@ -64,6 +158,12 @@ def build_line_chart_html(chunk_scores: List[Dict]) -> str:
         time_label : str "MM:SS"
         text       : str  (câu thoại — hiện trong tooltip)
         loai       : List[str]
+
+    data_url: endpoint trả chunk gốc theo ?lo=&hi= (src/result_api.py);
+              rỗng → tooltip chỉ hiện dữ liệu của điểm đại diện.
+
+    Click 1 điểm → phát event "lc-jump" trên window với
+    detail = {idx: chỉ số chunk gốc, t: giây bắt đầu} để transcript / audio nhảy tới.
     """
 
     # ── Placeholder khi chưa có data ────────────────────────────────────────
@@ -74,9 +174,14 @@ def build_line_chart_html(chunk_scores: List[Dict]) -> str:
             'Chua co du lieu — dang phan tich...</div>'
         )
 
-    coords     = _coords(chunk_scores)
-    n          = len(chunk_scores)
+    n_total    = len(chunk_scores)
+    drawn      = downsample_indices(chunk_scores, max_points)
+    bounds     = _bucket_bounds(drawn, n_total)
+    coords     = _coords(chunk_scores, drawn)
+    n          = len(drawn)
     draw_h     = CHART_H - PAD_TOP - PAD_BOT
+    set_gauge("chart_points_drawn", n)
+    set_gauge("chart_points_total", n_total)
 
     # ── Tính ngưỡng Y ───────────────────────────────────────────────────────
     y_30 = PAD_TOP + (1.0 - 0.30) * draw_h
@@ -94,7 +199,7 @@ def build_line_chart_html(chunk_scores: List[Dict]) -> str:
     # Vẽ fill polygon trước (mờ), sau đó vẽ các đoạn polyline màu đậm theo ngưỡng
     segment_lines = []
     for i in range(n - 1):
-        c0, c1 = chunk_scores[i], chunk_scores[i + 1]
+        c0, c1 = chunk_scores[drawn[i]], chunk_scores[drawn[i + 1]]
         avg_diem = (c0["diem"] + c1["diem"]) / 2
         color    = _point_color(avg_diem)
         x0, y0   = coords[i]
@@ -109,16 +214,17 @@ def build_line_chart_html(chunk_scores: List[Dict]) -> str:
     dots_svg_parts = []
     # Chuẩn bị data JSON nhúng vào script để JS đọc
     tooltip_data = []
-    for i, (c, (x, y)) in enumerate(zip(chunk_scores, coords)):
+    for i, (idx, (x, y)) in enumerate(zip(drawn, coords)):
+        c         = chunk_scores[idx]
         color     = _point_color(c["diem"])
         pct_label = f"{c['diem']:.0%}"
         loai_str  = ", ".join(c.get("loai", [])) or "—"
-        # Text câu thoại cắt ngắn 80 ký tự
-        text_short = (c.get("text") or "")[:80].replace('"', '&quot;')
+        # Text câu thoại cắt ngắn 80 ký tự (escape HTML phía JS bằng esc())
+        text_short = (c.get("text") or "")[:80]
         dots_svg_parts.append(
             f'<circle class="lc-dot" cx="{x:.1f}" cy="{y:.1f}" r="4" '
-            f'fill="{color}" stroke="#fff" stroke-width="1.5" '
-            f'data-idx="{i}"/>'
+            f'fill="{color}" stroke="#fff" stroke-width="1.5" style="cursor:pointer;" '
+            f'data-idx="{i}" data-chunk="{idx}" data-t="{_label_seconds(c.get("time_label", ""))}"/>'
         )
         tooltip_data.append({
             "time":  c.get("time_range", c.get("time_label", "")),
@@ -126,9 +232,11 @@ def build_line_chart_html(chunk_scores: List[Dict]) -> str:
             "loai":  loai_str,
             "text":  text_short,
             "color": color,
+            "lo":    bounds[i][0],
+            "hi":    bounds[i][1],
         })
     dots_svg = "\n    ".join(dots_svg_parts)
-    tooltip_json = json.dumps(tooltip_data, ensure_ascii=False)
+    tooltip_json = json.dumps(tooltip_data, ensure_ascii=False).replace("</", "<\\/")
 
     # ── Label trục Y (0%, 30%, 60%, 100%) ────────────────────────────────────
     y_labels = []
@@ -146,7 +254,7 @@ def build_line_chart_html(chunk_scores: List[Dict]) -> str:
     step = max(1, n // 8)
     for i in range(0, n, step):
         x, _ = coords[i]
-        lbl  = chunk_scores[i].get("time_label", "")
+        lbl  = chunk_scores[drawn[i]].get("time_label", "")
         x_labels.append(
             f'<text x="{x:.1f}" y="{CHART_H - 4}" '
             f'text-anchor="middle" font-size="10" fill="#9b9797" font-family="Lato,sans-serif">'
@@ -219,21 +327,59 @@ def build_line_chart_html(chunk_scores: List[Dict]) -> str:
     js = f"""<script>
 (function() {{
   var DATA = {tooltip_json};
+  var SRC  = {json.dumps(data_url)};
+  var FULL = {{}};   // bucket idx → chunk gốc đã fetch
   var tip  = document.getElementById('lc-tooltip');
+  function esc(s) {{
+    return String(s || '').replace(/[&<>"]/g, function(ch) {{
+      return {{'&':'&amp;','<':'&lt;','>':'&gt;','"':'&quot;'}}[ch];
+    }});
+  }}
+  function colorOf(v) {{ return v < 0.30 ? '#22c55e' : (v < 0.60 ? '#f59e0b' : '#ef4444'); }}
+  function bucketHtml(d, chunks) {{
+    // Top 3 chunk điểm cao nhất trong bucket (độ phân giải gốc)
+    var top = chunks.slice().sort(function(a, b) {{ return b.diem - a.diem; }}).slice(0, 3);
+    return '<div style="color:#94a3b8;font-size:11px;margin-top:4px;">' +
+        (d.hi - d.lo) + ' đoạn trong vùng này</div>' +
+      top.map(function(c) {{
+        return '<div style="margin-top:4px;font-size:11px;">' +
+          '<span style="font-weight:700;color:' + colorOf(c.diem) + ';">' +
+            esc(c.time_range) + ' ' + Math.round(c.diem * 100) + '%</span> ' +
+          '<span style="color:#e2e8f0;">' + esc((c.text || '').slice(0, 80)) + '</span></div>';
+      }}).join('');
+  }}
+  function render(j) {{
+    var d = DATA[j];
+    tip.innerHTML =
+      '<div style="font-weight:700;color:' + esc(d.color) + ';margin-bottom:3px;">' +
+        esc(d.time) + ' &nbsp;' + esc(d.pct) +
+      '</div>' +
+      (d.loai !== '—' ? '<div style="color:#94a3b8;font-size:11px;">' + esc(d.loai) + '</div>' : '') +
+      (FULL[j] ? bucketHtml(d, FULL[j])
+               : (d.text ? '<div style="margin-top:4px;color:#e2e8f0;font-size:11px;">' + esc(d.text) + '</div>' : ''));
+    tip.setAttribute('data-idx', j);
+  }}
   document.querySelectorAll('.lc-dot').forEach(function(dot) {{
     dot.addEventListener('mouseenter', function(e) {{
-      var d   = DATA[parseInt(dot.getAttribute('data-idx'))];
+      var j   = parseInt(dot.getAttribute('data-idx'));
+      var d   = DATA[j];
       var svg = document.getElementById('lc-svg');
       var pt  = svg.createSVGPoint();
       pt.x = parseFloat(dot.getAttribute('cx'));
       pt.y = parseFloat(dot.getAttribute('cy'));
       var pos = pt.matrixTransform(svg.getScreenCTM());
-      tip.innerHTML =
-        '<div style="font-weight:700;color:' + d.color + ';margin-bottom:3px;">' +
-          d.time + ' &nbsp;' + d.pct +
-        '</div>' +
-        (d.loai !== '—' ? '<div style="color:#94a3b8;font-size:11px;">' + d.loai + '</div>' : '') +
-        (d.text ? '<div style="margin-top:4px;color:#e2e8f0;font-size:11px;">' + d.text + '</div>' : '');
+      render(j);
+      // Điểm đại diện nhiều chunk → fetch chunk gốc của bucket (1 lần)
+      if (SRC && d.hi - d.lo > 1 && !FULL[j]) {{
+        fetch(SRC + '?lo=' + d.lo + '&hi=' + d.hi)
+          .then(function(r) {{ return r.ok ? r.json() : null; }})
+          .then(function(p) {{
+            if (!p) return;
+            FULL[j] = p.items;
+            if (tip.style.display === 'block' && tip.getAttribute('data-idx') == j) render(j);
+          }})
+          .catch(function() {{}});
+      }}
       tip.style.display = 'block';
       var tipW = tip.offsetWidth, tipH = tip.offsetHeight;
       var left = pos.x + 14;
@@ -247,6 +393,12 @@ def build_line_chart_html(chunk_scores: List[Dict]) -> str:
     dot.addEventListener('mouseleave', function() {{
       tip.style.display = 'none';
     }});
+    dot.addEventListener('click', function() {{
+      window.dispatchEvent(new CustomEvent('lc-jump', {{detail: {{
+        idx: parseInt(dot.getAttribute('data-chunk')),
+        t:   parseFloat(dot.getAttribute('data-t'))
+      }}}}));
+    }});
     dot.addEventListener('touchstart', function(e) {{
       e.preventDefault();
       dot.dispatchEvent(new MouseEvent('mouseenter'));
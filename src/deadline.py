@@ -0,0 +1,174 @@
+# src/deadline.py
+"""
+Deadline end-to-end + ngân sách thời gian theo stage cho 1 lần phân tích.
+
+Không có deadline, 1 phản hồi Groq chậm treo cả pipeline (STT tuần tự
+từng chunk, LLM không timeout). Mỗi job tạo 1 Deadline và truyền xuyên
+suốt: analyze_audio → SpeechToText → MultilabelPredictor → LLMClient.
+
+    deadline = Deadline()                        # bắt đầu đếm từ lúc tạo (start() → đếm lại)
+    with deadline.stage("stt"):
+        client.create(..., timeout=deadline.timeout("stt", cap=STT_REQUEST_TIMEOUT_S))
+    deadline.expired("stt")                      # hết ngân sách stage / hết deadline tổng
+
+Ngân sách stage = tổng thời gian THỰC SỰ nằm trong stage đó (cộng dồn các
+lần with stage(...)), luôn bị chặn thêm bởi deadline tổng.
+Hết ngân sách → mỗi stage tự xuống cấp thay vì chờ:
+    stt      chunk còn lại không gửi nữa, đánh dấu "timed_out" (diem = 0)
+    scoring  bỏ ML model, chấm bằng rule-based (đếm từ khoá)
+    llm      bỏ lời giải thích LLM, dùng lời khuyên rule-based
+
+Metrics:
+    deadline_overruns_total{stage}             số lần phân tích vượt ngân sách stage
+    deadline_degraded_total{stage}             số chunk / lượt gọi phải xuống cấp
+
+Ngân sách là TUỲ CHỌN (mặc định tắt): cuộc gọi dài hợp lệ không bị cắt
+ngầm. Khi bật, kết quả có stage vượt ngân sách không được lưu vào
+result_store (xem result_store.incomplete_reason).
+
+Cấu hình qua biến môi trường ("0" = không giới hạn):
+    ANALYSIS_DEADLINE_S        deadline tổng mỗi lần phân tích (mặc định 0)
+    ANALYSIS_BUDGET_STT_S      ngân sách STT                   (mặc định 0)
+    ANALYSIS_BUDGET_SCORING_S  ngân sách chấm điểm             (mặc định 0)
+    ANALYSIS_BUDGET_LLM_S      ngân sách lời giải thích LLM    (mặc định 0)
+    STT_REQUEST_TIMEOUT_S      timeout tối đa 1 request STT    (mặc định 30, luôn áp dụng)
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterator, Optional
+
+from .metrics import inc
+
+
+ANALYSIS_DEADLINE_S   = float(os.getenv("ANALYSIS_DEADLINE_S", "0"))
+STT_REQUEST_TIMEOUT_S = float(os.getenv("STT_REQUEST_TIMEOUT_S", "30"))
+
+STAGE_BUDGETS: Dict[str, float] = {
+    "stt":     float(os.getenv("ANALYSIS_BUDGET_STT_S", "0")),
+    "scoring": float(os.getenv("ANALYSIS_BUDGET_SCORING_S", "0")),
+    "llm":     float(os.getenv("ANALYSIS_BUDGET_LLM_S", "0")),
+}
+
+# Giá trị `error` của chunk bị bỏ vì hết ngân sách STT (phân biệt với lỗi API thật)
+STAGE_TIMEOUT = "deadline exceeded"
+
+
+class DeadlineExceeded(Exception):
+    """Stage hết ngân sách thời gian — caller phải xuống cấp thay vì chờ tiếp."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"{stage}: {STAGE_TIMEOUT}")
+        self.stage = stage
+
+
+class Deadline:
+    """Deadline tổng + ngân sách từng stage, dùng chung giữa các thread của 1 job."""
+
+    def __init__(self, total_s: float = ANALYSIS_DEADLINE_S, budgets: Optional[Dict[str, float]] = None):
+        self.total_s = total_s
+        self.budgets = dict(STAGE_BUDGETS if budgets is None else budgets)
+        self._started = time.perf_counter()
+        self._spent: Dict[str, float] = {}
+        self._overrun: Dict[str, bool] = {}
+        self._degraded: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Đếm lại deadline tổng từ bây giờ (job bắt đầu chạy, không tính lúc chờ hàng đợi)."""
+        self._started = time.perf_counter()
+
+    # ── Đọc ngân sách ────────────────────────────────────────────────────
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._started
+
+    def remaining(self, stage: Optional[str] = None) -> Optional[float]:
+        """Giây còn lại (của stage, chặn bởi deadline tổng). None = không giới hạn."""
+        limits = []
+        if self.total_s > 0:
+            limits.append(self.total_s - self.elapsed())
+        budget = self.budgets.get(stage, 0) if stage else 0
+        if budget > 0:
+            with self._lock:
+                limits.append(budget - self._spent.get(stage, 0.0))
+        return max(0.0, min(limits)) if limits else None
+
+    def expired(self, stage: Optional[str] = None) -> bool:
+        remaining = self.remaining(stage)
+        return remaining is not None and remaining <= 0
+
+    def timeout(self, stage: str, cap: float = 0) -> Optional[float]:
+        """Timeout cho 1 request của stage: min(phần còn lại, cap). None = không giới hạn."""
+        remaining = self.remaining(stage)
+        if cap > 0:
+            remaining = cap if remaining is None else min(remaining, cap)
+        return remaining
+
+    def check(self, stage: str, cap: float = 0) -> Optional[float]:
+        """Như timeout() nhưng raise DeadlineExceeded khi không còn thời gian."""
+        remaining = self.timeout(stage, cap)
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded(stage)
+        return remaining
+
+    # ── Ghi nhận ─────────────────────────────────────────────────────────
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Cộng thời gian khối lệnh vào ngân sách stage `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._charge(name, time.perf_counter() - start)
+
+    def _charge(self, stage: str, seconds: float) -> None:
+        budget = self.budgets.get(stage, 0)
+        with self._lock:
+            spent = self._spent[stage] = self._spent.get(stage, 0.0) + seconds
+        if budget > 0 and spent > budget:
+            self._mark_overrun(stage, f"{spent:.1f}s > {budget:g}s")
+
+    def _mark_overrun(self, stage: str, detail: str) -> None:
+        with self._lock:
+            if self._overrun.get(stage):
+                return
+            self._overrun[stage] = True
+        inc("deadline_overruns_total", stage=stage)
+        print(f"[WARN] Deadline: stage {stage} vuot ngan sach ({detail})")
+
+    def degrade(self, stage: str, action: str) -> None:
+        """Ghi nhận stage phải xuống cấp vì hết thời gian (vượt ngân sách stage hoặc deadline tổng)."""
+        with self._lock:
+            count = self._degraded[stage] = self._degraded.get(stage, 0) + 1
+        inc("deadline_degraded_total", stage=stage)
+        self._mark_overrun(stage, f"sau {self.elapsed():.1f}s")
+        if count == 1:
+            print(f"[WARN] Deadline: {stage} -> {action}")
+
+    def report(self) -> Dict:
+        """{"elapsed_s", "total_s", "stages": {stage: {budget_s, spent_s, overrun, degraded}}}"""
+        with self._lock:
+            names = set(self.budgets) | set(self._spent) | set(self._degraded)
+            stages = {
+                name: {
+                    "budget_s": self.budgets.get(name, 0),
+                    "spent_s":  round(self._spent.get(name, 0.0), 3),
+                    "overrun":  bool(self._overrun.get(name)),
+                    "degraded": self._degraded.get(name, 0),
+                }
+                for name in sorted(names)
+            }
+        return {"elapsed_s": round(self.elapsed(), 3), "total_s": self.total_s, "stages": stages}
+
+    def degraded(self) -> bool:
+        with self._lock:
+            return bool(self._degraded)
+
+
+def budget_stage(deadline: Optional[Deadline], name: str):
+    """deadline.stage(name), hoặc không làm gì khi caller không truyền deadline."""
+    return deadline.stage(name) if deadline is not None else nullcontext()
@@ -0,0 +1,141 @@
+# src/http_pool.py
+"""
+HTTP client dùng chung (connection pool + keep-alive) cho mọi Groq client.
+
+Mặc định mỗi Groq(...) tự tạo 1 httpx.Client riêng → STT và LLM không
+dùng chung kết nối, và mỗi lần mở kết nối mới phải trả lại TCP + TLS
+handshake (~2-3 RTT) trước khi gửi được byte audio nào.
+
+    from .http_pool import get_http_client
+    Groq(api_key=..., http_client=get_http_client())
+
+Metrics (đo qua trace extension của httpcore, theo từng request):
+    groq_http_requests_total
+    groq_http_handshakes_total{kind="tcp|tls"}   số kết nối mới thực sự mở
+    groq_http_handshake_seconds{kind}            thời gian connect / TLS
+    groq_http_connection_reuse_ratio             1 − tcp_handshakes / requests
+    groq_http_ttfb_seconds                       gửi xong request → nhận header phản hồi
+
+Cấu hình qua biến môi trường:
+    GROQ_POOL_MAX_CONNECTIONS    số kết nối tối đa        (mặc định 16)
+    GROQ_POOL_MAX_KEEPALIVE      số kết nối giữ sẵn      (mặc định 8)
+    GROQ_POOL_KEEPALIVE_S        giữ kết nối rảnh (giây) (mặc định 60)
+    GROQ_CONNECT_TIMEOUT_S       timeout connect          (mặc định 5, phải > 0)
+    GROQ_READ_TIMEOUT_S          timeout đọc phản hồi     (mặc định 60, phải > 0)
+    GROQ_HTTP2                   "1" → bật HTTP/2 (cần gói h2)
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from .metrics import inc, observe, set_gauge
+
+
+def _timeout_env(name: str, default: str) -> float:
+    """
+    Timeout (giây) từ biến môi trường, kiểm tra ngay lúc load: "0" ở đây KHÔNG
+    có nghĩa "không giới hạn" — mọi request sẽ timeout tức thì, còn
+    deadline.check(cap=0) lại coi như không chặn → cấu hình sai phải lỗi sớm.
+    """
+    value = float(os.getenv(name, default))
+    if not value > 0:
+        raise ValueError(f"{name} phai > 0 (dang la {value:g})")
+    return value
+
+
+GROQ_POOL_MAX_CONNECTIONS = int(os.getenv("GROQ_POOL_MAX_CONNECTIONS", "16"))
+GROQ_POOL_MAX_KEEPALIVE   = int(os.getenv("GROQ_POOL_MAX_KEEPALIVE", "8"))
+GROQ_POOL_KEEPALIVE_S     = float(os.getenv("GROQ_POOL_KEEPALIVE_S", "60"))
+GROQ_CONNECT_TIMEOUT_S    = _timeout_env("GROQ_CONNECT_TIMEOUT_S", "5")
+GROQ_READ_TIMEOUT_S       = _timeout_env("GROQ_READ_TIMEOUT_S", "60")
+GROQ_HTTP2                = os.getenv("GROQ_HTTP2", "0") == "1"
+
+# Sự kiện httpcore → nhãn handshake
+_HANDSHAKES = {"connection.connect_tcp": "tcp", "connection.start_tls": "tls"}
+
+_stats = {"requests": 0, "tcp": 0, "tls": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(key: str) -> None:
+    with _stats_lock:
+        _stats[key] += 1
+        requests = _stats["requests"]
+        tcp = _stats["tcp"]
+    if requests:
+        set_gauge("groq_http_connection_reuse_ratio", max(0.0, 1 - tcp / requests))
+
+
+def _make_trace():
+    """Callback trace cho 1 request: đo handshake + thời gian tới header phản hồi."""
+    started: Dict[str, float] = {}
+
+    def trace(event: str, info: dict) -> None:
+        name, _, phase = event.rpartition(".")
+        if phase == "started":
+            started[name] = time.perf_counter()
+            return
+        if phase != "complete":
+            return
+        elapsed = time.perf_counter() - started.pop(name, time.perf_counter())
+        kind = _HANDSHAKES.get(name)
+        if kind is not None:
+            inc("groq_http_handshakes_total", kind=kind)
+            observe("groq_http_handshake_seconds", elapsed, kind=kind)
+            _count(kind)
+        elif name.endswith(".send_request_body"):
+            started["ttfb"] = time.perf_counter()
+        elif name.endswith(".receive_response_headers"):
+            observe("groq_http_ttfb_seconds", time.perf_counter() - started.pop("ttfb", time.perf_counter()))
+
+    return trace
+
+
+def _on_request(request) -> None:
+    request.extensions["trace"] = _make_trace()
+    inc("groq_http_requests_total")
+    _count("requests")
+
+
+def pool_stats() -> Dict:
+    """{"requests", "tcp", "tls", "reuse_ratio"} kể từ lúc process chạy."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["reuse_ratio"] = max(0.0, 1 - stats["tcp"] / stats["requests"]) if stats["requests"] else 0.0
+    return stats
+
+
+# ============================================
+# SINGLETON
+# ============================================
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_http_client():
+    """httpx.Client dùng chung (None nếu chưa cài httpx → Groq tự tạo client riêng)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                try:
+                    import httpx
+                except ImportError:
+                    return None
+                _client = httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=GROQ_POOL_MAX_CONNECTIONS,
+                        max_keepalive_connections=GROQ_POOL_MAX_KEEPALIVE,
+                        keepalive_expiry=GROQ_POOL_KEEPALIVE_S,
+                    ),
+                    timeout=httpx.Timeout(GROQ_READ_TIMEOUT_S, connect=GROQ_CONNECT_TIMEOUT_S),
+                    http2=GROQ_HTTP2,
+                    follow_redirects=True,
+                    event_hooks={"request": [_on_request]},
+                )
+    return _client
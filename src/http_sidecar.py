@@ -0,0 +1,132 @@
+# src/http_sidecar.py
+"""
+HTTP server phụ chạy chung process với Streamlit (daemon thread).
+
+Streamlit không cho thêm route tuỳ ý, nên các endpoint vận hành
+(metrics, ...) được phục vụ qua server nhỏ này.
+
+Routes mặc định:
+    GET /metrics   → metrics Prometheus (src/metrics.py)
+
+Module khác đăng ký thêm route bằng register_route(prefix, handler),
+handler nhận BaseHTTPRequestHandler và tự ghi response
+(vd: /api/results/ — result_api, /media/ — media_api, /static/ — assets_loader).
+
+Cấu hình qua biến môi trường:
+    SIDECAR_PORT   cổng lắng nghe (không đặt → không khởi động)
+    SIDECAR_HOST        địa chỉ bind (mặc định 127.0.0.1)
+    SIDECAR_PUBLIC_URL  URL trình duyệt dùng để gọi sidecar (sau reverse proxy / HTTPS);
+                        mặc định http://SIDECAR_HOST:SIDECAR_PORT
+
+Lưu ý bảo mật: sidecar không xác thực. /api/results/ trả transcript đầy đủ
+của cuộc gọi (chỉ giới hạn CORS, xem result_api.py), /media/ trả audio gốc
+(theo sha256) và /metrics lộ số liệu vận hành. Khi đặt SIDECAR_PUBLIC_URL,
+reverse proxy chỉ nên mở /api/results/, /media/ và /static/ ra ngoài (sau
+lớp đăng nhập của app nếu có); giữ /metrics ở mạng nội bộ.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+
+from .metrics import render_prometheus
+
+
+SIDECAR_PORT = int(os.getenv("SIDECAR_PORT", "0") or 0)
+SIDECAR_HOST = os.getenv("SIDECAR_HOST", "127.0.0.1")
+SIDECAR_PUBLIC_URL = os.getenv("SIDECAR_PUBLIC_URL", "").rstrip("/")
+
+RouteHandler = Callable[[BaseHTTPRequestHandler], None]
+
+_routes: Dict[str, RouteHandler] = {}
+
+
+def register_route(prefix: str, handler: RouteHandler) -> None:
+    """Đăng ký handler cho mọi path bắt đầu bằng prefix (khớp prefix dài nhất)."""
+    _routes[prefix] = handler
+
+
+def send_bytes(
+    req: BaseHTTPRequestHandler,
+    body: bytes,
+    content_type: str,
+    status: int = 200,
+    headers: Optional[Dict[str, str]] = None,
+) -> None:
+    """Ghi 1 response hoàn chỉnh."""
+    req.send_response(status)
+    req.send_header("Content-Type", content_type)
+    req.send_header("Content-Length", str(len(body)))
+    for k, v in (headers or {}).items():
+        req.send_header(k, v)
+    req.end_headers()
+    if req.command != "HEAD":
+        req.wfile.write(body)
+
+
+def _metrics_route(req: BaseHTTPRequestHandler) -> None:
+    send_bytes(req, render_prometheus().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8")
+
+
+register_route("/metrics", _metrics_route)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def _dispatch(self) -> None:
+        path = self.path.split("?", 1)[0]
+        for prefix in sorted(_routes, key=len, reverse=True):
+            if path.startswith(prefix):
+                _routes[prefix](self)
+                return
+        send_bytes(self, b"not found", "text/plain", status=404)
+
+    do_GET  = _dispatch
+    do_HEAD = _dispatch
+
+    def log_message(self, format, *args):  # noqa: A002 — chữ ký của BaseHTTPRequestHandler
+        pass   # không spam log Streamlit với mỗi lần scrape
+
+
+# ============================================
+# KHỞI ĐỘNG 1 LẦN MỖI PROCESS
+# ============================================
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_failed = False
+_server_lock = threading.Lock()
+
+
+def start_sidecar(port: int = SIDECAR_PORT, host: str = SIDECAR_HOST) -> Optional[ThreadingHTTPServer]:
+    """
+    Khởi động server nếu có cấu hình cổng. Gọi nhiều lần (mỗi rerun) vẫn an toàn.
+    """
+    global _server, _server_failed
+    if not port or _server_failed:
+        return None
+    if _server is None:
+        with _server_lock:
+            if _server is None and not _server_failed:
+                try:
+                    server = ThreadingHTTPServer((host, port), _Handler)
+                except OSError as e:
+                    _server_failed = True
+                    print(f"[WARN] Sidecar HTTP server khong khoi dong duoc tren {host}:{port}: {e}")
+                    return None
+                server.daemon_threads = True
+                threading.Thread(
+                    target=server.serve_forever, name="http-sidecar", daemon=True
+                ).start()
+                print(f"[OK] Sidecar HTTP server: http://{host}:{port}/metrics")
+                _server = server
+    return _server
+
+
+def public_url(path: str) -> str:
+    """URL tuyệt đối để trình duyệt gọi route của sidecar; "" nếu sidecar không chạy."""
+    if _server is None:
+        return ""
+    base = SIDECAR_PUBLIC_URL or f"http://{SIDECAR_HOST}:{_server.server_address[1]}"
+    return base + path
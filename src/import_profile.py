@@ -0,0 +1,111 @@
+# src/import_profile.py
+"""
+Đo chi phí import lúc khởi động (cold start).
+
+Trong app:
+    render_home = timed_import("views.home_page").render_home
+  → import lần đầu mỗi process được đo, log 1 dòng và xuất gauge
+    startup_import_seconds{module="views.home_page"}.
+    Module nặng (analysis_page → groq, pydub, joblib, numpy) chỉ được import
+    khi người dùng thực sự bắt đầu phân tích.
+
+Báo cáo chi tiết từng package (interpreter mới, dùng -X importtime):
+    python -m src.import_profile                      # home vs analysis
+    python -m src.import_profile views.analysis_page --top 15
+
+Số liệu tính PHẦN THÊM so với `import streamlit` — server Streamlit đã
+import sẵn streamlit trước khi chạy app.py.
+"""
+
+from __future__ import annotations
+
+import importlib
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from .metrics import set_gauge
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_BASELINE = "streamlit"
+
+
+def timed_import(name: str):
+    """importlib.import_module + đo thời gian của lần import đầu tiên trong process."""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    elapsed = time.perf_counter() - start
+    set_gauge("startup_import_seconds", elapsed, module=name)
+    print(f"[INFO] Import {name}: {elapsed * 1000:.0f} ms")
+    return module
+
+
+# ── Báo cáo -X importtime ────────────────────────────────────────────────────
+
+def _importtime(modules: List[str]) -> Dict[str, Tuple[int, int]]:
+    """module → (self_us, cumulative_us) khi import modules trong interpreter mới."""
+    code = "; ".join(f"import {m}" for m in modules)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT_DIR, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {modules} failed:\n{proc.stderr[-2000:]}")
+    timings: Dict[str, Tuple[int, int]] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        try:
+            self_us, cum_us, name = (p.strip() for p in line[len("import time:"):].split("|"))
+            timings[name] = (int(self_us), int(cum_us))
+        except ValueError:
+            continue   # dòng tiêu đề
+    return timings
+
+
+def import_cost(module: str) -> Dict:
+    """
+    Chi phí import module (cold) phần thêm so với baseline streamlit:
+        {"module", "total_ms", "packages": [(package, self_ms), ...] giảm dần}
+    """
+    baseline = _importtime([_BASELINE])
+    timings = _importtime([_BASELINE, module])
+    extra = {name: t for name, t in timings.items() if name not in baseline}
+
+    per_package: Dict[str, int] = defaultdict(int)
+    for name, (self_us, _) in extra.items():
+        per_package[name.split(".")[0]] += self_us
+    return {
+        "module":   module,
+        "total_ms": round(sum(s for s, _ in extra.values()) / 1000, 1),
+        "packages": sorted(
+            ((pkg, round(us / 1000, 1)) for pkg, us in per_package.items()),
+            key=lambda x: x[1], reverse=True,
+        ),
+    }
+
+
+def print_report(modules: List[str], top: int = 10) -> None:
+    for module in modules:
+        cost = import_cost(module)
+        print(f"\n{module}: {cost['total_ms']} ms (ngoài streamlit)")
+        for pkg, ms in cost["packages"][:top]:
+            print(f"    {pkg:<28} {ms:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Chi phí import cold start theo package")
+    parser.add_argument("modules", nargs="*", default=["views.home_page", "views.analysis_page"])
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+    print_report(args.modules, top=args.top)
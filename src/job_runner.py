@@ -0,0 +1,421 @@
+# src/job_runner.py
+"""
+Chạy analysis trong thread nền để không chặn script run của Streamlit.
+
+Vấn đề:
+    render_analysis() gọi run_analysis() trực tiếp trong script run →
+    mỗi lần rerun / tương tác widget / browser reconnect sẽ ngắt pipeline
+    hoặc bắt đầu lại từ đầu.
+
+Giải pháp:
+    - 1 JobRunner dùng chung toàn process (ThreadPoolExecutor)
+    - Mỗi job có key = (session_id, sha256 của file upload)
+    - Trang analysis chỉ submit/poll: đọc tiến độ + chunk đã xong
+    - Job đã hoàn tất được trả lại nguyên vẹn, không tính lại
+    - Về Home / upload file khác → job cũ của session bị huỷ (CancelToken)
+
+Singleflight:
+    Nhiều session upload cùng 1 file (cùng sha256 + chunk_duration) trong lúc
+    file đó đang phân tích → session đến sau gắn vào job đang chạy (chung
+    progress_bus, chunk tạm, lời khuyên LLM, kết quả) thay vì chạy lại STT.
+    Job chỉ bị huỷ khi KHÔNG còn session nào gắn vào.
+    Giữa nhiều process: đặt ANALYSIS_SINGLEFLIGHT_LOCK_DIR (xem singleflight.py)
+    → process đến sau chờ lock file rồi lấy kết quả từ result_store.
+
+Cấu hình qua biến môi trường:
+    ANALYSIS_JOB_WORKERS      số thread xử lý song song   (mặc định 2)
+    ANALYSIS_JOB_QUEUE_LIMIT  số job tối đa đang chờ/chạy (mặc định 8)
+    ANALYSIS_JOB_TTL          giây giữ job đã xong         (mặc định 1800)
+    ANALYSIS_TWO_PASS         "1" → 2 lượt: bản xem trước bằng WHISPER_FAST_MODEL,
+                              model chính xác tinh chỉnh nền (mặc định 0)
+
+Chế độ 2 lượt:
+    job DONE ngay sau lượt nhanh (trang hiện kết luận), job.refining = True
+    trong khi lượt 2 chạy; mỗi chunk đổi kết quả → job.result mới +
+    job.result_version tăng. Lời khuyên LLM: bản tạm theo lượt nhanh,
+    bản chính thức sau lượt 2. Chỉ kết quả đã tinh chỉnh được lưu vào store.
+
+Metrics:
+    analysis_first_verdict_seconds{mode="single|two_pass"}   từ lúc job chạy tới khi có kết luận
+    stt_refine_verdict_change_rate                           tỉ lệ lượt 2 đổi nhãn kết luận
+    analysis_singleflight_total{role="leader|attached|cross_process"}
+                                                             leader = chạy pipeline thật;
+                                                             attached / cross_process = lần phân tích trùng đã tránh
+    analysis_singleflight_dedup_ratio                        lần trùng đã tránh / tổng số lần yêu cầu
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from .analysis_engine import analyze_audio, refine_audio
+from .cancellation import AnalysisCancelled, CancelToken
+from .deadline import Deadline
+from .llm_advice import AdviceTask
+from .metrics import inc, observe, set_gauge
+from .progress_bus import ProgressBus
+from .result_store import get_result_store
+from .singleflight import flight_lock
+from .speech_to_text import DEFAULT_CHUNK_DURATION
+
+
+JOB_MAX_WORKERS = int(os.getenv("ANALYSIS_JOB_WORKERS", "2"))
+JOB_QUEUE_LIMIT = int(os.getenv("ANALYSIS_JOB_QUEUE_LIMIT", "8"))
+JOB_RESULT_TTL  = float(os.getenv("ANALYSIS_JOB_TTL", "1800"))
+TWO_PASS        = os.getenv("ANALYSIS_TWO_PASS", "0") == "1"
+
+# Nhịp thử lại lock file khi process khác đang phân tích cùng file
+_FLIGHT_LOCK_POLL_S = 0.5
+
+# Trạng thái job
+QUEUED    = "queued"
+RUNNING   = "running"
+DONE      = "done"
+FAILED    = "failed"
+CANCELLED = "cancelled"
+
+
+class JobQueueFull(RuntimeError):
+    """Hàng đợi đã đầy — người dùng cần thử lại sau."""
+
+
+class AnalysisJob:
+    """
+    1 lần phân tích đang chạy nền.
+
+    Mọi thuộc tính đọc từ script thread đều đi qua lock để
+    không đọc nửa chừng khi worker đang append chunk.
+    """
+
+    def __init__(self, key: Tuple[str, str], filename: str, chunk_duration: int = DEFAULT_CHUNK_DURATION):
+        self.key         = key             # key của session đã tạo job (leader)
+        self.chunk_duration = chunk_duration
+        self.sessions    = {key}           # mọi key (session, hash) đang gắn vào job — do JobRunner quản lý
+        self.filename    = filename
+        self.status      = QUEUED
+        self.done        = 0
+        self.total       = 0
+        self.result: Optional[Dict] = None
+        self.result_version = 0
+        self.refining    = False           # chế độ 2 lượt: model chính xác đang chạy lại
+        self.error       = ""
+        self.created_at  = time.time()
+        self.finished_at: Optional[float] = None
+        self.cancel_token = CancelToken()
+        self.deadline     = Deadline()     # start() lại khi job bắt đầu chạy — không tính thời gian chờ hàng đợi
+        self.progress_bus = ProgressBus()
+        self.advice       = AdviceTask(self.deadline)   # lời khuyên LLM chạy song song với STT
+        self._chunks: List[Dict] = []
+        self._lock = threading.Lock()
+
+    # ── Callback cho analyze_audio (chạy trên worker thread) ─────────────
+    def _on_progress(self, done: int, total: int) -> None:
+        with self._lock:
+            self.done, self.total = done, total
+        self.progress_bus.publish(done, total)
+
+    def _on_chunk(self, chunk: Dict) -> None:
+        with self._lock:
+            self._chunks.append(chunk)
+            self.advice.update(self._chunks)
+
+    def _set_result(self, result: Dict) -> None:
+        with self._lock:
+            self.result = result
+            self.result_version += 1
+
+    # ── API đọc từ script thread ─────────────────────────────────────────
+    def progress(self) -> Tuple[int, int]:
+        """Trả về (done, total) — total = 0 khi chưa ước tính xong."""
+        with self._lock:
+            return self.done, self.total
+
+    def partial_chunks(self) -> List[Dict]:
+        """Bản sao các ChunkResult đã xong (dùng để render kết quả tạm)."""
+        with self._lock:
+            return list(self._chunks)
+
+    def latest_result(self) -> Tuple[int, Optional[Dict]]:
+        """(result_version, result) — version tăng mỗi lần lượt 2 đổi kết quả."""
+        with self._lock:
+            return self.result_version, self.result
+
+    def is_finished(self) -> bool:
+        return self.status in (DONE, FAILED, CANCELLED)
+
+
+class JobRunner:
+    """Executor dùng chung toàn process, quản lý job theo key."""
+
+    def __init__(self, max_workers: int = JOB_MAX_WORKERS, queue_limit: int = JOB_QUEUE_LIMIT):
+        self.queue_limit = queue_limit
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, max_workers), thread_name_prefix="analysis-job"
+        )
+        self._jobs: Dict[Tuple[str, str], AnalysisJob] = {}
+        self._lock = threading.Lock()
+        self._first_analysis_recorded = False
+        self._refines = 0
+        self._verdict_changes = 0
+        # Singleflight: (audio_hash, chunk_duration) → job đang chạy / đang tinh chỉnh
+        self._flights: Dict[Tuple[str, int], AnalysisJob] = {}
+        self._flight_stats = {"leader": 0, "attached": 0, "cross_process": 0}
+
+    def _purge_expired(self) -> None:
+        """Xoá job đã xong quá JOB_RESULT_TTL giây (gọi khi đang giữ lock)."""
+        now = time.time()
+        expired = [
+            k for k, j in self._jobs.items()
+            if j.finished_at is not None and now - j.finished_at > JOB_RESULT_TTL
+        ]
+        for k in expired:
+            del self._jobs[k]
+
+    def _active_count(self) -> int:
+        # Job singleflight nằm dưới nhiều key → đếm theo object
+        return len({id(j) for j in self._jobs.values() if not j.is_finished()})
+
+    def _count_flight(self, role: str) -> None:
+        """Ghi nhận 1 lần yêu cầu phân tích (gọi khi đang giữ lock)."""
+        self._flight_stats[role] += 1
+        total = sum(self._flight_stats.values())
+        inc("analysis_singleflight_total", role=role)
+        set_gauge("analysis_singleflight_dedup_ratio", 1 - self._flight_stats["leader"] / total)
+
+    def singleflight_stats(self) -> Dict:
+        """{"leader", "attached", "cross_process", "in_flight"} kể từ lúc process chạy."""
+        with self._lock:
+            return dict(self._flight_stats, in_flight=len(self._flights))
+
+    def submit(
+        self,
+        session_id: str,
+        audio_hash: str,
+        audio_bytes: bytes,
+        filename: str,
+        chunk_duration: int = DEFAULT_CHUNK_DURATION,
+    ) -> AnalysisJob:
+        """
+        Submit job mới hoặc trả lại job đã có cùng key.
+        File đang được session khác phân tích → gắn vào job đó (singleflight).
+
+        Raises:
+            JobQueueFull: đã có >= queue_limit job đang chờ/chạy
+        """
+        key = (session_id, audio_hash)
+        with self._lock:
+            self._purge_expired()
+            job = self._jobs.get(key)
+            if job is not None:
+                return job
+            # Session chuyển sang file khác → job cũ không còn ai đọc nữa
+            for other_key in [k for k in self._jobs if k[0] == session_id]:
+                self._cancel_locked(other_key, "superseded by a new upload")
+            flight = self._flights.get((audio_hash, chunk_duration))
+            if flight is not None and not flight.cancel_token.cancelled:
+                # Cùng file đang chạy cho session khác → dùng chung, không tính vào queue_limit
+                flight.sessions.add(key)
+                self._jobs[key] = flight
+                self._count_flight("attached")
+                print(f"[INFO] Singleflight: {filename} gan vao job dang chay "
+                      f"({len(flight.sessions)} session)")
+                return flight
+            if self._active_count() >= self.queue_limit:
+                raise JobQueueFull(
+                    f"Đang có {self.queue_limit} phân tích chạy cùng lúc. Vui lòng thử lại sau."
+                )
+            job = AnalysisJob(key, filename, chunk_duration)
+            self._jobs[key] = job
+            self._flights[(audio_hash, chunk_duration)] = job
+
+        self._executor.submit(self._run, job, audio_bytes, filename, chunk_duration)
+        return job
+
+    def get(self, session_id: str, audio_hash: str) -> Optional[AnalysisJob]:
+        with self._lock:
+            return self._jobs.get((session_id, audio_hash))
+
+    def discard(self, session_id: str, audio_hash: str) -> None:
+        """Bỏ tham chiếu tới job (khi session đã lấy kết quả)."""
+        key = (session_id, audio_hash)
+        with self._lock:
+            job = self._jobs.pop(key, None)
+            if job is not None:
+                job.sessions.discard(key)
+
+    def cancel(self, session_id: str, audio_hash: str, reason: str = "user left") -> None:
+        """Huỷ job đang chạy (nút Home) và bỏ tham chiếu tới nó."""
+        with self._lock:
+            self._cancel_locked((session_id, audio_hash), reason)
+
+    def _cancel_locked(self, key: Tuple[str, str], reason: str) -> None:
+        job = self._jobs.pop(key, None)
+        if job is None:
+            return
+        job.sessions.discard(key)
+        # Job singleflight còn session khác đang xem → để chạy tiếp
+        if not job.sessions and (not job.is_finished() or job.refining):
+            job.cancel_token.cancel(reason)
+
+    def _record_first_analysis(self, elapsed: float) -> None:
+        """Độ trễ lần phân tích đầu tiên của process — so sánh có / không warm-up."""
+        with self._lock:
+            if self._first_analysis_recorded:
+                return
+            self._first_analysis_recorded = True
+        warmed = "src.warmup" in sys.modules and sys.modules["src.warmup"].is_ready()
+        set_gauge("first_analysis_seconds", elapsed, warmed="true" if warmed else "false")
+        print(f"[INFO] First analysis: {elapsed:.2f}s (warm-up {'xong' if warmed else 'chua xong'})")
+
+    def _run(self, job: AnalysisJob, audio_bytes: bytes, filename: str, chunk_duration: int) -> None:
+        if job.cancel_token.cancelled:
+            # Bị huỷ khi còn nằm trong hàng đợi → không decode / gọi STT gì cả
+            job.status = CANCELLED
+            job.finished_at = time.time()
+            self._end_flight(job)
+            return
+        job.status = RUNNING
+        started = time.perf_counter()
+        store = get_result_store()
+        lock = flight_lock(job.key[1], chunk_duration) if store is not None else None
+        try:
+            if lock is not None:
+                cached = self._wait_other_process(job, lock, store, chunk_duration)
+                if cached is not None:
+                    job._set_result(cached)
+                    job.status = DONE
+                    job.advice.update(cached["chunk_scores"], final=True)
+                    return
+            with self._lock:
+                self._count_flight("leader")
+            job.deadline.start()
+            result = analyze_audio(
+                audio_bytes,
+                filename,
+                chunk_duration,
+                progress_callback=job._on_progress,
+                chunk_callback=job._on_chunk,
+                cancel_token=job.cancel_token,
+                deadline=job.deadline,
+                quality="fast" if TWO_PASS else None,
+            )
+            elapsed = time.perf_counter() - started
+            observe("analysis_first_verdict_seconds", elapsed, mode="two_pass" if TWO_PASS else "single")
+            self._record_first_analysis(elapsed)
+            job.refining = TWO_PASS
+            job._set_result(result)
+            job.status = DONE
+            if TWO_PASS:
+                job.advice.update(result["chunk_scores"])   # bản tạm theo lượt nhanh
+                result = self._refine(job, audio_bytes, filename, chunk_duration, result)
+            # 2 lượt: ngân sách "llm" của job.deadline có thể đã hết khi lượt 2 xong
+            # → lời khuyên chính thức có deadline riêng, không rơi ngầm về rule-based
+            job.advice.update(result["chunk_scores"], final=True, deadline=Deadline() if TWO_PASS else None)
+            if store is not None:
+                # put() tự bỏ kết quả không đầy đủ (STT lỗi / hết thời gian / xuống cấp / bản xem trước)
+                store.put(job.key[1], chunk_duration, result)
+        except AnalysisCancelled as e:
+            print(f"[INFO] Analysis job {job.filename} cancelled: {e}")
+            inc("analyses_cancelled_total")
+            if job.status != DONE:
+                job.status = CANCELLED
+        except Exception as e:
+            print(f"[ERROR] Analysis job {job.filename} failed: {e}")
+            job.error = str(e)
+            if job.status != DONE:
+                job.status = FAILED
+        finally:
+            if lock is not None:
+                lock.release()
+            job.refining = False
+            job.finished_at = time.time()
+            self._end_flight(job)
+
+    def _end_flight(self, job: AnalysisJob) -> None:
+        """Job xong hẳn → upload trùng sau đó không gắn vào nữa (đọc result_store)."""
+        with self._lock:
+            flight_key = (job.key[1], job.chunk_duration)
+            if self._flights.get(flight_key) is job:
+                del self._flights[flight_key]
+
+    def _wait_other_process(self, job: AnalysisJob, lock, store, chunk_duration: int) -> Optional[Dict]:
+        """
+        Giữ lock file của file này (chờ nếu process khác đang phân tích), rồi
+        đọc result_store: process kia đã xong → trả kết quả, không chạy lại.
+        """
+        if not lock.try_acquire():
+            print(f"[INFO] Singleflight: {job.filename} dang phan tich o process khac, cho ket qua")
+            job.progress_bus.publish(0, 0, "Đang chờ phân tích cùng file ở phiên khác...")
+            while not lock.try_acquire():
+                if job.cancel_token.wait(_FLIGHT_LOCK_POLL_S):
+                    job.cancel_token.raise_if_cancelled()
+        # Kể cả khi lấy được lock ngay: process khác có thể vừa xong sau lúc trang kiểm tra store
+        cached = store.get(job.key[1], chunk_duration)
+        if cached is not None:
+            with self._lock:
+                self._count_flight("cross_process")
+            print(f"[INFO] Singleflight: {job.filename} lay ket qua tu process khac")
+        return cached
+
+    def _refine(self, job: AnalysisJob, audio_bytes: bytes, filename: str, chunk_duration: int,
+                preview: Dict) -> Dict:
+        """
+        Lượt 2: model chính xác, cập nhật job.result khi có chunk đổi. Lỗi → giữ
+        bản xem trước (vẫn mang quality="fast" → không vào result_store).
+        """
+        try:
+            # Ngân sách riêng: lượt 2 chạy nền, không ăn vào deadline của kết luận đầu
+            refined = refine_audio(
+                audio_bytes, filename, preview, chunk_duration,
+                update_callback=job._set_result, cancel_token=job.cancel_token, deadline=Deadline(),
+            )
+        except AnalysisCancelled:
+            raise
+        except Exception as e:
+            print(f"[WARN] Refine pass for {job.filename} failed, keeping preview: {e}")
+            return preview
+        job._set_result(refined)
+        info = refined["refine"]
+        with self._lock:
+            self._refines += 1
+            self._verdict_changes += info["verdict_changed"]
+            rate = self._verdict_changes / self._refines
+        set_gauge("stt_refine_verdict_change_rate", rate)
+        print(f"[INFO] Refine {job.filename}: {info['changed']}/{info['checked']} chunk doi, "
+              f"ket luan {'DOI' if info['verdict_changed'] else 'giu nguyen'}")
+        return refined
+
+
+# ============================================
+# SINGLETON
+# ============================================
+
+_runner: Optional[JobRunner] = None
+_runner_lock = threading.Lock()
+
+
+def get_job_runner() -> JobRunner:
+    """Lấy singleton JobRunner (dùng chung cho mọi session trong process)."""
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                _runner = JobRunner()
+    return _runner
+
+
+def get_session_id() -> str:
+    """ID của Streamlit session hiện tại (fallback 'local' khi chạy ngoài runtime)."""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+        if ctx is not None:
+            return ctx.session_id
+    except Exception:
+        pass
+    return "local"
@@ -0,0 +1,295 @@
+# src/llm_advice.py
+"""
+Lời khuyên LLM (extract_keywords → explain_result) chạy nền, song song với STT.
+
+Hai lượt gọi LLM nối tiếp SAU khi transcribe xong sẽ cộng thẳng vào thời gian
+chờ kết luận. Thay vào đó mỗi job có 1 AdviceTask:
+
+    task = AdviceTask()
+    task.update(chunks)               # worker, sau mỗi chunk — đủ LLM_ADVICE_MIN_CHUNKS
+                                      #   → bắt đầu bản TẠM trong khi STT vẫn chạy
+    task.update(chunks, final=True)   # job xong → bản CHÍNH THỨC trên toàn bộ chunk
+    task.get()                        # UI poll — None khi chưa có gì, không bao giờ chờ
+
+Mỗi task gọi LLM tối đa 2 lượt (tạm + chính thức), tuần tự. Kết quả đến
+sau ghi đè kết quả trước. Lượt tạm chưa bắt đầu thì bị bỏ.
+explain_result được stream: summary / reason / recommendation hiện lên
+(get() đổi version) ngay khi từng field hoàn tất, không đợi cả JSON.
+Không có GROQ_API_KEY / thư viện groq → task không làm gì, trang dùng lời khuyên mặc định.
+Hết ngân sách "llm" của deadline job (xem deadline.py) → bỏ lượt LLM,
+dùng rule_based_advice() dựng từ điểm / loại / từ khoá đã chấm.
+
+Metrics:
+    llm_advice_requests_total{stage, status="ok|deadline|error"}
+    llm_advice_seconds{stage}                 thời gian 2 lượt LLM của 1 lần giải thích
+    llm_advice_first_text_seconds{stage}      từ lúc bắt đầu tới khi field đầu tiên hiện lên
+    llm_advice_lag_seconds{stage}             lúc lời khuyên sẵn sàng − lúc có kết luận
+                                              (âm = đã có trước khi STT xong)
+
+Cấu hình qua biến môi trường:
+    LLM_ADVICE_ENABLED      "0" → tắt hẳn (mặc định bật khi có GROQ_API_KEY)
+    LLM_ADVICE_MIN_CHUNKS   số chunk tối thiểu để bắt đầu bản tạm (mặc định 3)
+    LLM_ADVICE_WORKERS      số thread gọi LLM dùng chung process (mặc định 2)
+"""
+
+from __future__ import annotations
+
+import contextvars
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from .deadline import Deadline, DeadlineExceeded
+from .metrics import inc, observe, set_gauge
+from .prompt_builder import build_transcript_excerpt
+
+
+LLM_ADVICE_ENABLED    = os.getenv("LLM_ADVICE_ENABLED", "1") != "0"
+LLM_ADVICE_MIN_CHUNKS = int(os.getenv("LLM_ADVICE_MIN_CHUNKS", "3"))
+LLM_ADVICE_WORKERS    = int(os.getenv("LLM_ADVICE_WORKERS", "2"))
+
+# Field explain_result hiển thị trên thẻ lời khuyên — stream lên UI ngay khi xong từng field
+STREAMED_FIELDS = ("summary", "reason", "recommendation")
+
+# Lời khuyên rule-based theo nhãn (khi không kịp gọi LLM)
+_RULE_RECOMMENDATIONS = {
+    "Dấu hiệu lừa đảo": "Dừng cuộc gọi. KHÔNG chuyển tiền, KHÔNG cung cấp mã OTP hay mật khẩu. "
+                        "Gọi lại tổng đài chính thức của ngân hàng / cơ quan được nhắc tới để xác minh.",
+    "Nghi ngờ":         "Thận trọng: xác minh danh tính người gọi qua kênh chính thức trước khi làm theo "
+                        "bất kỳ yêu cầu nào. Không chia sẻ thông tin cá nhân.",
+    "An toàn":          "Chưa thấy dấu hiệu lừa đảo rõ ràng. Dù vậy, không bao giờ cung cấp mã OTP "
+                        "hay mật khẩu qua điện thoại.",
+}
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_llm_unavailable = False   # đã báo thiếu API key 1 lần → không thử lại mỗi job
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=max(1, LLM_ADVICE_WORKERS), thread_name_prefix="llm-advice"
+                )
+    return _executor
+
+
+def _get_llm():
+    """LLMClient hoặc None khi tắt / thiếu API key."""
+    global _llm_unavailable
+    if not LLM_ADVICE_ENABLED or _llm_unavailable:
+        return None
+    try:
+        from .llm_client import get_llm_client
+        return get_llm_client()
+    except RuntimeError as e:
+        _llm_unavailable = True
+        print(f"[WARN] LLM advice disabled: {e}")
+        return None
+
+
+def _top_loai(chunks: List[Dict]) -> List[str]:
+    return [l for l, _ in Counter(l for c in chunks for l in c.get("loai", [])).most_common(3)]
+
+
+def rule_based_advice(chunks: List[Dict]) -> Dict:
+    """
+    Lời khuyên không cần LLM: nhãn + điểm tổng, loại lừa đảo và từ khoá hay gặp nhất.
+
+    Returns:
+        Dict cùng dạng explain_chunks() + "degraded": True
+    """
+    from .analysis_engine import aggregate_score, verdict_label, verdict_scores
+
+    score = aggregate_score(verdict_scores(chunks))
+    label = verdict_label(score)
+    loai = _top_loai(chunks)
+    keywords = [kw for kw, _ in Counter(kw for c in chunks for kw in c.get("keywords", [])).most_common(5)]
+
+    summary = f"{label}: điểm nghi ngờ {score:.0%}"
+    if loai:
+        summary += f", nghi là {', '.join(loai)}"
+    reason = (f"Cuộc gọi nhắc tới: {', '.join(keywords)}." if keywords
+              else "Không phát hiện từ khoá nghi vấn trong transcript.")
+    return {
+        "summary":        summary + ".",
+        "reason":         reason,
+        "recommendation": _RULE_RECOMMENDATIONS[label],
+        "loai_lua_dao":   loai,
+        "signals":        keywords,
+        "degraded":       True,
+    }
+
+
+def explain_chunks(llm, chunks: List[Dict], on_field=None, deadline: Optional[Deadline] = None) -> Dict:
+    """
+    extract_keywords + explain_result trên các ChunkResult đã có.
+    on_field(name, text): nhận từng field của explain_result ngay khi stream xong field đó.
+    deadline: hết ngân sách "llm" (trước hoặc giữa 2 lượt gọi) → rule_based_advice().
+
+    Returns:
+        Dict: summary, reason, recommendation, loai_lua_dao, signals
+    """
+    try:
+        return _explain_with_llm(llm, chunks, on_field, deadline)
+    except DeadlineExceeded:
+        deadline.degrade("llm", "loi khuyen rule-based")
+        return rule_based_advice(chunks)
+
+
+def _explain_with_llm(llm, chunks, on_field, deadline) -> Dict:
+    from .analysis_engine import aggregate_score, verdict_label, verdict_scores
+
+    # Chỉ các đoạn nghi ngờ nhất (+ ngữ cảnh) trong ngân sách token, không cắt cụt phần cuối
+    transcript, _ = build_transcript_excerpt(chunks)
+    score = aggregate_score(verdict_scores(chunks))
+    loai = _top_loai(chunks)
+
+    extracted = llm.extract_keywords(transcript, deadline=deadline)
+    keywords = list(dict.fromkeys(
+        [kw for c in chunks for kw in c.get("keywords", [])] + list(extracted.get("keywords", []))
+    ))
+    advice = llm.explain_result(
+        transcript=transcript,
+        ml_score=score,
+        label=verdict_label(score),
+        keywords=keywords,
+        signals=extracted.get("signals", []),
+        scammer_quote=extracted.get("scammer_quote", ""),
+        loai_lua_dao=loai,
+        on_field=on_field,
+        deadline=deadline,
+    )
+    advice["signals"] = list(extracted.get("signals", []))
+    return advice
+
+
+class AdviceTask:
+    """Lời khuyên LLM của 1 job: bản tạm khi đang STT, bản chính thức khi xong."""
+
+    def __init__(self, deadline: Optional[Deadline] = None):
+        self._lock = threading.Lock()
+        self._llm = _get_llm()
+        self._deadline = deadline if deadline is not None else Deadline()
+        self._advice: Optional[Dict] = None
+        self._version = 0
+        self._running = False
+        self._pending: Optional[Tuple[List[Dict], bool, Deadline]] = None
+        self._provisional_submitted = False
+        self._final_submitted = False
+        self._finished = self._llm is None
+        self._verdict_at: Optional[float] = None
+        self._ready_at: Dict[str, float] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self._llm is not None
+
+    # ── Worker / script thread ───────────────────────────────────────────
+    def update(self, chunks: List[Dict], final: bool = False, deadline: Optional[Deadline] = None) -> None:
+        """
+        Báo có chunk mới; tự quyết định có gọi LLM hay không (không chặn).
+        deadline: ngân sách riêng cho lượt này (mặc định deadline của task).
+        """
+        if self._llm is None:
+            return
+        with self._lock:
+            if final:
+                if self._final_submitted:
+                    return
+                self._final_submitted = True
+                self._verdict_at = time.perf_counter()
+                if not chunks and not self._running:
+                    self._finished = True   # không có gì để giải thích
+                    return
+            else:
+                if self._provisional_submitted or self._final_submitted or len(chunks) < LLM_ADVICE_MIN_CHUNKS:
+                    return
+                self._provisional_submitted = True
+            work = (list(chunks), final, deadline if deadline is not None else self._deadline)
+            if self._running:
+                self._pending = work   # chạy ngay sau lượt hiện tại (bản chính thức thay bản tạm đang chờ)
+                return
+            self._running = True
+        # copy_context: span() trong thread advice vẫn cộng vào StageTimeline của job
+        _get_executor().submit(contextvars.copy_context().run, self._run, work)
+
+    def _run(self, work: Optional[Tuple[List[Dict], bool, Deadline]]) -> None:
+        while work is not None:
+            chunks, final, deadline = work
+            stage = "final" if final else "provisional"
+            start = time.perf_counter()
+            try:
+                advice = explain_chunks(
+                    self._llm, chunks, self._field_callback(stage, len(chunks), start), deadline,
+                )
+                status = "deadline" if advice.get("degraded") else "ok"
+                inc("llm_advice_requests_total", stage=stage, status=status)
+            except Exception as e:
+                print(f"[WARN] LLM advice ({stage}) failed: {e}")
+                inc("llm_advice_requests_total", stage=stage, status="error")
+                advice = None
+            now = time.perf_counter()
+            observe("llm_advice_seconds", now - start, stage=stage)
+
+            with self._lock:
+                if advice is not None:
+                    advice["provisional"] = not final
+                    advice["n_chunks"] = len(chunks)
+                    self._advice = advice
+                    self._version += 1
+                    self._ready_at.setdefault(stage, now)
+                if final:
+                    self._finished = True
+                    self._record_lag()
+                work, self._pending = self._pending, None
+                if work is None:
+                    self._running = False
+
+    def _field_callback(self, stage: str, n_chunks: int, start: float):
+        """Callback streaming: chèn field vừa xong vào lời khuyên đang hiển thị."""
+        first = [True]
+
+        def on_field(name: str, value: str) -> None:
+            if name not in STREAMED_FIELDS:
+                return
+            now = time.perf_counter()
+            with self._lock:
+                # Bản chính thức ghi đè dần lên bản tạm; lượt đầu bắt đầu từ dict rỗng
+                advice = dict(self._advice) if self._advice else {
+                    "partial": True, "provisional": stage == "provisional", "n_chunks": n_chunks,
+                }
+                advice[name] = value
+                self._advice = advice
+                self._version += 1
+                if first[0]:
+                    self._ready_at.setdefault(f"{stage}_first_text", now)
+            if first[0]:
+                first[0] = False
+                observe("llm_advice_first_text_seconds", now - start, stage=stage)
+
+        return on_field
+
+    def _record_lag(self) -> None:
+        """Độ trễ lời khuyên so với lúc có kết luận (gọi khi đang giữ lock)."""
+        for stage, ready_at in self._ready_at.items():
+            lag = ready_at - self._verdict_at
+            set_gauge("llm_advice_lag_seconds", lag, stage=stage)
+            print(f"[INFO] LLM advice {stage}: {lag:+.2f}s so voi ket luan")
+
+    # ── UI ───────────────────────────────────────────────────────────────
+    def get(self) -> Tuple[int, Optional[Dict]]:
+        """(version, advice) mới nhất — version tăng mỗi lần lời khuyên đổi."""
+        with self._lock:
+            return self._version, self._advice
+
+    def is_finished(self) -> bool:
+        """True khi không còn lượt LLM nào sẽ chạy (hoặc task bị tắt)."""
+        with self._lock:
+            return self._finished
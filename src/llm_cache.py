@@ -0,0 +1,208 @@
+# src/llm_cache.py
+"""
+Cache phản hồi LLM trên đĩa (SQLite) — phân tích lại / file trùng nội dung
+gửi lại gần như y hệt prompt, không cần trả lại độ trễ + token.
+
+Key = sha256(base URL, model, system prompt, user prompt, temperature, max_tokens)
+(base URL: phản hồi từ mock_groq / proxy khác không bao giờ bị trả cho API thật)
+Value = nội dung completion (đã parse JSON được) + usage token lúc gọi thật
+
+Hit → LLMClient trả luôn, không mở kết nối mạng.
+Bản ghi quá LLM_CACHE_TTL_S bị bỏ qua khi đọc và xoá khi ghi;
+tổng payload vượt LLM_CACHE_MAX_MB → xoá bản ghi lâu không đọc nhất (LRU).
+
+Metrics:
+    llm_cache_lookups_total{result="hit|miss"}, llm_cache_hit_ratio
+    llm_tokens_saved_total{kind="prompt|completion"}   token không phải trả nhờ hit
+
+Cấu hình qua biến môi trường:
+    LLM_CACHE_PATH     đường dẫn file SQLite   (mặc định .cache/llm_cache.sqlite3)
+    LLM_CACHE_MAX_MB   dung lượng tối đa (MB)  (mặc định 32)
+    LLM_CACHE_TTL_S    thời gian sống (giây)   (mặc định 604800 = 7 ngày)
+    LLM_CACHE_ENABLED  "0" để tắt hẳn
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional
+
+from .metrics import inc, set_gauge
+
+
+ROOT_DIR = Path(__file__).parent.parent
+
+LLM_CACHE_PATH    = Path(os.getenv("LLM_CACHE_PATH", ROOT_DIR / ".cache" / "llm_cache.sqlite3"))
+LLM_CACHE_MAX_MB  = float(os.getenv("LLM_CACHE_MAX_MB", "32"))
+LLM_CACHE_TTL_S   = float(os.getenv("LLM_CACHE_TTL_S", "604800"))
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") != "0"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key               TEXT PRIMARY KEY,
+    model             TEXT NOT NULL,
+    content           TEXT NOT NULL,
+    prompt_tokens     INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    size_bytes        INTEGER NOT NULL,
+    created_at        REAL NOT NULL,
+    last_access       REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access);
+"""
+
+
+class LLMCache:
+    """Cache completion theo hash prompt, an toàn khi gọi từ nhiều thread."""
+
+    def __init__(self, path: Path = LLM_CACHE_PATH, max_mb: float = LLM_CACHE_MAX_MB,
+                 ttl_s: float = LLM_CACHE_TTL_S):
+        self.path = Path(path)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.ttl_s = ttl_s
+        self.hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        """Mở connection riêng cho mỗi thao tác (sqlite3 không chia sẻ giữa thread)."""
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:   # commit / rollback
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(model: str, system_prompt: str, user_prompt: str,
+                 temperature: float, max_tokens: int, base_url: Optional[str] = None) -> str:
+        raw = json.dumps(
+            [base_url or "", model, system_prompt, user_prompt, temperature, max_tokens], ensure_ascii=False,
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Nội dung completion còn hạn hoặc None. Cập nhật last_access khi hit."""
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT content, prompt_tokens, completion_tokens FROM responses "
+                    "WHERE key = ? AND created_at >= ?", (key, now - self.ttl_s)
+                ).fetchone()
+                if row is not None:
+                    conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            print(f"[WARN] LLM cache read failed: {e}")
+            row = None
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.tokens_saved += row[1] + row[2]
+            hit_rate = self.hits / (self.hits + self.misses)
+        inc("llm_cache_lookups_total", result="miss" if row is None else "hit")
+        set_gauge("llm_cache_hit_ratio", hit_rate)
+        if row is None:
+            return None
+        inc("llm_tokens_saved_total", row[1], kind="prompt")
+        inc("llm_tokens_saved_total", row[2], kind="completion")
+        return row[0]
+
+    def put(self, key: str, model: str, content: str,
+            prompt_tokens: int = 0, completion_tokens: int = 0) -> None:
+        """Lưu completion rồi xoá bản ghi hết hạn / vượt dung lượng."""
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses "
+                    "(key, model, content, prompt_tokens, completion_tokens, size_bytes, created_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, model, content, prompt_tokens, completion_tokens,
+                     len(content.encode("utf-8")), now, now),
+                )
+                self._evict(conn, now)
+        except sqlite3.Error as e:
+            print(f"[WARN] LLM cache write failed: {e}")
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        """Xoá bản ghi hết hạn, rồi LRU cho tới khi tổng dung lượng <= max_bytes."""
+        expired = conn.execute(
+            "DELETE FROM responses WHERE created_at < ?", (now - self.ttl_s,)
+        ).rowcount
+        total = conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM responses").fetchone()[0]
+        stale = []
+        if total > self.max_bytes:
+            rows = conn.execute(
+                "SELECT key, size_bytes FROM responses ORDER BY last_access ASC"
+            ).fetchall()
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                stale.append((key,))
+                total -= size
+            conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+        if expired:
+            inc("llm_cache_evictions_total", expired, reason="ttl")
+        if stale:
+            inc("llm_cache_evictions_total", len(stale), reason="size")
+
+    def stats(self) -> Dict:
+        """Số liệu hit/miss, token tiết kiệm + dung lượng hiện tại."""
+        try:
+            with self._connect() as conn:
+                count, size = conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM responses"
+                ).fetchone()
+        except sqlite3.Error:
+            count, size = 0, 0
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits":         self.hits,
+                "misses":       self.misses,
+                "hit_rate":     self.hits / lookups if lookups else 0.0,
+                "tokens_saved": self.tokens_saved,
+                "entries":      count,
+                "size_bytes":   size,
+            }
+
+
+# ============================================
+# SINGLETON
+# ============================================
+
+_cache: Optional[LLMCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[LLMCache]:
+    """Lấy singleton LLMCache (None nếu bị tắt hoặc không mở được file)."""
+    global _cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    _cache = LLMCache()
+                except (OSError, sqlite3.Error) as e:
+                    print(f"[WARN] LLM cache disabled: {e}")
+                    return None
+    return _cache
@@ -3,7 +3,14 @@
 
 import os
 import json
-from typing import Dict, List, Optional
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from .deadline import Deadline, DeadlineExceeded, budget_stage
+from .http_pool import GROQ_READ_TIMEOUT_S, get_http_client
+from .llm_cache import LLMCache, get_llm_cache
+from .metrics import inc, observe
 
 # ============== ĐỌC API KEY (lazy — đọc lúc khởi tạo, không phải lúc import) ==============
 def _get_api_key() -> str:
@@ -21,6 +28,87 @@ def _get_api_key() -> str:
     return key
 
 
+def _get_base_url() -> Optional[str]:
+    """GROQ_BASE_URL — trỏ client sang server khác (vd: mock_groq khi load test)."""
+    return os.getenv("GROQ_BASE_URL", "").rstrip("/") or None
+
+
+# Số lần SDK Groq tự retry khi gặp 429 / 5xx / lỗi kết nối (mặc định của SDK: 2)
+GROQ_MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", "2"))
+
+
+class JsonFieldStream:
+    """
+    Parse dần 1 JSON object đang stream: trả về field string cấp 1 ngay khi
+    chuỗi giá trị của nó đóng ngoặc kép (không đợi cả object).
+
+        fs = JsonFieldStream()
+        fs.feed('{"summary": "Cuộc gọi ')   → {}
+        fs.feed('lừa đảo.", "reason"')      → {"summary": "Cuộc gọi lừa đảo."}
+
+    Giá trị không phải string (mảng, số, object lồng) bị bỏ qua;
+    ký tự trước "{" đầu tiên (LLM nói thêm) cũng vậy. Stream hỏng (escape sai,
+    ngoặc thừa) không raise — field hỏng bị bỏ, bản parse cuối quyết định.
+    """
+
+    def __init__(self):
+        self.fields: Dict[str, str] = {}
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_str = False
+        self._escape = False
+        self._str_start = 0
+        self._key: Optional[str] = None
+        self._expect = "key"   # ở cấp 1: key → colon → value → comma → key ...
+
+    def feed(self, delta: str) -> Dict[str, str]:
+        """Thêm đoạn text mới; trả về các field vừa hoàn tất trong đoạn này."""
+        self._text += delta
+        text = self._text
+        done: Dict[str, str] = {}
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_str:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_str = False
+                    if self._depth == 1:
+                        try:
+                            value = json.loads(text[self._str_start:i + 1])
+                        except ValueError:
+                            value = None   # escape không hợp lệ → bỏ field, giữ nhịp key/value
+                        self._on_string(value, done)
+            elif ch == '"':
+                self._in_str = True
+                self._str_start = i
+            elif ch in "{[":
+                self._depth += 1
+                if self._depth == 1:
+                    self._expect = "key"
+            elif ch in "}]":
+                self._depth = max(0, self._depth - 1)   # ngoặc thừa trước object không làm lệch cấp
+                if self._depth == 1 and self._expect == "value":
+                    self._expect = "comma"   # vừa hết mảng / object lồng
+            elif self._depth == 1 and ch == ":" and self._expect == "colon":
+                self._expect = "value"
+            elif self._depth == 1 and ch == ",":
+                self._expect = "key"
+        self._pos = len(text)
+        return done
+
+    def _on_string(self, value: Optional[str], done: Dict[str, str]) -> None:
+        if self._expect == "key":
+            self._key, self._expect = value, "colon"
+        elif self._expect == "value":
+            if self._key is not None and value is not None:
+                self.fields[self._key] = done[self._key] = value
+            self._expect = "comma"
+
+
 class LLMClient:
     """Client for interacting with Groq LLM API."""
     
@@ -41,7 +129,10 @@ class LLMClient:
         """Lazy initialization of Groq client."""
         if self._client is None:
             from groq import Groq
-            self._client = Groq(api_key=self.api_key)
+            self._client = Groq(
+                api_key=self.api_key, base_url=_get_base_url(),
+                max_retries=GROQ_MAX_RETRIES, http_client=get_http_client(),
+            )
         return self._client
     
     @staticmethod
@@ -61,20 +152,133 @@ class LLMClient:
                 return json.loads(text[start:end + 1])
             raise ValueError(f"Could not parse JSON from: {text[:100]}...")
     
+    def _complete_json(
+        self,
+        model: str,
+        system_prompt: str,
+        user_prompt: str,
+        temperature: float,
+        max_tokens: int,
+        on_field: Optional[Callable[[str, str], None]] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> dict:
+        """
+        Gọi chat completion và parse JSON, qua cache đĩa (llm_cache).
+
+        Hit → không gọi mạng. Chỉ lưu completion đã parse được JSON.
+        on_field(name, value): bật streaming — gọi cho mỗi field string cấp 1
+        ngay khi field đó hoàn tất (cache hit → gọi lần lượt ngay lập tức).
+        deadline: request bị giới hạn bởi phần còn lại của ngân sách "llm";
+        hết ngân sách (trước hoặc trong khi gọi) → raise DeadlineExceeded.
+        """
+        cache = get_llm_cache()
+        key = LLMCache.make_key(model, system_prompt, user_prompt, temperature, max_tokens, _get_base_url())
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                result = self._safe_json_load(cached)
+                if on_field is not None:
+                    for name, value in result.items():
+                        if isinstance(value, str):
+                            on_field(name, value)
+                return result
+
+        client, timeout = self.client, None
+        if deadline is not None:
+            timeout = deadline.check("llm", cap=GROQ_READ_TIMEOUT_S)
+            if timeout < GROQ_READ_TIMEOUT_S:
+                # Ngân sách sắp hết: không để SDK retry nhân timeout lên
+                client = client.with_options(max_retries=0)
+        options = {"timeout": timeout} if timeout is not None else {}
+        start = time.perf_counter()
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ]
+        try:
+            with budget_stage(deadline, "llm"):
+                if on_field is None:
+                    response = client.chat.completions.create(
+                        model=model, messages=messages, temperature=temperature, max_tokens=max_tokens,
+                        **options,
+                    )
+                    content = response.choices[0].message.content.strip()
+                    usage = getattr(response, "usage", None)
+                else:
+                    content, usage = self._stream_fields(
+                        client, model, messages, temperature, max_tokens, on_field, start, timeout,
+                    )
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            # Timeout do chính ngân sách còn lại → báo hết giờ, không phải lỗi API
+            if deadline is not None and deadline.expired("llm"):
+                raise DeadlineExceeded("llm") from e
+            raise
+        observe("llm_request_seconds", time.perf_counter() - start, model=model)
+        result = self._safe_json_load(content)
+
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        inc("llm_tokens_total", prompt_tokens, kind="prompt")
+        inc("llm_tokens_total", completion_tokens, kind="completion")
+        if cache is not None:
+            cache.put(key, model, content, prompt_tokens, completion_tokens)
+        return result
+
+    def _stream_fields(self, client, model, messages, temperature, max_tokens, on_field, start, timeout=None):
+        """
+        Stream completion, báo từng field đã xong qua on_field. Trả về (content, usage).
+        timeout: tổng thời gian tối đa của cả stream (timeout httpx chỉ tính từng lần đọc).
+        """
+        options = {"timeout": timeout} if timeout is not None else {}
+        stream = client.chat.completions.create(
+            model=model, messages=messages, temperature=temperature, max_tokens=max_tokens, stream=True,
+            **options,
+        )
+        fields = JsonFieldStream()
+        parts: List[str] = []
+        usage = None
+        first = True
+        for chunk in stream:
+            if timeout is not None and time.perf_counter() - start > timeout:
+                stream.close()
+                raise DeadlineExceeded("llm")
+            x_groq = getattr(chunk, "x_groq", None)
+            usage = getattr(x_groq, "usage", None) or getattr(chunk, "usage", None) or usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content or ""
+            if not delta:
+                continue
+            parts.append(delta)
+            for name, value in fields.feed(delta).items():
+                if first:
+                    observe("llm_first_field_seconds", time.perf_counter() - start, model=model)
+                    first = False
+                on_field(name, value)
+        return "".join(parts).strip(), usage
+
     def extract_keywords(
         self, 
         transcript: str, 
-        model: Optional[str] = None
+        model: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
     ) -> Dict:
         """
         Extract keywords, signals, and suspicious quotes from transcript.
         
         Args:
-            transcript: Call transcript text
+            transcript: Call transcript, already fitted to the token budget
+                (prompt_builder.build_transcript_excerpt) — sent as-is
             model: LLM model name (optional)
+            deadline: Per-analysis deadline, "llm" stage budget (optional)
             
         Returns:
             Dict with keys: keywords, signals, scammer_quote
+
+        Raises:
+            DeadlineExceeded: the "llm" budget ran out (caller degrades)
         """
         model = model or self.default_model
         
@@ -91,20 +295,14 @@ Yêu cầu:
 - signals: OTP / chuyển tiền / link / giả danh / hối thúc / đe doạ / thông tin nhạy cảm...
 - Không bịa."""
 
-        user_msg = f"Hãy trả về JSON theo đúng format.\n\nTRANSCRIPT:\n{(transcript or '')[:15000]}"
+        user_msg = f"Hãy trả về JSON theo đúng format.\n\nTRANSCRIPT:\n{transcript or ''}"
 
         try:
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_msg},
-                ],
-                temperature=0.2,
-                max_tokens=900,
+            return self._complete_json(
+                model, system_prompt, user_msg, temperature=0.2, max_tokens=900, deadline=deadline,
             )
-            content = response.choices[0].message.content.strip()
-            return self._safe_json_load(content)
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"[WARN] LLM extraction failed: {e}")
             return {"keywords": [], "signals": [], "scammer_quote": ""}
@@ -119,12 +317,15 @@ Yêu cầu:
         scammer_quote: str = "",
         loai_lua_dao: List[str] = None,
         model: Optional[str] = None,
+        on_field: Optional[Callable[[str, str], None]] = None,
+        deadline: Optional[Deadline] = None,
     ) -> Dict:
         """
         Giải thích kết quả + đề xuất lời khuyên.
         
         Args:
-            transcript: Transcript cuộc gọi
+            transcript: Transcript đã chọn lọc theo ngân sách token
+                (prompt_builder.build_transcript_excerpt) — gửi nguyên văn
             ml_score: Điểm nghi ngờ (0-1)
             label: Nhãn dự đoán
             keywords: Từ khóa trích xuất
@@ -132,9 +333,15 @@ Yêu cầu:
             scammer_quote: Trích dẫn đáng ngờ
             loai_lua_dao: Danh sách loại lừa đảo dự đoán (từ Mô hình 2)
             model: LLM model name
+            on_field: Callback (field, text) — bật streaming, nhận summary / reason /
+                recommendation ngay khi từng field hoàn tất (optional)
+            deadline: Deadline của lần phân tích — ngân sách stage "llm" (optional)
             
         Returns:
             Dict: summary, reason, recommendation, loai_lua_dao
+
+        Raises:
+            DeadlineExceeded: hết ngân sách "llm" — caller tự dùng lời khuyên rule-based
         """
         model = model or self.default_model
         
@@ -161,22 +368,17 @@ TÍN HIỆU NGUY HIỂM: {', '.join(signals) if signals else '(không có)'}
 TRÍCH DẪN NGHI NGỜ: {scammer_quote if scammer_quote else '(không có)'}
 
 TRANSCRIPT:
-{(transcript or '')[:15000]}"""
+{transcript or ''}"""
 
         try:
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
-                temperature=0.3,
-                max_tokens=900,
+            result = self._complete_json(
+                model, system_prompt, user_prompt, temperature=0.3, max_tokens=900,
+                on_field=on_field, deadline=deadline,
             )
-            content = response.choices[0].message.content.strip()
-            result = self._safe_json_load(content)
             result["loai_lua_dao"] = loai_lua_dao or []
             return result
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"[WARN] LLM explanation failed: {e}")
             return {
@@ -186,6 +388,22 @@ TRANSCRIPT:
                 "loai_lua_dao": loai_lua_dao or []
             }
 
+
+# Singleton instance
+_llm_instance: Optional[LLMClient] = None
+_llm_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """Lấy singleton LLMClient (raise RuntimeError khi thiếu GROQ_API_KEY)."""
+    global _llm_instance
+    if _llm_instance is None:
+        with _llm_lock:
+            if _llm_instance is None:
+                _llm_instance = LLMClient()
+    return _llm_instance
+
+
 if __name__ == "__main__":
     # Test the LLM client
     client = LLMClient()
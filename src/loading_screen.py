@@ -20,6 +20,8 @@ GIẢI PHÁP TRIỆT ĐỂ:
 import math
 import streamlit as st
 
+from .metrics import inc
+
 _CIRCUMFERENCE = 2 * math.pi * 56  # r = 56
 
 
@@ -107,33 +109,40 @@ def _build_bubbles():
     return "".join(_bubble(*s) for s in specs)
 
 
-def _build_html(percent: int, status_text: str) -> str:
-    dashoffset = _CIRCUMFERENCE * (1 - percent / 100)
+# ── Bố cục: mọi phần tử canh theo tâm màn hình (offset dọc, px) ─────────────
+# Khung tĩnh (nền, bong bóng, tiêu đề, dots) render 1 lần; vòng %, dòng trạng
+# thái và ETA là 3 placeholder riêng → mỗi lần update chỉ gửi field đã đổi.
+_Y_RING   = -150   # vòng tiến độ 128x128
+_Y_TITLE  = -6
+_Y_STATUS = 40
+_Y_ETA    = 90
+_Y_DOTS   = 124
+
+_FIELD_Z = 1000000   # trên overlay (999999)
+
+
+def _centered(y: int, inner: str, extra_style: str = "", fixed: bool = True) -> str:
+    position = "fixed" if fixed else "absolute"
+    return (
+        f'<div style="position:{position};left:50%;top:calc(50% + {y}px);'
+        f'transform:translateX(-50%);z-index:{_FIELD_Z};{extra_style}">'
+        f'{inner}</div>'
+    )
+
 
+def _build_frame_html() -> str:
+    """Overlay + phần tĩnh — chỉ gửi 1 lần mỗi lần show()."""
     bubbles = _build_bubbles()
 
-    # SVG progress circle
-    svg = (
-        '<svg width="128" height="128" viewBox="0 0 128 128" '
-        'style="transform:rotate(-90deg);display:block;">'
-        '<defs>'
-        '<linearGradient id="pg-grad-cld" x1="0%" y1="0%" x2="100%" y2="100%">'
-        '<stop offset="0%" stop-color="#ec4899"/>'
-        '<stop offset="100%" stop-color="#f472b6"/>'
-        '</linearGradient>'
-        '</defs>'
+    ring_track = (
+        '<svg width="128" height="128" viewBox="0 0 128 128" style="display:block;">'
         '<circle cx="64" cy="64" r="56" stroke="#e0e0e0" stroke-width="4" fill="none" opacity="0.3"/>'
-        f'<circle cx="64" cy="64" r="56"'
-        f' stroke="url(#pg-grad-cld)" stroke-width="4" fill="none" stroke-linecap="round"'
-        f' stroke-dasharray="{_CIRCUMFERENCE:.1f}"'
-        f' stroke-dashoffset="{dashoffset:.1f}"'
-        f' style="transition:stroke-dashoffset 0.4s ease;"/>'
         '</svg>'
     )
 
     # 3 dots bounce
     dots = (
-        '<div style="display:flex;gap:8px;margin-top:8px;">'
+        '<div style="display:flex;gap:8px;">'
         + "".join(
             f'<div style="width:12px;height:12px;border-radius:50%;background:#f472b6;'
             f'animation:cld-bounce 1.4s ease-in-out infinite {delay}s;"></div>'
@@ -143,40 +152,81 @@ def _build_html(percent: int, status_text: str) -> str:
     )
 
     # Overlay wrapper — 100% inline, không dùng class nào có CSS ngoài
-    html = (
+    return (
         '<div style="'
         'position:fixed;top:0;left:0;width:100vw;height:100vh;'
         'z-index:999999;'
         'background:linear-gradient(135deg,#dbeafe 0%,#ede9fe 50%,#fce7f3 100%);'
-        'display:flex;align-items:center;justify-content:center;'
         'font-family:Be Vietnam,sans-serif;'
         'animation:cld-fadein 0.4s ease;'
         'overflow:hidden;">'
         + bubbles
-        # Center card
-        + '<div style="display:flex;flex-direction:column;align-items:center;'
-        'gap:16px;position:relative;z-index:1;">'
-        # SVG ring
-        +   '<div style="position:relative;width:128px;height:128px;">'
-        +     svg
-        +     f'<div style="position:absolute;inset:0;display:flex;'
-              f'align-items:center;justify-content:center;'
-              f'font-size:28px;font-weight:700;color:#ec4899;">{percent}%</div>'
-        +   '</div>'
-        # Title
-        +   '<div style="font-size:22px;font-weight:600;color:#374151;margin-top:4px;">'
-              'Đang phân tích'
-            '</div>'
-        # Subtitle / status
-        +   f'<div style="font-size:14px;color:#6b7280;'
-              f'max-width:280px;text-align:center;line-height:1.5;">'
-              f'{status_text}'
-            '</div>'
-        + dots
-        + '</div>'  # end center
-        + '</div>'  # end overlay
+        + _centered(_Y_RING, ring_track, fixed=False)
+        + _centered(
+            _Y_TITLE, 'Đang phân tích',
+            'font-size:22px;font-weight:600;color:#374151;white-space:nowrap;', fixed=False,
+        )
+        + _centered(_Y_DOTS, dots, fixed=False)
+        + '</div>'
+    )
+
+
+def _build_percent_html(percent: int) -> str:
+    dashoffset = _CIRCUMFERENCE * (1 - percent / 100)
+    svg = (
+        '<svg width="128" height="128" viewBox="0 0 128 128" '
+        'style="transform:rotate(-90deg);display:block;">'
+        '<defs>'
+        '<linearGradient id="pg-grad-cld" x1="0%" y1="0%" x2="100%" y2="100%">'
+        '<stop offset="0%" stop-color="#ec4899"/>'
+        '<stop offset="100%" stop-color="#f472b6"/>'
+        '</linearGradient>'
+        '</defs>'
+        f'<circle cx="64" cy="64" r="56"'
+        f' stroke="url(#pg-grad-cld)" stroke-width="4" fill="none" stroke-linecap="round"'
+        f' stroke-dasharray="{_CIRCUMFERENCE:.1f}"'
+        f' stroke-dashoffset="{dashoffset:.1f}"'
+        f' style="transition:stroke-dashoffset 0.4s ease;"/>'
+        '</svg>'
+    )
+    number = (
+        '<div style="position:absolute;inset:0;display:flex;'
+        'align-items:center;justify-content:center;font-family:Be Vietnam,sans-serif;'
+        f'font-size:28px;font-weight:700;color:#ec4899;">{percent}%</div>'
+    )
+    return _centered(_Y_RING, svg + number, "width:128px;height:128px;")
+
+
+def _build_status_html(status_text: str) -> str:
+    return _centered(
+        _Y_STATUS, status_text,
+        'font-family:Be Vietnam,sans-serif;font-size:14px;color:#6b7280;'
+        'width:280px;text-align:center;line-height:1.5;',
+    )
+
+
+def format_eta(eta_s) -> str:
+    """Số giây còn lại → câu hiển thị ("" khi chưa đủ dữ liệu ước tính)."""
+    if eta_s is None:
+        return ""
+    if eta_s < 60:
+        return f"Còn khoảng {int(eta_s)} giây"
+    return f"Còn khoảng {int(round(eta_s / 60))} phút"
+
+
+def _build_eta_html(eta_s) -> str:
+    text = format_eta(eta_s) or "Đang ước tính thời gian còn lại..."
+    return _centered(
+        _Y_ETA, text,
+        'font-family:Be Vietnam,sans-serif;font-size:13px;color:#9ca3af;white-space:nowrap;',
     )
-    return html
+
+
+_FIELD_BUILDERS = {
+    "percent": _build_percent_html,
+    "status":  _build_status_html,
+    "eta_s":   _build_eta_html,
+}
 
 
 class LoadingScreen:
@@ -185,11 +235,20 @@ class LoadingScreen:
 
     20 bong bóng kích thước 12px→120px, 3 màu xen kẽ (tím/xanh/hồng),
     phân bổ đều toàn màn hình theo layout Streamlit.
+
+    Khung tĩnh gửi 1 lần; percent / status / ETA nằm ở placeholder riêng và
+    chỉ được gửi lại khi giá trị đổi (xem apply() + src/progress_bus.py).
+
+    Trong fragment poll (trang analysis): show_frame() ở lần chạy đầy đủ,
+    render_fields() mỗi nhịp — Streamlit xoá element fragment không gửi lại,
+    nên chỉ 3 field nhỏ được gửi lại, khung + bong bóng thì không.
     """
 
     def __init__(self, total_chunks: int = 0):
         self.total_chunks = total_chunks
-        self._placeholder = None
+        self._frame = None
+        self._slots: dict = {}
+        self._values: dict = {}
         self._keyframes_injected = False
 
     def _inject_keyframes(self):
@@ -198,16 +257,36 @@ class LoadingScreen:
             st.markdown(_KEYFRAMES_CSS, unsafe_allow_html=True)
             self._keyframes_injected = True
 
-    def show(self, status_text: str = "Đang chuẩn bị xử lý..."):
+    def show_frame(self):
+        """Chỉ overlay + phần tĩnh (phần lớn payload) — không có field tiến độ."""
         self._inject_keyframes()
-        self._placeholder = st.empty()
-        self._render(percent=0, status_text=status_text)
+        self._frame = st.empty()
+        self._send(self._frame, _build_frame_html(), "frame")
 
-    def update(self, done: int, total: int = 0, status_text: str = ""):
-        if self._placeholder is None:
+    def show(self, status_text: str = "Đang chuẩn bị xử lý..."):
+        self.show_frame()
+        self._slots = {field: st.empty() for field in _FIELD_BUILDERS}
+        self._values = {}
+        self.apply({"percent": 0, "status": status_text, "eta_s": None})
+
+    @classmethod
+    def render_fields(cls, values: dict):
+        """Vẽ percent / status / ETA tại vị trí hiện tại (position:fixed → nằm trên overlay)."""
+        for field, builder in _FIELD_BUILDERS.items():
+            cls._send(st, builder(values.get(field)), field)
+
+    def apply(self, changes: dict):
+        """Chỉ render lại các field trong changes có giá trị khác lần trước."""
+        if self._frame is None:
             self.show()
-            return
-
+        for field, value in changes.items():
+            builder = _FIELD_BUILDERS.get(field)
+            if builder is None or self._values.get(field, object()) == value:
+                continue
+            self._values[field] = value
+            self._send(self._slots[field], builder(value), field)
+
+    def update(self, done: int, total: int = 0, status_text: str = "", eta_s=None):
         real_total = total or self.total_chunks
         if real_total > 0:
             percent = min(int(done / real_total * 100), 99)
@@ -221,17 +300,22 @@ class LoadingScreen:
                 else f"Đã xử lý {done} đoạn..."
             )
 
-        self._render(percent=percent, status_text=status_text)
+        self.apply({"percent": percent, "status": status_text, "eta_s": eta_s})
 
     def done(self):
-        if self._placeholder is not None:
-            self._render(percent=100, status_text="Hoàn tất! Đang tải kết quả...")
-            self._placeholder.empty()
-            self._placeholder = None
-
-    def _render(self, percent: int, status_text: str):
-        html = _build_html(percent=percent, status_text=status_text)
-        self._placeholder.markdown(html, unsafe_allow_html=True)
+        if self._frame is not None:
+            self.apply({"percent": 100, "status": "Hoàn tất! Đang tải kết quả..."})
+            for slot in self._slots.values():
+                slot.empty()
+            self._frame.empty()
+            self._frame = None
+            self._slots = {}
+
+    @staticmethod
+    def _send(slot, html: str, field: str):
+        inc("loading_screen_updates_total", field=field)
+        inc("loading_screen_bytes_total", len(html.encode("utf-8")))
+        slot.markdown(html, unsafe_allow_html=True)
 
 
 # ── Helper ─────────────────────────────────────────────────────────────────
@@ -0,0 +1,104 @@
+# src/media_api.py
+"""
+Phục vụ audio đã upload qua http_sidecar, URL theo sha256 nội dung:
+
+    url = publish_audio(audio_sha256, ext, mime, uploaded_file.getvalue)
+    → http://<sidecar>/media/<sha256>.<ext>     ("" nếu sidecar không chạy)
+
+Khác media endpoint /media/ của Streamlit (gắn với session, bị dọn sau mỗi
+lần chạy cả script nên phải add() + hash lại toàn bộ file mỗi lần vẽ), file
+ở đây sống theo nội dung: rerun / fragment / session khác cùng file đều
+dùng lại đúng 1 URL, trình duyệt cache vĩnh viễn (immutable).
+Hỗ trợ HTTP Range → player chỉ tải đoạn cần seek tới.
+
+Bảo mật: không xác thực — ai biết sha256 của file và gọi được sidecar là
+tải được audio (cùng mô hình với result_api, xem http_sidecar.py).
+
+Cấu hình qua biến môi trường:
+    MEDIA_API_MAX_MB   tổng dung lượng audio giữ trong RAM (mặc định 200; LRU)
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler
+from typing import Callable, Tuple
+
+from .http_sidecar import public_url, register_route, send_bytes
+from .metrics import inc, set_gauge
+
+
+MEDIA_API_MAX_MB = float(os.getenv("MEDIA_API_MAX_MB", "200"))
+
+_ROUTE_PREFIX = "/media/"
+_CACHE_CONTROL = "private, max-age=31536000, immutable"
+_RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+# "<sha256>.<ext>" → (bytes, mime)
+_files: "OrderedDict[str, Tuple[bytes, str]]" = OrderedDict()
+_total_bytes = 0
+_lock = threading.Lock()
+
+
+def publish_audio(audio_sha256: str, ext: str, mime: str, read: Callable[[], bytes]) -> str:
+    """
+    URL sidecar của file audio; "" nếu sidecar không chạy.
+    read() chỉ được gọi khi file chưa có trong RAM (tránh copy bytes mỗi lần vẽ).
+    """
+    global _total_bytes
+    name = f"{audio_sha256}.{ext}"
+    url = public_url(_ROUTE_PREFIX + name)
+    if not url:
+        return ""
+    with _lock:
+        if name in _files:
+            _files.move_to_end(name)
+            return url
+    data = read()
+    with _lock:
+        if name not in _files:
+            _files[name] = (data, mime)
+            _total_bytes += len(data)
+            limit = int(MEDIA_API_MAX_MB * 1024 * 1024)
+            while len(_files) > 1 and _total_bytes > limit:
+                _, (old, _mime) = _files.popitem(last=False)
+                _total_bytes -= len(old)
+        set_gauge("media_api_bytes", _total_bytes)
+    return url
+
+
+def _media_route(req: BaseHTTPRequestHandler) -> None:
+    name = req.path.split("?", 1)[0][len(_ROUTE_PREFIX):]
+    with _lock:
+        entry = _files.get(name)
+    if entry is None:
+        inc("media_requests_total", status="missing")
+        send_bytes(req, b"not found", "text/plain", status=404)
+        return
+    data, mime = entry
+    headers = {"Cache-Control": _CACHE_CONTROL, "Accept-Ranges": "bytes"}
+    match = _RANGE_RE.match(req.headers.get("Range", "").strip())
+    if match is None or not any(match.groups()):
+        inc("media_requests_total", status="ok")
+        send_bytes(req, data, mime, headers=headers)
+        return
+
+    size = len(data)
+    first, last = match.groups()
+    if first:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    else:
+        start, end = max(0, size - int(last)), size - 1   # "bytes=-N": N byte cuối
+    if start > end or start >= size:
+        inc("media_requests_total", status="bad_range")
+        send_bytes(req, b"", mime, status=416, headers={"Content-Range": f"bytes */{size}"})
+        return
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    inc("media_requests_total", status="partial")
+    send_bytes(req, data[start:end + 1], mime, status=206, headers=headers)
+
+
+register_route(_ROUTE_PREFIX, _media_route)
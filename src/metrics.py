@@ -0,0 +1,255 @@
+# src/metrics.py
+"""
+Đo thời gian từng stage của pipeline + xuất metrics dạng Prometheus.
+
+Cách dùng:
+    from .metrics import span, inc
+
+    with span("stt_request"):
+        ...                                  # → histogram analysis_stage_seconds{stage="stt_request"}
+    inc("stt_requests_total", status="ok")   # → counter
+
+Mỗi lần phân tích có thể gom breakdown riêng:
+    with stage_timeline() as tl:
+        ...                                  # mọi span() trong thread này cộng dồn vào tl
+    pool.submit(contextvars.copy_context().run, fn)   # thread khác: mang context theo
+    tl.as_dict()  → {"decode": {"count": 1, "total_s": 0.8}, ...}
+
+Xuất metrics (cấu hình qua biến môi trường):
+    METRICS_FILE               ghi file text Prometheus (node_exporter textfile collector)
+    METRICS_TIMING_BREAKDOWN   "1" → analyze_audio() trả thêm result["timings"]
+    Endpoint /metrics          do http_sidecar phục vụ (xem SIDECAR_PORT)
+"""
+
+from __future__ import annotations
+
+import contextvars
+import functools
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+METRICS_FILE             = os.getenv("METRICS_FILE", "")
+METRICS_TIMING_BREAKDOWN = os.getenv("METRICS_TIMING_BREAKDOWN", "0") == "1"
+
+# Bucket (giây) đủ rộng cho cả stage vài ms (keyword match) lẫn vài chục giây (STT)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+STAGE_HISTOGRAM = "analysis_stage_seconds"
+
+_Labels = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> _Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape_label(value: str) -> str:
+    """Escape giá trị label theo text exposition format: backslash, nháy kép, xuống dòng."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(labels: _Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    body = ",".join(f'{k}="{_escape_label(v)}"' for k, v in items)
+    return "{" + body + "}"
+
+
+class _Histogram:
+    """Histogram cộng dồn (không lưu từng mẫu) — đủ cho Prometheus."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)   # +1 cho +Inf
+        self.total = 0.0
+        self.n = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.n += 1
+
+
+class MetricsRegistry:
+    """Registry counter / gauge / histogram dùng chung toàn process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[_Labels, float]] = {}
+        self._gauges: Dict[str, Dict[_Labels, float]] = {}
+        self._histograms: Dict[str, Dict[_Labels, _Histogram]] = {}
+        self._help: Dict[str, str] = {}
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = _Histogram()
+            hist.observe(value)
+
+    def counter_value(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get(name, {}).get(_label_key(labels), 0.0)
+
+    def render_prometheus(self) -> str:
+        """Xuất toàn bộ metrics theo text exposition format của Prometheus."""
+        lines: List[str] = []
+        with self._lock:
+            for kind, store in (("counter", self._counters), ("gauge", self._gauges)):
+                for name in sorted(store):
+                    if name in self._help:
+                        lines.append(f"# HELP {name} {self._help[name]}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    for labels, value in sorted(store[name].items()):
+                        lines.append(f"{name}{_fmt_labels(labels)} {value:g}")
+            for name in sorted(self._histograms):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, hist in sorted(self._histograms[name].items()):
+                    cumulative = 0
+                    for bound, count in zip(hist.buckets, hist.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_fmt_labels(labels, ('le', f'{bound:g}'))} {cumulative}")
+                    lines.append(f"{name}_bucket{_fmt_labels(labels, ('le', '+Inf'))} {hist.n}")
+                    lines.append(f"{name}_sum{_fmt_labels(labels)} {hist.total:.6f}")
+                    lines.append(f"{name}_count{_fmt_labels(labels)} {hist.n}")
+        return "\n".join(lines) + "\n"
+
+
+# ── Breakdown theo từng lần phân tích ────────────────────────────────────────
+
+class StageTimeline:
+    """Cộng dồn thời gian từng stage cho 1 lần analyze_audio()."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, List[float]] = {}   # stage → [count, total_s]
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            entry = self._stages.setdefault(stage, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def as_dict(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                stage: {"count": int(c), "total_s": round(t, 4)}
+                for stage, (c, t) in self._stages.items()
+            }
+
+
+_current_timeline: contextvars.ContextVar[Optional[StageTimeline]] = contextvars.ContextVar(
+    "current_timeline", default=None
+)
+
+
+@contextmanager
+def stage_timeline() -> Iterator[StageTimeline]:
+    """Gắn 1 StageTimeline mới cho mọi span() chạy trong context hiện tại."""
+    tl = StageTimeline()
+    token = _current_timeline.set(tl)
+    try:
+        yield tl
+    finally:
+        _current_timeline.reset(token)
+
+
+# ── API tiện ích ─────────────────────────────────────────────────────────────
+
+_registry = MetricsRegistry()
+_registry.describe(STAGE_HISTOGRAM, "Thoi gian tung stage cua pipeline phan tich (giay)")
+
+
+def get_registry() -> MetricsRegistry:
+    return _registry
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Đo thời gian 1 stage → histogram + timeline của lần phân tích hiện tại."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _registry.observe(STAGE_HISTOGRAM, elapsed, stage=stage)
+        tl = _current_timeline.get()
+        if tl is not None:
+            tl.add(stage, elapsed)
+
+
+def timed(stage: str):
+    """Decorator: bọc toàn bộ hàm trong span(stage)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def inc(name: str, value: float = 1.0, **labels) -> None:
+    _registry.inc(name, value, **labels)
+
+
+def set_gauge(name: str, value: float, **labels) -> None:
+    _registry.set_gauge(name, value, **labels)
+
+
+def observe(name: str, value: float, **labels) -> None:
+    _registry.observe(name, value, **labels)
+
+
+def render_prometheus() -> str:
+    return _registry.render_prometheus()
+
+
+def write_metrics_file(path: str = "") -> None:
+    """
+    Ghi metrics ra file (atomic rename để collector không đọc file dở).
+    File tạm tên riêng mỗi lần ghi — nhiều job xong cùng lúc không ghi đè nhau.
+    """
+    path = path or METRICS_FILE
+    if not path:
+        return
+    tmp = ""
+    try:
+        with tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", dir=os.path.dirname(os.path.abspath(path)),
+            prefix=os.path.basename(path) + ".", suffix=".tmp", delete=False,
+        ) as f:
+            tmp = f.name
+            f.write(render_prometheus())
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"[WARN] Could not write metrics file {path}: {e}")
+        if tmp:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
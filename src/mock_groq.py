@@ -0,0 +1,436 @@
+# src/mock_groq.py
+"""
+Server giả lập Groq API (offline) để load test / đo độ trễ có kiểm soát.
+
+Cài đúng 2 endpoint pipeline dùng:
+    POST /openai/v1/audio/transcriptions   (multipart; response_format=text|json)
+    POST /openai/v1/chat/completions       (JSON; hỗ trợ stream=true → SSE)
+    GET  /stats                             số request / status / phân vị độ trễ
+
+Benchmark pipeline thật (analyze_audio) trên server giả chạy cùng process:
+    python -m src.mock_groq --bench 8 --concurrency 4 --audio-seconds 120 --p429 0.05
+  → thông lượng (cuộc gọi/phút), phân vị độ trễ mỗi chunk, số request retry.
+  Bench tự tắt result_store + llm_cache: đo pipeline, không đo cache hit.
+
+Chạy:
+    python -m src.mock_groq --port 8787 --stt-latency lognormal:0.8,0.4 \\
+        --llm-latency uniform:0.3,1.2 --p429 0.05 --p5xx 0.02 --seed 1
+
+Trỏ app sang server giả — cache trỏ sang file tạm, nếu không transcript giả
+được lưu dưới sha256 của audio thật và trả lại cho các lần chạy thật sau đó:
+    GROQ_BASE_URL=http://127.0.0.1:8787  GROQ_API_KEY=mock \
+    RESULT_STORE_PATH=/tmp/mock-results.sqlite3  LLM_CACHE_PATH=/tmp/mock-llm.sqlite3 \
+    streamlit run app.py
+(hoặc RESULT_STORE_ENABLED=0 LLM_CACHE_ENABLED=0 để tắt hẳn)
+
+Phân phối độ trễ (giây):  fixed:0.5 | uniform:lo,hi | lognormal:median,sigma | none
+Model Whisper nhanh (tên chứa "turbo" / "distil", chế độ 2 lượt): độ trễ riêng
+--stt-fast-latency, mỗi từ bị bỏ với xác suất --fast-word-drop (giả lập WER cao hơn).
+Lỗi giả lập: mỗi request có xác suất p429 trả 429 (kèm Retry-After), p5xx
+trả 500/502/503 — SDK Groq tự retry theo GROQ_MAX_RETRIES.
+
+Phản hồi mặc định là câu thoại / JSON mẫu (tiếng Việt). --responses FILE
+(JSON đã ghi lại từ API thật) thay thế:
+    {"transcriptions": ["câu 1", "câu 2", ...],            ← quay vòng theo thứ tự
+     "chat": [{"match": "trích xuất", "content": "{...}"}]} ← chọn theo chuỗi con của prompt
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+_TRANSCRIPTIONS = [
+    "Alo, chào anh, tôi gọi từ cơ quan công an quận.",
+    "Anh đang liên quan tới một vụ án rửa tiền, tài khoản của anh bị phong toả.",
+    "Để chứng minh trong sạch anh phải chuyển tiền vào tài khoản tạm giữ ngay hôm nay.",
+    "Anh đọc cho tôi mã OTP vừa gửi về điện thoại, nếu không sẽ bị bắt giam.",
+    "Dạ vâng, tôi hiểu rồi, để tôi kiểm tra lại.",
+]
+
+_CHAT = [
+    {"match": "trích xuất", "content": json.dumps({
+        "keywords": ["công an", "chuyển tiền", "mã OTP", "bắt giam", "phong toả"],
+        "signals": ["giả danh", "chuyển tiền", "OTP", "đe doạ"],
+        "scammer_quote": "Anh đọc cho tôi mã OTP vừa gửi về điện thoại, nếu không sẽ bị bắt giam.",
+    }, ensure_ascii=False)},
+    {"match": "", "content": json.dumps({
+        "summary": "Cuộc gọi có dấu hiệu giả danh công an để chiếm đoạt tiền.",
+        "reason": "Người gọi tự xưng công an, đe doạ bắt giam và yêu cầu chuyển tiền, đọc mã OTP.",
+        "recommendation": "Không chuyển tiền, không đọc OTP. Gọi 113 hoặc đến trụ sở công an gần nhất để xác minh.",
+    }, ensure_ascii=False)},
+]
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """'fixed:0.5' | 'uniform:lo,hi' | 'lognormal:median,sigma' | 'none' → hàm lấy mẫu (giây)."""
+    kind, _, args = spec.partition(":")
+    vals = [float(x) for x in args.split(",") if x]
+    if kind == "none":
+        return lambda rng: 0.0
+    if kind == "fixed":
+        return lambda rng: vals[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(vals[0], vals[1])
+    if kind == "lognormal":
+        mu = math.log(vals[0])
+        return lambda rng: rng.lognormvariate(mu, vals[1])
+    raise ValueError(f"Phân phối độ trễ không hợp lệ: {spec}")
+
+
+def _quantile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(q * len(values)))], 4)
+
+
+class MockGroq:
+    """Trạng thái dùng chung của server giả: RNG, phản hồi, thống kê."""
+
+    def __init__(self, stt_latency: str = "none", llm_latency: str = "none",
+                 token_interval: float = 0.0, p429: float = 0.0, p5xx: float = 0.0,
+                 retry_after: float = 1.0, responses: Optional[Dict] = None, seed: Optional[int] = None,
+                 stt_fast_latency: Optional[str] = None, fast_word_drop: float = 0.0):
+        self.stt_latency = parse_latency(stt_latency)
+        self.stt_fast_latency = parse_latency(stt_fast_latency) if stt_fast_latency else self.stt_latency
+        self.fast_word_drop = fast_word_drop
+        self.llm_latency = parse_latency(llm_latency)
+        self.token_interval = token_interval
+        self.p429, self.p5xx, self.retry_after = p429, p5xx, retry_after
+        responses = responses or {}
+        self.transcriptions = responses.get("transcriptions") or _TRANSCRIPTIONS
+        self.chat = responses.get("chat") or _CHAT
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._next_stt = 0
+        self.counts: Dict[str, int] = {}
+        self.latencies: Dict[str, List[float]] = {"stt": [], "chat": []}
+
+    # ── Lấy mẫu (dưới lock → kết quả tái lập được với cùng seed + thứ tự request) ──
+    def draw(self, endpoint: str, model: str = "", audio: bytes = b"") -> Dict:
+        fast = any(tag in model for tag in ("turbo", "distil"))
+        with self._lock:
+            roll = self._rng.random()
+            if endpoint == "stt":
+                latency = (self.stt_fast_latency if fast else self.stt_latency)(self._rng)
+            else:
+                latency = self.llm_latency(self._rng)
+            status = 429 if roll < self.p429 else (
+                self._rng.choice((500, 502, 503)) if roll < self.p429 + self.p5xx else 200
+            )
+            text = None
+            if endpoint == "stt" and status == 200:
+                if audio:
+                    # Cùng audio → cùng câu (như API thật): lượt 2 transcribe lại đúng đoạn đó
+                    text = self.transcriptions[int(hashlib.sha1(audio).hexdigest(), 16) % len(self.transcriptions)]
+                else:
+                    text = self.transcriptions[self._next_stt % len(self.transcriptions)]
+                    self._next_stt += 1
+                if fast and self.fast_word_drop:
+                    text = " ".join(w for w in text.split() if self._rng.random() >= self.fast_word_drop)
+        return {"latency": latency, "status": status, "text": text}
+
+    def record(self, endpoint: str, status: int, elapsed: float) -> None:
+        with self._lock:
+            key = f"{endpoint}:{status}"
+            self.counts[key] = self.counts.get(key, 0) + 1
+            if status == 200:
+                self.latencies[endpoint].append(elapsed)
+
+    def chat_content(self, prompt: str) -> str:
+        for entry in self.chat:
+            if entry.get("match", "") in prompt:
+                return entry["content"]
+        return self.chat[-1]["content"]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "counts": dict(self.counts),
+                "latency": {
+                    ep: {"n": len(v), "p50": _quantile(v, 0.50), "p95": _quantile(v, 0.95), "p99": _quantile(v, 0.99)}
+                    for ep, v in self.latencies.items()
+                },
+            }
+
+
+def _parse_multipart(body: bytes) -> Tuple[Dict[str, str], bytes]:
+    """(field text, bytes file audio) từ body multipart của request transcriptions."""
+    fields = {k.decode(): v.decode("utf-8", "replace")
+              for k, v in re.findall(rb'name="(\w+)"\r\n\r\n(.*?)\r\n--', body, re.S)}
+    match = re.search(rb'filename="[^"]*"\r\n(?:[^\r\n]+\r\n)*\r\n(.*?)\r\n--', body, re.S)
+    return fields, match.group(1) if match else b""
+
+
+def _make_handler(mock: MockGroq):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"   # keep-alive như API thật
+        disable_nagle_algorithm = True
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _send(self, status: int, body: bytes, content_type: str, headers: Optional[Dict] = None) -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_error(self, status: int) -> None:
+            headers = {"Retry-After": str(mock.retry_after)} if status == 429 else {}
+            body = json.dumps({"error": {"message": f"mock error {status}", "type": "mock_error"}}).encode()
+            self._send(status, body, "application/json", headers)
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/stats":
+                self._send(200, json.dumps(mock.stats(), ensure_ascii=False).encode(), "application/json")
+            else:
+                self._send_error(404)
+
+        def do_POST(self):
+            start = time.perf_counter()
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            if self.path.endswith("/audio/transcriptions"):
+                endpoint = "stt"
+            elif self.path.endswith("/chat/completions"):
+                endpoint = "chat"
+            else:
+                self._send_error(404)
+                return
+            fields, audio = _parse_multipart(body) if endpoint == "stt" else ({}, b"")
+            draw = mock.draw(endpoint, fields.get("model", ""), audio)
+            time.sleep(draw["latency"])
+            status = draw["status"]
+            try:
+                if status != 200:
+                    self._send_error(status)
+                elif endpoint == "stt":
+                    self._transcription(fields, draw["text"])
+                else:
+                    self._chat(json.loads(body or b"{}"))
+            except (BrokenPipeError, ConnectionResetError):
+                # Client đã bỏ request (timeout / deadline) — ghi nhận như nginx 499
+                status = 499
+                self.close_connection = True
+            mock.record(endpoint, status, time.perf_counter() - start)
+
+        def _transcription(self, fields: Dict[str, str], text: str) -> None:
+            if fields.get("response_format", "json") == "text":
+                self._send(200, text.encode("utf-8"), "text/plain; charset=utf-8")
+            else:
+                self._send(200, json.dumps({"text": text}, ensure_ascii=False).encode(), "application/json")
+
+        def _chat(self, req: Dict) -> None:
+            prompt = "\n".join(str(m.get("content", "")) for m in req.get("messages", []))
+            content = mock.chat_content(prompt)
+            model = req.get("model", "mock")
+            usage = {"prompt_tokens": len(prompt) // 3, "completion_tokens": len(content) // 3}
+            usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+            base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "created": int(time.time()), "model": model}
+            if not req.get("stream"):
+                resp = dict(base, object="chat.completion", usage=usage, choices=[{
+                    "index": 0, "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": content},
+                }])
+                self._send(200, json.dumps(resp, ensure_ascii=False).encode(), "application/json")
+                return
+
+            # SSE: mỗi "token" 4 ký tự, cách nhau token_interval giây
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def event(payload) -> None:
+                data = f"data: {payload}\n\n".encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            for i in range(0, len(content), 4):
+                event(json.dumps(dict(base, object="chat.completion.chunk", x_groq={"id": base["id"]}, choices=[{
+                    "index": 0, "finish_reason": None, "delta": {"content": content[i:i + 4]},
+                }]), ensure_ascii=False))
+                if mock.token_interval:
+                    time.sleep(mock.token_interval)
+            event(json.dumps(dict(base, object="chat.completion.chunk", x_groq={"id": base["id"], "usage": usage},
+                                  choices=[{"index": 0, "finish_reason": "stop", "delta": {}}])))
+            event("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+
+    return Handler
+
+
+def start_mock_groq(port: int = 0, host: str = "127.0.0.1", **options) -> ThreadingHTTPServer:
+    """Chạy server giả trong daemon thread (dùng trong benchmark). server.mock → MockGroq."""
+    mock = MockGroq(**options)
+    server = ThreadingHTTPServer((host, port), _make_handler(mock))
+    server.daemon_threads = True
+    server.mock = mock
+    threading.Thread(target=server.serve_forever, name="mock-groq", daemon=True).start()
+    return server
+
+
+# ── Benchmark ────────────────────────────────────────────────────────────────
+
+def _bench_wav(seconds: float, chunk_seconds: int = 10) -> bytes:
+    """WAV gần như im lặng; mỗi đoạn chunk_seconds có mức DC riêng → mỗi chunk 1 nội dung khác nhau."""
+    import io
+    import struct
+    import wave
+    rate = 16000
+    total, per_chunk = int(seconds * rate), rate * chunk_seconds
+    frames = bytearray()
+    for start in range(0, total, per_chunk):
+        frames += struct.pack("<h", 1 + start // per_chunk) * min(per_chunk, total - start)
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(bytes(frames))
+    return buf.getvalue()
+
+
+def run_benchmark(server: ThreadingHTTPServer, calls: int, concurrency: int, audio_seconds: float,
+                  two_pass: bool = False) -> Dict:
+    """
+    Chạy `calls` lần analyze_audio (song song `concurrency`) qua server giả.
+    two_pass: lượt nhanh (quality="fast") rồi refine_audio — đo thêm thời gian
+    tới kết luận đầu và tỉ lệ kết luận bị đổi ở lượt 2.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    os.environ["GROQ_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ.setdefault("GROQ_API_KEY", "mock")
+    # Không đọc / ghi cache thật: kết quả giả không được lọt vào cache, và
+    # từ lần thứ 2 bench sẽ chỉ đo cache hit thay vì pipeline
+    from . import llm_cache, result_store
+    llm_cache.LLM_CACHE_ENABLED = False
+    result_store.RESULT_STORE_ENABLED = False
+    from .analysis_engine import analyze_audio, refine_audio
+    from .request_hedging import hedge_stats
+
+    audio = _bench_wav(audio_seconds)
+    chunk_latencies: List[float] = []
+    first_verdicts: List[float] = []
+    refined_at: List[float] = []
+    refine_infos: List[Dict] = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def one_call(i: int) -> None:
+        last = [time.perf_counter()]
+
+        def on_chunk(chunk: Dict) -> None:
+            now = time.perf_counter()
+            with lock:
+                chunk_latencies.append(now - last[0])
+                # transcribe_file nuốt lỗi và trả "" sau khi SDK hết lượt retry
+                errors[0] += not chunk["text"] or chunk["text"].startswith("[Lỗi chunk")
+            last[0] = now
+
+        started = time.perf_counter()
+        result = analyze_audio(audio, f"bench_{i}.wav", chunk_callback=on_chunk,
+                               quality="fast" if two_pass else None)
+        verdict_s = time.perf_counter() - started
+        refined = refine_audio(audio, f"bench_{i}.wav", result) if two_pass else None
+        with lock:
+            first_verdicts.append(verdict_s)
+            if refined is not None:
+                refined_at.append(time.perf_counter() - started)
+                refine_infos.append(refined["refine"])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one_call, range(calls)))
+    elapsed = time.perf_counter() - start
+
+    stats = server.mock.stats()
+    hedges = hedge_stats()
+    sent = sum(n for k, n in stats["counts"].items() if k.startswith("stt:"))
+    report = {
+        "calls":             calls,
+        "seconds":           round(elapsed, 2),
+        "calls_per_min":     round(calls / elapsed * 60, 1),
+        "chunks":            len(chunk_latencies),
+        "chunk_p50":         _quantile(chunk_latencies, 0.50),
+        "chunk_p95":         _quantile(chunk_latencies, 0.95),
+        "chunk_p99":         _quantile(chunk_latencies, 0.99),
+        "stt_requests_sent": sent,
+        # retry của SDK + bản sao hedge (lượt 2 gửi lại mỗi chunk 1 lần — không tính)
+        "extra_requests":    sent - len(chunk_latencies) * (2 if two_pass else 1),
+        "hedged_requests":   hedges["hedges"],
+        "hedges_won":        hedges["hedges_won"],
+        "failed_chunks":     errors[0],
+        "first_verdict_p50": _quantile(first_verdicts, 0.50),
+        "first_verdict_p95": _quantile(first_verdicts, 0.95),
+    }
+    if two_pass:
+        report.update({
+            "refined_p50":         _quantile(refined_at, 0.50),
+            "refined_p95":         _quantile(refined_at, 0.95),
+            "chunks_changed":      sum(r["changed"] for r in refine_infos),
+            "verdict_change_rate": round(sum(r["verdict_changed"] for r in refine_infos) / len(refine_infos), 3),
+        })
+    report["server"] = stats["counts"]
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Server giả lập Groq API cho load test offline")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--stt-latency", default="lognormal:0.8,0.4")
+    parser.add_argument("--llm-latency", default="uniform:0.3,1.0", help="độ trễ tới token đầu")
+    parser.add_argument("--token-interval", type=float, default=0.01, help="giây giữa 2 token khi stream")
+    parser.add_argument("--p429", type=float, default=0.0)
+    parser.add_argument("--p5xx", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--responses", help="file JSON phản hồi đã ghi lại")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--bench", type=int, default=0, metavar="CALLS",
+                        help="chạy analyze_audio CALLS lần qua server giả rồi in kết quả")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--audio-seconds", type=float, default=60)
+    parser.add_argument("--two-pass", action="store_true", help="bench: lượt nhanh + lượt tinh chỉnh")
+    parser.add_argument("--stt-fast-latency", help="độ trễ model Whisper nhanh (mặc định = --stt-latency)")
+    parser.add_argument("--fast-word-drop", type=float, default=0.0,
+                        help="xác suất model nhanh bỏ mất 1 từ")
+    args = parser.parse_args()
+
+    responses = None
+    if args.responses:
+        with open(args.responses, encoding="utf-8") as f:
+            responses = json.load(f)
+    server = start_mock_groq(
+        args.port, args.host,
+        stt_latency=args.stt_latency, llm_latency=args.llm_latency, token_interval=args.token_interval,
+        p429=args.p429, p5xx=args.p5xx, retry_after=args.retry_after,
+        responses=responses, seed=args.seed,
+        stt_fast_latency=args.stt_fast_latency, fast_word_drop=args.fast_word_drop,
+    )
+    if args.bench:
+        print(json.dumps(run_benchmark(server, args.bench, args.concurrency, args.audio_seconds, args.two_pass),
+                         ensure_ascii=False, indent=2))
+        raise SystemExit(0)
+    print(f"[OK] Mock Groq tại http://{args.host}:{server.server_address[1]}  (GROQ_BASE_URL)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
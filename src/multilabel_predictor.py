@@ -16,11 +16,15 @@ THAY ĐỔI so với phiên bản cũ:
 import re
 import json
 import sys
+import threading
 import joblib
 import numpy as np
 from pathlib import Path
 from typing import Dict, List, Optional
 
+from .deadline import Deadline
+from .metrics import span
+
 
 # Ngưỡng cảnh báo mặc định
 NGUONG_CANH_BAO = 0.4
@@ -153,7 +157,8 @@ class MultilabelPredictor:
         self, 
         text: str = "",
         keywords: List[str] = None,
-        nguong_canh_bao: float = NGUONG_CANH_BAO
+        nguong_canh_bao: float = NGUONG_CANH_BAO,
+        deadline: Optional[Deadline] = None,
     ) -> Dict:
         """
         Dự đoán loại lừa đảo và đưa ra cảnh báo.
@@ -162,6 +167,7 @@ class MultilabelPredictor:
             text: Văn bản từ khóa (space-separated, cho TF-IDF)
             keywords: Danh sách từ khóa (optional)
             nguong_canh_bao: Ngưỡng xác suất để cảnh báo
+            deadline: Hết ngân sách "scoring" → bỏ ML, dùng rule-based (optional)
             
         Returns:
             Dict:
@@ -170,6 +176,7 @@ class MultilabelPredictor:
                 - loai_du_doan: List[str] (các loại lừa đảo dự đoán)
                 - chi_tiet: List[Dict] (xác suất từng loại)
                 - nguon: str ("ml_model" hoặc "rule_based")
+                - degraded: True — CHỈ có khi bỏ ML vì hết ngân sách "scoring"
         """
         # Kiểm tra đầu vào
         if not text and not keywords:
@@ -188,8 +195,14 @@ class MultilabelPredictor:
         elif not text:
             pass  # giữ text gốc nếu không có keywords
         
-        # Nếu có ML model → dùng ML
-        if self._loaded and self.mo_hinh and self.tfidf:
+        use_ml = bool(self._loaded and self.mo_hinh and self.tfidf)
+        degraded = use_ml and deadline is not None and deadline.expired("scoring")
+        if degraded:
+            deadline.degrade("scoring", "cham diem rule-based")
+            use_ml = False
+
+        # Nếu có ML model (và còn thời gian) → dùng ML
+        if use_ml:
             result = self._predict_ml(text, nguong_canh_bao)
         else:
             # Fallback: rule-based dùng từ khóa đặc trưng
@@ -197,6 +210,8 @@ class MultilabelPredictor:
         
         if warning:
             result["warning"] = warning
+        if degraded:
+            result["degraded"] = True   # kết quả không đầy đủ → result_store không lưu
         
         return result
     
@@ -217,83 +232,89 @@ class MultilabelPredictor:
             }
         """
         try:
-            X = self.tfidf.transform([text])
-
-            chi_tiet = []
-            loai_du_doan = []
-            xac_suat_max = 0.0
-
-            for loai_id, info in self.mo_hinh.items():
-                loai_id_int = int(loai_id)
-                loai_ten    = info.get('loai_ten', self.id_to_loai.get(loai_id_int, f'Loại {loai_id}'))
-                best_name   = info.get('best_model', 'RandomForest')
-                # Ngưỡng riêng của loại này (đã tối ưu lúc train)
-                threshold   = float(info.get('threshold', nguong_canh_bao))
-
-                # Lấy model tốt nhất từ dict 'models'
-                models_dict = info.get('models', {})
-                model = models_dict.get(best_name)
-
-                # Fallback nếu best_name không khớp key trong models_dict
-                if model is None:
-                    for fallback in ('RandomForest', 'XGBoost', 'DecisionTree'):
-                        model = models_dict.get(fallback)
-                        if model is not None:
-                            best_name = fallback
-                            break
-
-                if model is None:
-                    continue  # bỏ qua loại này nếu không có model
-
-                # Xác suất
-                if hasattr(model, 'predict_proba'):
-                    proba = model.predict_proba(X)[0]
-                    xac_suat = float(proba[1]) if len(proba) > 1 else float(proba[0])
-                else:
-                    xac_suat = float(model.predict(X)[0])
-
-                # Quyết định dựa trên threshold riêng của loại
-                du_doan = 1 if xac_suat >= threshold else 0
-
-                chi_tiet.append({
-                    "loai_id":   loai_id_int,
-                    "loai_ten":  loai_ten,
-                    "du_doan":   du_doan,
-                    "xac_suat":  xac_suat,
-                    "threshold": threshold,
-                    "mo_hinh":   best_name,
-                })
-
-                if du_doan == 1:
-                    loai_du_doan.append(loai_ten)
-
-                xac_suat_max = max(xac_suat_max, xac_suat)
-
-            # Sắp xếp theo xác suất giảm dần
-            chi_tiet.sort(key=lambda x: x['xac_suat'], reverse=True)
-
-            # Điểm nghi ngờ tổng thể
-            if loai_du_doan:
-                diem = max(ct['xac_suat'] for ct in chi_tiet if ct['du_doan'] == 1)
-            else:
-                diem = xac_suat_max
-
-            canh_bao = len(loai_du_doan) > 0 or diem >= nguong_canh_bao
-
-            return {
-                "canh_bao":      canh_bao,
-                "diem_nghi_ngo": float(diem),
-                "loai_du_doan":  loai_du_doan,
-                "so_loai":       len(loai_du_doan),
-                "chi_tiet":      chi_tiet,
-                "nguon":         "ml_model",
-                "ghi_chu":       (f"Phát hiện {len(loai_du_doan)} loại lừa đảo"
-                                  if loai_du_doan else "Không phát hiện lừa đảo rõ ràng"),
-            }
+            with span("tfidf_transform"):
+                X = self.tfidf.transform([text])
+
+            with span("model_inference"):
+                return self._predict_ml_scores(X, nguong_canh_bao)
 
         except Exception as e:
             print(f"[ERROR] ML prediction error: {e}")
             return self._ket_qua_rong(f"Loi du doan: {e}")
+
+    def _predict_ml_scores(self, X, nguong_canh_bao: float) -> Dict:
+        """Chạy model tốt nhất của từng loại trên vector TF-IDF X."""
+        chi_tiet = []
+        loai_du_doan = []
+        xac_suat_max = 0.0
+
+        for loai_id, info in self.mo_hinh.items():
+            loai_id_int = int(loai_id)
+            loai_ten    = info.get('loai_ten', self.id_to_loai.get(loai_id_int, f'Loại {loai_id}'))
+            best_name   = info.get('best_model', 'RandomForest')
+            # Ngưỡng riêng của loại này (đã tối ưu lúc train)
+            threshold   = float(info.get('threshold', nguong_canh_bao))
+
+            # Lấy model tốt nhất từ dict 'models'
+            models_dict = info.get('models', {})
+            model = models_dict.get(best_name)
+
+            # Fallback nếu best_name không khớp key trong models_dict
+            if model is None:
+                for fallback in ('RandomForest', 'XGBoost', 'DecisionTree'):
+                    model = models_dict.get(fallback)
+                    if model is not None:
+                        best_name = fallback
+                        break
+
+            if model is None:
+                continue  # bỏ qua loại này nếu không có model
+
+            # Xác suất
+            if hasattr(model, 'predict_proba'):
+                proba = model.predict_proba(X)[0]
+                xac_suat = float(proba[1]) if len(proba) > 1 else float(proba[0])
+            else:
+                xac_suat = float(model.predict(X)[0])
+
+            # Quyết định dựa trên threshold riêng của loại
+            du_doan = 1 if xac_suat >= threshold else 0
+
+            chi_tiet.append({
+                "loai_id":   loai_id_int,
+                "loai_ten":  loai_ten,
+                "du_doan":   du_doan,
+                "xac_suat":  xac_suat,
+                "threshold": threshold,
+                "mo_hinh":   best_name,
+            })
+
+            if du_doan == 1:
+                loai_du_doan.append(loai_ten)
+
+            xac_suat_max = max(xac_suat_max, xac_suat)
+
+        # Sắp xếp theo xác suất giảm dần
+        chi_tiet.sort(key=lambda x: x['xac_suat'], reverse=True)
+
+        # Điểm nghi ngờ tổng thể
+        if loai_du_doan:
+            diem = max(ct['xac_suat'] for ct in chi_tiet if ct['du_doan'] == 1)
+        else:
+            diem = xac_suat_max
+
+        canh_bao = len(loai_du_doan) > 0 or diem >= nguong_canh_bao
+
+        return {
+            "canh_bao":      canh_bao,
+            "diem_nghi_ngo": float(diem),
+            "loai_du_doan":  loai_du_doan,
+            "so_loai":       len(loai_du_doan),
+            "chi_tiet":      chi_tiet,
+            "nguon":         "ml_model",
+            "ghi_chu":       (f"Phát hiện {len(loai_du_doan)} loại lừa đảo"
+                              if loai_du_doan else "Không phát hiện lừa đảo rõ ràng"),
+        }
     
     def _predict_rule_based(
         self, 
@@ -372,14 +393,18 @@ class MultilabelPredictor:
 # ============================================
 
 _predictor: Optional[MultilabelPredictor] = None
+_predictor_lock = threading.Lock()
 
 
 def get_multilabel_predictor() -> MultilabelPredictor:
-    """Lấy singleton predictor."""
+    """Lấy singleton predictor (an toàn khi warm-up và job đầu tiên gọi cùng lúc)."""
     global _predictor
     if _predictor is None:
-        _predictor = MultilabelPredictor()
-        _predictor.load_models()
+        with _predictor_lock:
+            if _predictor is None:
+                predictor = MultilabelPredictor()
+                predictor.load_models()
+                _predictor = predictor
     return _predictor
 
 
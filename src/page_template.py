@@ -0,0 +1,90 @@
+# src/page_template.py
+"""
+Template trang HTML "biên dịch sẵn": tách + minify phần tĩnh 1 lần,
+mỗi lần render chỉ nối các slot động.
+
+Cú pháp giống str.format (các view vốn đã dùng): {slot} là chỗ thay,
+{{ / }} là ngoặc nhọn thật (CSS, JS). Không hỗ trợ format spec / conversion.
+
+    PAGE = PageTemplate(HTML, name="home", static={"css": CSS})
+    html = PAGE.render(filename="call.mp3", chart_html=...)
+
+Minify (an toàn cho HTML + CSS + JS inline):
+  - bỏ indent / dòng trống (giữ 1 newline → JS không đổi nghĩa)
+  - bỏ newline giữa 2 thẻ  >\\n<  (ngoài <script>)
+  - trong <style>: bỏ comment, gộp khoảng trắng, bỏ space quanh { } ; :
+"""
+
+from __future__ import annotations
+
+import re
+from string import Formatter
+from typing import Dict, List, Optional, Tuple
+
+from .metrics import set_gauge
+
+
+# Đánh dấu vị trí slot trong lúc minify (không phải khoảng trắng → không bị đụng tới)
+_SLOT_MARK = "\x00{}\x00"
+_SLOT_RE   = re.compile("\x00(\\d+)\x00")
+
+_STYLE_RE  = re.compile(r"(<style[^>]*>)(.*?)(</style>)", re.S | re.I)
+_SCRIPT_RE = re.compile(r"(<script[^>]*>.*?</script>)", re.S | re.I)
+
+
+def _minify_css(css: str) -> str:
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};])\s*", r"\1", css)
+    css = re.sub(r";}", "}", css)
+    return css.strip()
+
+
+def minify_html(html: str) -> str:
+    """Minify bảo thủ — không đổi cách trình duyệt hiển thị / chạy script."""
+    html = re.sub(r"[ \t]*\n\s*", "\n", html)
+    html = _STYLE_RE.sub(lambda m: m.group(1) + _minify_css(m.group(2)) + m.group(3), html)
+    # >\n< ngoài <script> (trong script newline có thể là dấu kết thúc câu lệnh)
+    parts = _SCRIPT_RE.split(html)
+    for i in range(0, len(parts), 2):
+        parts[i] = parts[i].replace(">\n<", "><")
+    return "".join(parts).strip()
+
+
+class PageTemplate:
+    """Template đã tách sẵn thành [literal, slot, literal, slot, ..., literal]."""
+
+    def __init__(self, source: str, name: str, static: Optional[Dict[str, str]] = None):
+        self.name = name
+        static = static or {}
+        marked: List[str] = []
+        slots: List[str] = []
+        for literal, field, spec, conversion in Formatter().parse(source):
+            marked.append(literal)
+            if field is None:
+                continue
+            if spec or conversion or not field.isidentifier():
+                raise ValueError(f"Template {name}: slot không hợp lệ {{{field}}}")
+            if field in static:
+                marked.append(static[field])   # slot tĩnh → gộp vào literal, minify luôn
+            else:
+                marked.append(_SLOT_MARK.format(len(slots)))
+                slots.append(field)
+
+        pieces = _SLOT_RE.split(minify_html("".join(marked)))
+        # split với group → [literal, idx, literal, idx, ..., literal]
+        self._literals: Tuple[str, ...] = tuple(pieces[0::2])
+        self._slots: Tuple[str, ...] = tuple(slots[int(i)] for i in pieces[1::2])
+        self.slot_names = frozenset(self._slots)
+        self.static_bytes = sum(len(p.encode("utf-8")) for p in self._literals)
+        set_gauge("page_template_static_bytes", self.static_bytes, page=name)
+
+    def render(self, **values) -> str:
+        missing = self.slot_names - values.keys()
+        if missing:
+            raise KeyError(f"Template {self.name}: thiếu slot {sorted(missing)}")
+        out = [self._literals[0]]
+        for slot, literal in zip(self._slots, self._literals[1:]):
+            out.append(str(values[slot]))
+            out.append(literal)
+        return "".join(out)
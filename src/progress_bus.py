@@ -0,0 +1,149 @@
+# src/progress_bus.py
+"""
+Kênh tiến độ (progress) giữa worker phân tích và UI — có throttle + ETA.
+
+Worker gọi publish() sau mỗi chunk (có thể hàng trăm lần/giây khi STT
+chạy song song); publish chỉ ghi đè trạng thái mới nhất, không render gì.
+Mỗi người xem (script run đang poll) giữ 1 ProgressSubscription riêng:
+
+    sub = bus.subscribe()
+    changes = sub.poll()     # None nếu chưa tới lượt / không có gì đổi
+    # → {"percent": 42, "status": "...", "eta_s": 40}  (chỉ field đã đổi)
+
+→ Số lần gửi HTML qua websocket bị chặn trên bởi 1/min_interval,
+  và field nào không đổi thì không gửi lại.
+
+ETA = số chunk còn lại × độ trễ mỗi chunk (EWMA thời gian giữa các lần
+hoàn tất chunk — đã phản ánh mức song song thực tế), làm tròn thô để
+con số không nhảy liên tục.
+
+Cấu hình qua biến môi trường:
+    PROGRESS_MIN_INTERVAL_S   khoảng cách tối thiểu giữa 2 lần gửi (mặc định 1.0)
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from .metrics import inc
+
+
+PROGRESS_MIN_INTERVAL_S = float(os.getenv("PROGRESS_MIN_INTERVAL_S", "1.0"))
+
+# Trọng số mẫu mới trong EWMA độ trễ mỗi chunk
+_LATENCY_ALPHA = 0.3
+
+
+def _round_eta(seconds: float) -> int:
+    """Làm tròn ETA: < 1 phút → bội 5 giây, còn lại → bội 1 phút."""
+    if seconds < 60:
+        return max(5, int(round(seconds / 5.0)) * 5)
+    return int(round(seconds / 60.0)) * 60
+
+
+def progress_status(done: int, total: int) -> str:
+    if total > 0:
+        return f"Đang xử lý đoạn {done}/{total}..."
+    return f"Đã xử lý {done} đoạn..."
+
+
+class ProgressBus:
+    """Trạng thái tiến độ mới nhất của 1 job + ước tính độ trễ mỗi chunk."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._done = 0
+        self._total = 0
+        self._status = ""
+        self._started_at = time.perf_counter()
+        self._last_chunk_at: Optional[float] = None
+        self._chunk_latency: Optional[float] = None
+
+    # ── Worker thread ────────────────────────────────────────────────────
+    def publish(self, done: int, total: int, status: str = "") -> None:
+        """Ghi nhận tiến độ mới (rẻ — chỉ cập nhật vài biến dưới lock)."""
+        now = time.perf_counter()
+        with self._lock:
+            finished = done - self._done
+            if finished > 0:
+                since = self._last_chunk_at if self._last_chunk_at is not None else self._started_at
+                sample = (now - since) / finished
+                self._chunk_latency = (
+                    sample if self._chunk_latency is None
+                    else _LATENCY_ALPHA * sample + (1 - _LATENCY_ALPHA) * self._chunk_latency
+                )
+                self._last_chunk_at = now
+            self._done, self._total = done, total
+            self._status = status
+            self._version += 1
+        inc("progress_events_published_total")
+
+    # ── Đọc ──────────────────────────────────────────────────────────────
+    def snapshot(self) -> Dict:
+        """{"version", "done", "total", "percent", "status", "eta_s"} hiện tại."""
+        with self._lock:
+            done, total, version = self._done, self._total, self._version
+            status = self._status or progress_status(done, total)
+            latency = self._chunk_latency
+        percent = min(int(done / total * 100), 99) if total > 0 else 0
+        eta_s = None
+        if latency is not None and total > done:
+            eta_s = _round_eta((total - done) * latency)
+        return {
+            "version": version,
+            "done":    done,
+            "total":   total,
+            "percent": percent,
+            "status":  status,
+            "eta_s":   eta_s,
+        }
+
+    def subscribe(self, min_interval: float = PROGRESS_MIN_INTERVAL_S) -> "ProgressSubscription":
+        return ProgressSubscription(self, min_interval)
+
+
+class ProgressSubscription:
+    """Góc nhìn của 1 người xem: gộp update theo nhịp + chỉ trả field đã đổi."""
+
+    # Field UI thực sự hiển thị — done/total đã nằm trong status/percent
+    FIELDS = ("percent", "status", "eta_s")
+
+    def __init__(self, bus: ProgressBus, min_interval: float):
+        self._bus = bus
+        self._min_interval = min_interval
+        self._sent: Dict = {}
+        self._seen_version = -1
+        self._last_emit = 0.0
+
+    def poll(self, force: bool = False) -> Optional[Dict]:
+        """
+        Field đã đổi kể từ lần gửi trước, hoặc None nếu chưa tới nhịp gửi /
+        không có gì mới. force=True bỏ qua throttle (vd: lần vẽ đầu tiên).
+        """
+        now = time.perf_counter()
+        if not force and now - self._last_emit < self._min_interval:
+            return None
+        snap = self._bus.snapshot()
+        if snap["version"] == self._seen_version and not force:
+            return None
+        coalesced = max(0, snap["version"] - self._seen_version - 1)
+        self._seen_version = snap["version"]
+
+        changes = {f: snap[f] for f in self.FIELDS if f not in self._sent or self._sent[f] != snap[f]}
+        if coalesced:
+            inc("progress_events_coalesced_total", coalesced)
+        if not changes:
+            return None
+        self._sent.update(changes)
+        self._last_emit = now
+        for field in changes:
+            inc("progress_updates_sent_total", field=field)
+        return changes
+
+    def current(self) -> Dict:
+        """Giá trị đã gửi gần nhất của mọi field (để vẽ lại toàn bộ khi cần)."""
+        return dict(self._sent)
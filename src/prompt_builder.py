@@ -0,0 +1,137 @@
+# src/prompt_builder.py
+"""
+Chọn đoạn transcript gửi LLM theo ngân sách token.
+
+Cắt `transcript[:15000]` làm mất phần CUỐI cuộc gọi — thường là lúc kẻ
+lừa đảo "chốt" (yêu cầu chuyển tiền / OTP) — và gửi kèm cả đoạn chào hỏi
+vô nghĩa. Thay vào đó:
+
+    text, info = build_transcript_excerpt(chunk_scores)
+
+  1. Cả cuộc gọi vừa ngân sách → gửi nguyên văn.
+  2. Không vừa → xếp chunk theo độ nghi ngờ (diem + LLM_PROMPT_KEYWORD_WEIGHT
+     × số từ khoá trúng), lần lượt lấy chunk kèm LLM_PROMPT_NEIGHBORS chunk
+     hai bên (ngữ cảnh), dừng khi hết ngân sách.
+  3. Ghép lại theo thứ tự thời gian, đoạn bị bỏ thay bằng "[…]".
+
+Chunk STT lỗi / quá hạn ("error" / "timed_out") không có transcript thật —
+không bao giờ được gửi, chỗ của chúng cũng hiện là "[…]".
+
+Token ước lượng theo số ký tự (không cần tokenizer của model).
+
+Metrics:
+    llm_prompt_tokens{kind="full|excerpt"}       token ước lượng của lần gần nhất
+    llm_prompt_chunks{kind="total|selected"}
+    llm_prompt_tokens_trimmed_total              token không phải gửi nhờ chọn lọc
+
+Cấu hình qua biến môi trường:
+    LLM_PROMPT_TOKEN_BUDGET     ngân sách token cho transcript (mặc định 1500)
+    LLM_PROMPT_NEIGHBORS        số chunk ngữ cảnh mỗi bên     (mặc định 1)
+    LLM_PROMPT_KEYWORD_WEIGHT   điểm cộng mỗi từ khoá trúng   (mặc định 0.05)
+    LLM_PROMPT_CHARS_PER_TOKEN  ký tự / token khi ước lượng   (mặc định 3.0)
+"""
+
+from __future__ import annotations
+
+import math
+import os
+from typing import Dict, List, Tuple
+
+from .metrics import inc, set_gauge
+
+
+LLM_PROMPT_TOKEN_BUDGET    = int(os.getenv("LLM_PROMPT_TOKEN_BUDGET", "1500"))
+LLM_PROMPT_NEIGHBORS       = int(os.getenv("LLM_PROMPT_NEIGHBORS", "1"))
+LLM_PROMPT_KEYWORD_WEIGHT  = float(os.getenv("LLM_PROMPT_KEYWORD_WEIGHT", "0.05"))
+LLM_PROMPT_CHARS_PER_TOKEN = float(os.getenv("LLM_PROMPT_CHARS_PER_TOKEN", "3.0"))
+
+_GAP = "[…]"
+
+
+def estimate_tokens(text: str) -> int:
+    """Số token ước lượng (tiếng Việt có dấu ≈ 3 ký tự / token với tokenizer Llama)."""
+    return math.ceil(len(text) / LLM_PROMPT_CHARS_PER_TOKEN)
+
+
+def _chunk_line(chunk: Dict) -> str:
+    return f"[{chunk['time_range']}] {chunk['text']}"
+
+
+def _missing(chunk: Dict) -> bool:
+    return bool(chunk.get("error") or chunk.get("timed_out"))
+
+
+def _priority(chunk: Dict) -> float:
+    return chunk.get("diem", 0.0) + LLM_PROMPT_KEYWORD_WEIGHT * len(chunk.get("keywords", []))
+
+
+def build_transcript_excerpt(
+    chunks: List[Dict],
+    token_budget: int = LLM_PROMPT_TOKEN_BUDGET,
+    neighbors: int = LLM_PROMPT_NEIGHBORS,
+) -> Tuple[str, Dict]:
+    """
+    Transcript (có mốc thời gian) vừa token_budget, ưu tiên chunk nghi ngờ nhất.
+    Bỏ qua chunk "error" / "timed_out".
+
+    Returns:
+        (text, {"tokens", "full_tokens", "selected", "total"})
+    """
+    usable = [i for i, c in enumerate(chunks) if not _missing(c)]
+    lines = {i: _chunk_line(chunks[i]) for i in usable}
+    costs = {i: estimate_tokens(line) + 1 for i, line in lines.items()}   # +1 cho newline
+    full_tokens = sum(costs.values())
+
+    gap_cost = estimate_tokens(_GAP) + 1
+    # "[…]" thay cho mỗi dải chunk lỗi cũng tốn token
+    full_gaps = sum(1 for k, i in enumerate(usable) if i != (usable[k - 1] + 1 if k else 0))
+    full_gaps += bool(usable) and usable[-1] != len(chunks) - 1
+    if full_tokens + full_gaps * gap_cost <= token_budget:
+        selected = set(usable)
+    else:
+        selected = set()
+        used = gap_cost   # "[…]" cuối
+        # Hoà điểm → ưu tiên chunk muộn hơn (phần "chốt" thường ở cuối cuộc gọi)
+        ranked = sorted(usable, key=lambda i: (_priority(chunks[i]), i), reverse=True)
+        for idx in ranked:
+            if idx in selected:
+                continue
+            # Mỗi nhóm mở thêm tối đa 1 "[…]" phía trước
+            if used + gap_cost + costs[idx] > token_budget:
+                continue
+            used += gap_cost
+            # Chunk chính trước, rồi ngữ cảnh gần nhất trước; không vượt qua
+            # chunk lỗi (nhóm phải liền 1 khối mới chỉ mở thêm 1 "[…]")
+            group = [idx] + [
+                j for d in range(1, neighbors + 1) for j in (idx - d, idx + d)
+                if j not in selected and all(k in lines for k in range(min(idx, j), max(idx, j) + 1))
+            ]
+            for j in group:
+                if used + costs[j] > token_budget:
+                    break
+                selected.add(j)
+                used += costs[j]
+
+    out: List[str] = []
+    prev = -1
+    for idx in sorted(selected):
+        if idx != prev + 1:
+            out.append(_GAP)
+        out.append(lines[idx])
+        prev = idx
+    if selected and prev != len(chunks) - 1:
+        out.append(_GAP)
+    text = "\n".join(out)
+
+    info = {
+        "tokens":      estimate_tokens(text),
+        "full_tokens": full_tokens,
+        "selected":    len(selected),
+        "total":       len(chunks),
+    }
+    set_gauge("llm_prompt_tokens", info["tokens"], kind="excerpt")
+    set_gauge("llm_prompt_tokens", full_tokens, kind="full")
+    set_gauge("llm_prompt_chunks", len(chunks), kind="total")
+    set_gauge("llm_prompt_chunks", len(selected), kind="selected")
+    inc("llm_prompt_tokens_trimmed_total", max(0, full_tokens - info["tokens"]))
+    return text, info
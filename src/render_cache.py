@@ -0,0 +1,65 @@
+# src/render_cache.py
+"""
+Cache LRU cho các fragment HTML đã render.
+
+Streamlit chạy lại toàn bộ script sau mỗi tương tác; nếu dữ liệu không đổi
+thì HTML sinh ra cũng y hệt → lấy lại từ cache thay vì build lại f-string.
+
+Key do caller quyết định (vd: (result_hash, filename, LAYOUT_VERSION)),
+cache dùng chung toàn process và giới hạn số entry.
+
+Cấu hình qua biến môi trường:
+    RENDER_CACHE_SIZE   số fragment tối đa giữ trong RAM (mặc định 32)
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional
+
+from .metrics import inc
+
+
+RENDER_CACHE_SIZE = int(os.getenv("RENDER_CACHE_SIZE", "32"))
+
+
+def content_hash(*parts) -> str:
+    """Hash ổn định cho dữ liệu JSON-serializable (chunk_scores, keywords, ...)."""
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    """LRU thread-safe: key → chuỗi HTML."""
+
+    def __init__(self, name: str, max_entries: int = RENDER_CACHE_SIZE):
+        self.name = name
+        self.max_entries = max(1, max_entries)
+        self._items: "OrderedDict[Hashable, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[str]:
+        with self._lock:
+            html = self._items.get(key)
+            if html is not None:
+                self._items.move_to_end(key)
+        inc("render_cache_lookups_total", cache=self.name, result="hit" if html is not None else "miss")
+        return html
+
+    def put(self, key: Hashable, html: str) -> None:
+        with self._lock:
+            self._items[key] = html
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def get_or_build(self, key: Hashable, builder: Callable[[], str]) -> str:
+        html = self.get(key)
+        if html is None:
+            html = builder()
+            self.put(key, html)
+        return html
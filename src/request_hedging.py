@@ -0,0 +1,247 @@
+# src/request_hedging.py
+"""
+Hedged request cho STT: request chậm hơn p95 đã quan sát → gửi thêm 1 bản
+sao, lấy kết quả nào về trước.
+
+Chunk được giao theo thứ tự, nên 1 request Whisper rơi vào đuôi phân phối
+độ trễ giữ chân cả cuộc gọi. Hedge chỉ tốn thêm quota cho ~5% request chậm
+nhất, và mỗi phiên phân tích có HedgeBudget giới hạn số bản sao:
+
+    budget = HedgeBudget.for_requests(n_chunks)    # tối đa ceil(STT_HEDGE_BUDGET × n) bản sao
+    text = hedged_call(lambda: client.create(...), budget)
+
+Ngưỡng hedge = phân vị STT_HEDGE_QUANTILE của 200 request gần nhất CÙNG
+model (dùng chung cả process, mọi phiên) — Whisper nhanh (lượt xem trước) và
+Whisper chính xác có phân phối độ trễ khác hẳn nhau, gộp chung thì model
+nhanh gần như không bao giờ hedge còn model chính xác hedge quá sớm.
+
+Mỗi request (bản gốc lẫn bản sao) chạy trong thread riêng, không qua pool
+cố định: bản thua không huỷ được giữa chừng (httpx đồng bộ) nên chạy nốt
+rồi bỏ kết quả — nằm trong pool thì nó chiếm chỗ, request gốc của chunk
+sau phải xếp hàng sau request đã bị bỏ. Số thread bị chặn bởi số job chạy
+cùng lúc × 2 cộng số bản thua chưa về (≤ ngân sách hedge, có timeout).
+Job đã bị huỷ (cancel_token) → không gửi bản sao.
+
+Metrics:
+    stt_hedge_requests_total{outcome="won|lost|failed"}   bản sao đã gửi (won = về trước)
+    stt_hedge_skipped_total{reason="budget|cancelled"}    đã quá p95 nhưng hết ngân sách / job đã huỷ
+    stt_hedge_delay_seconds{model}                        ngưỡng hedge hiện tại (≈ p95 request)
+    stt_chunk_latency_p99_seconds{model}                  độ trễ mỗi chunk người dùng phải chờ
+    stt_hedge_extra_ratio                                 bản sao / request gốc
+
+Cấu hình qua biến môi trường:
+    STT_HEDGE_ENABLED       "1" → bật hedge                       (mặc định 0)
+    STT_HEDGE_QUANTILE      phân vị độ trễ để gửi bản sao          (mặc định 0.95)
+    STT_HEDGE_MIN_DELAY_S   chờ tối thiểu trước khi hedge (giây)   (mặc định 0.3)
+    STT_HEDGE_MIN_SAMPLES   số mẫu tối thiểu trước khi hedge       (mặc định 20)
+    STT_HEDGE_BUDGET        tỉ lệ bản sao tối đa mỗi phiên         (mặc định 0.1)
+"""
+
+from __future__ import annotations
+
+import contextvars
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Callable, Dict, Optional, TypeVar
+
+from .cancellation import CancelToken
+from .metrics import inc, set_gauge
+
+
+STT_HEDGE_ENABLED     = os.getenv("STT_HEDGE_ENABLED", "0") == "1"
+STT_HEDGE_QUANTILE    = float(os.getenv("STT_HEDGE_QUANTILE", "0.95"))
+STT_HEDGE_MIN_DELAY_S = float(os.getenv("STT_HEDGE_MIN_DELAY_S", "0.3"))
+STT_HEDGE_MIN_SAMPLES = int(os.getenv("STT_HEDGE_MIN_SAMPLES", "20"))
+STT_HEDGE_BUDGET      = float(os.getenv("STT_HEDGE_BUDGET", "0.1"))
+
+T = TypeVar("T")
+
+
+class LatencyWindow:
+    """N mẫu độ trễ gần nhất (giây) — đủ để ước lượng p95 / p99 đang trượt."""
+
+    def __init__(self, size: int = 200):
+        self._samples: deque = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._samples)
+
+    def quantile(self, q: float) -> Optional[float]:
+        with self._lock:
+            values = sorted(self._samples)
+        if not values:
+            return None
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class HedgeBudget:
+    """Số bản sao còn được gửi trong 1 phiên phân tích."""
+
+    def __init__(self, max_extra: int):
+        self.max_extra = max_extra
+        self.used = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_requests(cls, n_requests: int, ratio: float = STT_HEDGE_BUDGET) -> "HedgeBudget":
+        return cls(max(1, math.ceil(ratio * n_requests)) if ratio > 0 else 0)
+
+    def take(self) -> bool:
+        with self._lock:
+            if self.used >= self.max_extra:
+                return False
+            self.used += 1
+            return True
+
+
+class _ModelWindows:
+    """1 LatencyWindow cho mỗi model (tạo khi gặp model lần đầu)."""
+
+    def __init__(self):
+        self._windows: Dict[str, LatencyWindow] = {}
+        self._lock = threading.Lock()
+
+    def get(self, model: str) -> LatencyWindow:
+        with self._lock:
+            window = self._windows.get(model)
+            if window is None:
+                window = self._windows[model] = LatencyWindow()
+            return window
+
+    def quantiles(self, q: float) -> Dict[str, Optional[float]]:
+        with self._lock:
+            windows = dict(self._windows)
+        return {model: window.quantile(q) for model, window in sorted(windows.items())}
+
+
+# Độ trễ từng request STT (cả bản gốc lẫn bản sao) / từng chunk (bên gọi phải chờ), theo model
+request_latency = _ModelWindows()
+chunk_latency   = _ModelWindows()
+
+_stats = {"requests": 0, "hedges": 0, "hedges_won": 0}
+_stats_lock = threading.Lock()
+
+
+def hedge_delay(model: str = "") -> Optional[float]:
+    """Ngưỡng gửi bản sao (giây) cho model, None khi chưa đủ mẫu."""
+    window = request_latency.get(model)
+    if len(window) < STT_HEDGE_MIN_SAMPLES:
+        return None
+    delay = max(STT_HEDGE_MIN_DELAY_S, window.quantile(STT_HEDGE_QUANTILE))
+    set_gauge("stt_hedge_delay_seconds", delay, model=model)
+    return delay
+
+
+def _spawn(fn: Callable[..., T], *args) -> "Future[T]":
+    """
+    Chạy fn(*args) trong 1 thread riêng (daemon), trong bản sao context hiện
+    tại (StageTimeline của phiên đi theo request). Bản thua chạy nốt mà không
+    giữ chỗ của request nào khác.
+    """
+    future: "Future[T]" = Future()
+    context = contextvars.copy_context()
+
+    def run() -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(context.run(fn, *args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="stt-hedge", daemon=True).start()
+    return future
+
+
+def _timed(fn: Callable[[], T], window: LatencyWindow) -> T:
+    start = time.perf_counter()
+    result = fn()
+    window.add(time.perf_counter() - start)
+    return result
+
+
+def _count(hedged: bool) -> None:
+    with _stats_lock:
+        _stats["requests"] += 1
+        _stats["hedges"] += hedged
+        ratio = _stats["hedges"] / _stats["requests"]
+    set_gauge("stt_hedge_extra_ratio", ratio)
+
+
+def hedged_call(fn: Callable[[], T], budget: Optional[HedgeBudget] = None,
+                cancel_token: Optional[CancelToken] = None, model: str = "") -> T:
+    """
+    Gọi fn(); quá hedge_delay(model) mà chưa xong và budget còn → gọi thêm 1 lần,
+    trả kết quả thành công về trước. Cả 2 lỗi → raise lỗi sau cùng.
+    budget None → gọi thẳng fn() trong thread hiện tại (không hedge).
+    cancel_token đã huỷ lúc tới ngưỡng hedge → không gửi bản sao.
+    model: độ trễ được đo / so ngưỡng riêng theo model Whisper.
+    """
+    start = time.perf_counter()
+    try:
+        return _hedged_call(fn, budget, cancel_token, model)
+    finally:
+        window = chunk_latency.get(model)
+        window.add(time.perf_counter() - start)
+        p99 = window.quantile(0.99)
+        if p99 is not None:
+            set_gauge("stt_chunk_latency_p99_seconds", p99, model=model)
+
+
+def _hedged_call(fn: Callable[[], T], budget: Optional[HedgeBudget],
+                 cancel_token: Optional[CancelToken], model: str) -> T:
+    window = request_latency.get(model)
+    delay = hedge_delay(model) if budget is not None else None
+    if delay is None:
+        _count(False)
+        return _timed(fn, window)
+
+    primary = _spawn(_timed, fn, window)
+    done, _ = wait([primary], timeout=delay)
+    cancelled = cancel_token is not None and cancel_token.cancelled
+    if done or cancelled or not budget.take():
+        if not done:
+            inc("stt_hedge_skipped_total", reason="cancelled" if cancelled else "budget")
+        _count(False)
+        return primary.result()
+
+    _count(True)
+    hedge = _spawn(_timed, fn, window)
+    pending = {primary, hedge}
+    error: Optional[BaseException] = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                won = future is hedge
+                inc("stt_hedge_requests_total", outcome="won" if won else "lost")
+                if won:
+                    with _stats_lock:
+                        _stats["hedges_won"] += 1
+                return future.result()
+            error = future.exception()
+    inc("stt_hedge_requests_total", outcome="failed")
+    raise error
+
+
+def hedge_stats() -> Dict:
+    """
+    {"requests", "hedges", "hedges_won", "extra_ratio", "request_p95", "chunk_p99"} kể từ lúc
+    process chạy; request_p95 / chunk_p99 là dict {model: giây}.
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["extra_ratio"] = stats["hedges"] / stats["requests"] if stats["requests"] else 0.0
+    stats["request_p95"] = request_latency.quantiles(STT_HEDGE_QUANTILE)
+    stats["chunk_p99"] = chunk_latency.quantiles(0.99)
+    return stats
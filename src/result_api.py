@@ -0,0 +1,143 @@
+# src/result_api.py
+"""
+API JSON chỉ-đọc cho kết quả phân tích, phục vụ qua http_sidecar.
+
+Trang analysis chỉ nhúng phần cần vẽ ngay; dữ liệu đầy đủ (tooltip chart
+độ phân giải gốc, các trang transcript) được iframe fetch khi cần:
+
+    GET /api/results/<result_hash>/<view>?lo=0&hi=50
+        → {"total": N, "lo": 0, "hi": 50, "items": [...]}
+
+View có sẵn:
+    chunks       ChunkResult gốc
+View khác do trang đăng ký bằng register_view(name, renderer)
+(vd: "transcript" → HTML từng dòng transcript).
+
+Kết quả được publish_result() đăng ký trong RAM (LRU, chung toàn process).
+Sidecar không chạy → view_url() trả "" và trang dùng dữ liệu nhúng sẵn.
+
+Bảo mật: API KHÔNG xác thực — ai biết result_hash (sha256 nội dung audio)
+và gọi được tới sidecar là đọc được transcript đầy đủ. CORS chỉ cho origin
+của app (iframe components.html cùng origin với trang Streamlit); request
+từ trình duyệt với Origin khác → 403. Đặt SIDECAR_PUBLIC_URL là đưa API này
+ra ngoài — xem http_sidecar.py.
+
+Cấu hình qua biến môi trường:
+    RESULT_API_MAX_RESULTS      số kết quả giữ trong RAM (mặc định 16)
+    RESULT_API_MAX_PAGE         số chunk tối đa mỗi request (mặc định 200)
+    RESULT_API_ALLOWED_ORIGINS  origin của app được gọi API, cách nhau dấu phẩy
+                                (mặc định http://localhost:<port Streamlit>,
+                                http://127.0.0.1:<port Streamlit>)
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from .http_sidecar import public_url, register_route, send_bytes
+from .metrics import inc
+
+
+RESULT_API_MAX_RESULTS = int(os.getenv("RESULT_API_MAX_RESULTS", "16"))
+RESULT_API_MAX_PAGE    = int(os.getenv("RESULT_API_MAX_PAGE", "200"))
+
+_APP_PORT = os.getenv("STREAMLIT_SERVER_PORT", "8501")
+RESULT_API_ALLOWED_ORIGINS = frozenset(
+    o.strip().rstrip("/")
+    for o in os.getenv(
+        "RESULT_API_ALLOWED_ORIGINS",
+        f"http://localhost:{_APP_PORT},http://127.0.0.1:{_APP_PORT}",
+    ).split(",")
+    if o.strip()
+)
+
+_ROUTE_PREFIX = "/api/results/"
+
+# renderer(chunks[lo:hi], lo) → items trả về cho client
+ViewRenderer = Callable[[List[Dict], int], List[Any]]
+
+_results: "OrderedDict[str, List[Dict]]" = OrderedDict()
+_views: Dict[str, ViewRenderer] = {"chunks": lambda chunks, offset: chunks}
+_lock = threading.Lock()
+
+
+def register_view(name: str, renderer: ViewRenderer) -> None:
+    """Đăng ký cách trình bày 1 trang chunk (chạy trên thread của sidecar)."""
+    _views[name] = renderer
+
+
+def publish_result(result_hash: str, chunk_scores: List[Dict]) -> None:
+    """Đăng ký chunk_scores để iframe có thể fetch theo trang."""
+    with _lock:
+        _results[result_hash] = chunk_scores
+        _results.move_to_end(result_hash)
+        while len(_results) > max(1, RESULT_API_MAX_RESULTS):
+            _results.popitem(last=False)
+
+
+def get_published(result_hash: str) -> Optional[List[Dict]]:
+    with _lock:
+        return _results.get(result_hash)
+
+
+def view_url(result_hash: str, view: str = "chunks") -> str:
+    """URL endpoint của view cho trình duyệt; "" nếu sidecar không chạy."""
+    return public_url(f"{_ROUTE_PREFIX}{result_hash}/{view}")
+
+
+def _int_param(query: Dict[str, List[str]], name: str, default: int) -> int:
+    try:
+        return int(query.get(name, [default])[0])
+    except (TypeError, ValueError):
+        return default
+
+
+def _results_route(req: BaseHTTPRequestHandler) -> None:
+    parts = urlsplit(req.path)
+    # /api/results/<hash>/<view>
+    segments = parts.path[len(_ROUTE_PREFIX):].split("/")
+    cors = {"Cache-Control": "private, max-age=300", "Vary": "Origin"}
+    origin = req.headers.get("Origin")
+    if origin is not None:
+        if origin.rstrip("/") not in RESULT_API_ALLOWED_ORIGINS:
+            inc("result_api_requests_total", status="forbidden")
+            send_bytes(req, b'{"error":"origin not allowed"}', "application/json", status=403, headers=cors)
+            return
+        cors["Access-Control-Allow-Origin"] = origin
+    renderer = _views.get(segments[1]) if len(segments) == 2 else None
+    if renderer is None:
+        send_bytes(req, b'{"error":"not found"}', "application/json", status=404, headers=cors)
+        return
+
+    chunks = get_published(segments[0])
+    if chunks is None:
+        inc("result_api_requests_total", status="missing")
+        send_bytes(req, b'{"error":"unknown result"}', "application/json", status=404, headers=cors)
+        return
+
+    query = parse_qs(parts.query)
+    total = len(chunks)
+    lo = min(max(0, _int_param(query, "lo", 0)), total)
+    hi = min(max(lo, _int_param(query, "hi", lo + RESULT_API_MAX_PAGE)), total, lo + RESULT_API_MAX_PAGE)
+    try:
+        items = renderer(chunks[lo:hi], lo)
+    except Exception as e:
+        print(f"[WARN] Result view '{segments[1]}' failed: {e}")
+        inc("result_api_requests_total", status="error")
+        send_bytes(req, b'{"error":"render failed"}', "application/json", status=500, headers=cors)
+        return
+    body = json.dumps(
+        {"total": total, "lo": lo, "hi": hi, "items": items},
+        ensure_ascii=False,
+    ).encode("utf-8")
+    inc("result_api_requests_total", status="ok")
+    send_bytes(req, body, "application/json; charset=utf-8", headers=cors)
+
+
+register_route(_ROUTE_PREFIX, _results_route)
@@ -0,0 +1,260 @@
+# src/result_store.py
+"""
+Lưu kết quả phân tích đã hoàn tất vào SQLite để mở lại tức thì.
+
+Key = sha256(audio) + phiên bản model + phiên bản keywords.json + chunk_duration
+    → đổi model / từ khoá thì kết quả cũ tự động không khớp nữa.
+
+Value = JSON của kết quả analyze_audio():
+    {"chunk_scores": [...], "diem_nghi_ngo": float, "keywords_count": [...]}
+    (chunk_scores đã chứa transcript + keywords từng đoạn)
+
+Chỉ lưu kết quả ĐẦY ĐỦ (xem incomplete_reason): kết quả có chunk STT lỗi,
+chunk hết thời gian, chunk chấm xuống cấp, có báo cáo deadline hoặc là bản
+xem trước bằng model Whisper nhanh (quality="fast") bị bỏ qua — nếu không, 1 lần Groq sập sẽ lưu vĩnh viễn kết luận "An toàn" 0%
+cho mọi lần upload sau của cùng file.
+
+Giới hạn dung lượng: khi tổng payload vượt RESULT_STORE_MAX_MB → xoá
+các bản ghi lâu không được đọc nhất (LRU theo last_access).
+
+Cấu hình qua biến môi trường:
+    RESULT_STORE_PATH    đường dẫn file SQLite  (mặc định .cache/results.sqlite3)
+    RESULT_STORE_MAX_MB  dung lượng tối đa (MB) (mặc định 256)
+    RESULT_STORE_ENABLED "0" để tắt hẳn
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional
+
+from .metrics import inc, set_gauge
+
+
+ROOT_DIR = Path(__file__).parent.parent
+
+RESULT_STORE_PATH    = Path(os.getenv("RESULT_STORE_PATH", ROOT_DIR / ".cache" / "results.sqlite3"))
+RESULT_STORE_MAX_MB  = float(os.getenv("RESULT_STORE_MAX_MB", "256"))
+RESULT_STORE_ENABLED = os.getenv("RESULT_STORE_ENABLED", "1") != "0"
+
+# Tăng khi format ChunkResult thay đổi để bỏ qua kết quả cũ
+RESULT_SCHEMA_VERSION = 2   # v2: ChunkResult có "spans"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key          TEXT PRIMARY KEY,
+    audio_sha256 TEXT NOT NULL,
+    payload      TEXT NOT NULL,
+    size_bytes   INTEGER NOT NULL,
+    created_at   REAL NOT NULL,
+    last_access  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_results_last_access ON results(last_access);
+"""
+
+
+# ── Phiên bản model / keywords ───────────────────────────────────────────────
+
+_versions: Optional[str] = None
+
+
+def _hash_files(paths) -> str:
+    h = hashlib.sha256()
+    for p in sorted(paths):
+        h.update(p.name.encode("utf-8"))
+        with open(p, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    return h.hexdigest()[:16]
+
+
+def pipeline_version() -> str:
+    """
+    Chuỗi phiên bản của model + keywords.json (tính 1 lần mỗi process).
+
+    Model: hash nội dung mọi file trong models/ (pkl + json mapping).
+    Keywords: hash nội dung config/keywords.json.
+    """
+    global _versions
+    if _versions is None:
+        models_dir = ROOT_DIR / "models"
+        model_files = [p for p in models_dir.glob("*") if p.suffix in (".pkl", ".json")]
+        model_v = _hash_files(model_files) if model_files else "none"
+        kw_v = _hash_files([ROOT_DIR / "config" / "keywords.json"])
+        _versions = f"s{RESULT_SCHEMA_VERSION}-m{model_v}-k{kw_v}"
+    return _versions
+
+
+# ── Kết quả đầy đủ ───────────────────────────────────────────────────────────
+
+def incomplete_reason(result: Dict) -> Optional[str]:
+    """
+    Lý do kết quả không được lưu ("preview" | "deadline" | "stt_error" | "timed_out"
+    | "degraded"), None = đầy đủ. "preview": bản xem trước bằng model Whisper nhanh
+    (chế độ 2 lượt) — key của store không chứa model STT.
+    """
+    if result.get("quality") == "fast":
+        return "preview"
+    if result.get("deadline"):
+        return "deadline"
+    for chunk in result.get("chunk_scores", []):
+        if chunk.get("error"):
+            return "stt_error"
+        if chunk.get("timed_out"):
+            return "timed_out"
+        if chunk.get("degraded"):
+            return "degraded"
+    return None
+
+
+# ── Store ────────────────────────────────────────────────────────────────────
+
+class ResultStore:
+    """Kho kết quả SQLite, an toàn khi gọi từ nhiều thread."""
+
+    def __init__(self, path: Path = RESULT_STORE_PATH, max_mb: float = RESULT_STORE_MAX_MB):
+        self.path = Path(path)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        """Mở connection riêng cho mỗi thao tác (sqlite3 không chia sẻ giữa thread)."""
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:   # commit / rollback
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(audio_sha256: str, chunk_duration: int) -> str:
+        return f"{audio_sha256}:{chunk_duration}:{pipeline_version()}"
+
+    def get(self, audio_sha256: str, chunk_duration: int) -> Optional[Dict]:
+        """Trả về kết quả đã lưu hoặc None. Cập nhật last_access khi hit."""
+        key = self.make_key(audio_sha256, chunk_duration)
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT payload FROM results WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key)
+                    )
+        except sqlite3.Error as e:
+            print(f"[WARN] Result store read failed: {e}")
+            row = None
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            hit_rate = self.hits / (self.hits + self.misses)
+        inc("result_store_lookups_total", result="miss" if row is None else "hit")
+        set_gauge("result_store_hit_ratio", hit_rate)
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, audio_sha256: str, chunk_duration: int, result: Dict) -> bool:
+        """
+        Lưu kết quả rồi evict bản ghi cũ nếu vượt dung lượng.
+
+        Returns:
+            False nếu kết quả không đầy đủ (không lưu) hoặc ghi lỗi
+        """
+        reason = incomplete_reason(result)
+        if reason is not None:
+            inc("result_store_skipped_total", reason=reason)
+            print(f"[INFO] Result store: bo qua ket qua khong day du ({reason})")
+            return False
+        key = self.make_key(audio_sha256, chunk_duration)
+        payload = json.dumps(result, ensure_ascii=False)
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO results "
+                    "(key, audio_sha256, payload, size_bytes, created_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, audio_sha256, payload, len(payload.encode("utf-8")), now, now),
+                )
+                self._evict(conn)
+        except sqlite3.Error as e:
+            print(f"[WARN] Result store write failed: {e}")
+            return False
+        return True
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """Xoá bản ghi LRU cho tới khi tổng dung lượng <= max_bytes."""
+        total = conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = conn.execute(
+            "SELECT key, size_bytes FROM results ORDER BY last_access ASC"
+        ).fetchall()
+        stale = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM results WHERE key = ?", stale)
+        inc("result_store_evictions_total", len(stale))
+
+    def stats(self) -> Dict:
+        """Số liệu hit/miss + dung lượng hiện tại."""
+        try:
+            with self._connect() as conn:
+                count, size = conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM results"
+                ).fetchone()
+        except sqlite3.Error:
+            count, size = 0, 0
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits":       self.hits,
+                "misses":     self.misses,
+                "hit_rate":   self.hits / lookups if lookups else 0.0,
+                "entries":    count,
+                "size_bytes": size,
+            }
+
+
+# ============================================
+# SINGLETON
+# ============================================
+
+_store: Optional[ResultStore] = None
+_store_lock = threading.Lock()
+
+
+def get_result_store() -> Optional[ResultStore]:
+    """Lấy singleton ResultStore (None nếu bị tắt hoặc không mở được file)."""
+    global _store
+    if not RESULT_STORE_ENABLED:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                try:
+                    _store = ResultStore()
+                except (OSError, sqlite3.Error) as e:
+                    print(f"[WARN] Result store disabled: {e}")
+                    return None
+    return _store
@@ -0,0 +1,93 @@
+# src/singleflight.py
+"""
+Lock file cho singleflight giữa nhiều process (vd: nhiều replica Streamlit
+dùng chung 1 thư mục .cache).
+
+Trong 1 process, JobRunner tự gộp các lần phân tích cùng file (xem
+job_runner.py). Giữa các process thì không chia sẻ được tiến độ, nên
+process đến sau chỉ chờ lock rồi đọc kết quả process kia đã ghi vào
+result_store:
+
+    lock = flight_lock(audio_hash, chunk_duration)   # None = tắt
+    if lock is not None and not lock.try_acquire():
+        ...                                          # process khác đang phân tích file này
+    try:
+        ...
+    finally:
+        lock.release()
+
+flock tự nhả khi process chết → không có lock "mồ côi". File lock không bị
+xoá sau khi nhả (xoá file đang bị process khác flock sẽ làm 2 process
+cùng giữ 2 inode khác nhau).
+
+Cấu hình qua biến môi trường:
+    ANALYSIS_SINGLEFLIGHT_LOCK_DIR   thư mục chứa lock file (mặc định rỗng = tắt;
+                                     cần result_store bật, chỉ hỗ trợ POSIX)
+"""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:   # Windows
+    fcntl = None
+
+
+SINGLEFLIGHT_LOCK_DIR = os.getenv("ANALYSIS_SINGLEFLIGHT_LOCK_DIR", "")
+
+_warned = False
+
+
+class FlightLock:
+    """flock độc quyền trên <lock_dir>/<audio_hash>-<chunk_duration>.lock."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    def try_acquire(self) -> bool:
+        """True nếu lấy được lock (không chờ). Gọi lại khi đã giữ lock → True."""
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        if self._fd is None:
+            return
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+
+def flight_lock(audio_hash: str, chunk_duration: int) -> Optional[FlightLock]:
+    """FlightLock cho file này, hoặc None khi tắt / không dùng được."""
+    global _warned
+    if not SINGLEFLIGHT_LOCK_DIR:
+        return None
+    if fcntl is None:
+        if not _warned:
+            _warned = True
+            print("[WARN] Singleflight lock file can fcntl (POSIX) - bo qua dedupe giua cac process")
+        return None
+    lock_dir = Path(SINGLEFLIGHT_LOCK_DIR)
+    try:
+        lock_dir.mkdir(parents=True, exist_ok=True)
+    except OSError as e:
+        if not _warned:
+            _warned = True
+            print(f"[WARN] Singleflight lock dir {lock_dir} khong tao duoc: {e}")
+        return None
+    return FlightLock(lock_dir / f"{audio_hash}-{chunk_duration}.lock")
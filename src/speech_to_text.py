@@ -9,10 +9,18 @@ Chức năng:
 
 import os
 import io
+import math
 import tempfile
+import threading
+import time
 from pathlib import Path
-from typing import Optional, List, Generator, Tuple
-from .llm_client import _get_api_key
+from typing import Optional, Generator, Tuple
+from .cancellation import CancelToken
+from .deadline import STAGE_TIMEOUT, STT_REQUEST_TIMEOUT_S, Deadline, DeadlineExceeded, budget_stage
+from .http_pool import get_http_client
+from .llm_client import GROQ_MAX_RETRIES, _get_api_key, _get_base_url
+from .metrics import inc, span
+from .request_hedging import STT_HEDGE_ENABLED, HedgeBudget, hedged_call
 try:
     from groq import Groq
     GROQ_AVAILABLE = True
@@ -32,6 +40,12 @@ except Exception:
 # Model Whisper tốt nhất của Groq (học từ groq_whisperer)
 WHISPER_MODEL = "whisper-large-v3"
 
+# Model nhanh hơn cho bản xem trước của chế độ 2 lượt (job_runner, ANALYSIS_TWO_PASS)
+WHISPER_FAST_MODEL = os.getenv("WHISPER_FAST_MODEL", "whisper-large-v3-turbo")
+
+# Mức chất lượng → model ("accurate" = model cấu hình của client)
+QUALITY_TIERS = {"fast": WHISPER_FAST_MODEL, "accurate": WHISPER_MODEL}
+
 # Không dùng prompt - chỉ transcribe thuần túy từ audio sang text
 DEFAULT_PROMPT = ""
 
@@ -71,6 +85,12 @@ class SpeechToText:
         self.prompt = prompt
         self._client = None
     
+    def model_for(self, quality: Optional[str] = None) -> str:
+        """Model ứng với mức chất lượng ("fast" | "accurate"); None → self.model."""
+        if quality is None or quality == "accurate":
+            return self.model
+        return QUALITY_TIERS[quality]
+    
     @property
     def client(self):
         """Lazy initialization của Groq client."""
@@ -79,14 +99,23 @@ class SpeechToText:
                 raise RuntimeError(
                     "Thư viện groq chưa được cài. Chạy: pip install groq"
                 )
-            self._client = Groq(api_key=self.api_key)
+            # Pool kết nối dùng chung với LLM client → không handshake lại mỗi chunk
+            self._client = Groq(
+                api_key=self.api_key, base_url=_get_base_url(),
+                max_retries=GROQ_MAX_RETRIES, http_client=get_http_client(),
+            )
         return self._client
     
     def transcribe_file(
         self, 
         audio_path: str,
         prompt: Optional[str] = None,
-        language: Optional[str] = None
+        language: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
+        hedge_budget: Optional[HedgeBudget] = None,
+        quality: Optional[str] = None,
+        raise_errors: bool = False,
+        cancel_token: Optional[CancelToken] = None,
     ) -> str:
         """
         Transcribe toàn bộ file audio thành text.
@@ -105,31 +134,100 @@ class SpeechToText:
             audio_path: Đường dẫn file audio (mp3, wav, m4a)
             prompt: Context prompt (optional, override default)
             language: Ngôn ngữ (optional, override default)
+            deadline: Ngân sách stage "stt" — request bị giới hạn timeout theo
+                phần còn lại (optional)
+            hedge_budget: Bật hedge — request chậm hơn p95 được gửi thêm 1 bản sao,
+                trừ vào ngân sách này (optional, xem request_hedging)
+            quality: "fast" → WHISPER_FAST_MODEL, "accurate" / None → self.model
+            raise_errors: True → lỗi API được raise thay vì trả "" (chunk generator
+                cần phân biệt "không nói gì" với "STT lỗi")
+            cancel_token: Job đã huỷ → không gửi bản sao hedge (request đang bay
+                vẫn chạy nốt, xem cancellation.py)
             
         Returns:
-            Transcript text
+            Transcript text ("" khi lỗi và raise_errors=False)
+
+        Raises:
+            DeadlineExceeded: hết ngân sách STT (trước khi gửi hoặc vì request timeout)
         """
+        if deadline is not None:
+            deadline.check("stt")   # hết ngân sách → không đọc file / gửi request
         try:
             with open(audio_path, "rb") as file:
-                # Gọi Groq Whisper API (pattern từ groq_whisperer)
-                transcription = self.client.audio.transcriptions.create(
-                    file=(os.path.basename(audio_path), file.read()),
-                    model=self.model,
-                    prompt=prompt or self.prompt,
-                    response_format="text",
-                    language=language or self.language,
-                )
+                audio_file = (os.path.basename(audio_path), file.read())
+            transcription = self._request(
+                audio_file, prompt, language, quality, deadline, hedge_budget, cancel_token,
+            )
+            inc("stt_requests_total", status="ok")
             return transcription
         except Exception as e:
+            inc("stt_requests_total", status="error")
             print(f"[LOI] Loi transcribe: {e}")
+            if isinstance(e, DeadlineExceeded):
+                raise
+            if deadline is not None and deadline.expired("stt"):
+                raise DeadlineExceeded("stt") from e
+            if raise_errors:
+                raise
             return ""
     
+    def _request(
+        self,
+        audio_file: Tuple[str, bytes],
+        prompt: Optional[str],
+        language: Optional[str],
+        quality: Optional[str],
+        deadline: Optional[Deadline],
+        hedge_budget: Optional[HedgeBudget],
+        cancel_token: Optional[CancelToken] = None,
+    ) -> str:
+        """
+        1 request Whisper (có thể kèm 1 bản sao hedge).
+
+        Timeout tính lại mỗi lần gửi: bản sao hedge gửi muộn hơn bản gốc nên
+        chỉ được dùng phần ngân sách "stt" còn lại lúc nó bắt đầu.
+        """
+        client = self.client
+        model = self.model_for(quality)
+        started = time.perf_counter()
+        first_timeout = deadline.timeout("stt", cap=STT_REQUEST_TIMEOUT_S) if deadline is not None else None
+
+        def create() -> str:
+            options = {}
+            if deadline is not None:
+                # Thời gian bản gốc đang chạy chưa được cộng vào stage → trừ tay
+                timeout = deadline.check("stt", cap=STT_REQUEST_TIMEOUT_S)
+                if timeout is not None and first_timeout is not None:
+                    timeout = min(timeout, first_timeout - (time.perf_counter() - started))
+                if timeout is not None:
+                    if timeout <= 0:
+                        raise DeadlineExceeded("stt")
+                    options["timeout"] = timeout
+            api = client
+            if options.get("timeout", STT_REQUEST_TIMEOUT_S) < STT_REQUEST_TIMEOUT_S:
+                # Ngân sách sắp hết: SDK retry sẽ nhân timeout lên (max_retries + 1) lần
+                api = client.with_options(max_retries=0)
+            # Gọi Groq Whisper API (pattern từ groq_whisperer)
+            return api.audio.transcriptions.create(
+                file=audio_file,
+                model=model,
+                prompt=prompt or self.prompt,
+                response_format="text",
+                language=language or self.language,
+                **options,
+            )
+
+        with span("stt_request"), budget_stage(deadline, "stt"):
+            return hedged_call(create, hedge_budget, cancel_token, model=model)
+    
     def transcribe_bytes(
         self,
         audio_bytes: bytes,
         filename: str = "audio.wav",
         prompt: Optional[str] = None,
-        language: Optional[str] = None
+        language: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
+        raise_errors: bool = False,
     ) -> str:
         """
         Transcribe audio từ bytes (cho Streamlit file_uploader).
@@ -139,28 +237,40 @@ class SpeechToText:
             filename: Tên file (để Groq nhận diện format)
             prompt: Context prompt (optional)
             language: Ngôn ngữ (optional)
+            deadline: Ngân sách stage "stt" — như transcribe_file (optional)
+            raise_errors: True → lỗi API được raise thay vì trả ""
             
         Returns:
-            Transcript text
+            Transcript text ("" khi lỗi và raise_errors=False)
+
+        Raises:
+            DeadlineExceeded: hết ngân sách STT
         """
         try:
-            transcription = self.client.audio.transcriptions.create(
-                file=(filename, audio_bytes),
-                model=self.model,
-                prompt=prompt or self.prompt,
-                response_format="text",
-                language=language or self.language,
-            )
+            if deadline is not None:
+                deadline.check("stt")
+            transcription = self._request((filename, audio_bytes), prompt, language, None, deadline, None)
+            inc("stt_requests_total", status="ok")
             return transcription
         except Exception as e:
+            inc("stt_requests_total", status="error")
             print(f"[LOI] Loi transcribe bytes: {e}")
+            if isinstance(e, DeadlineExceeded):
+                raise
+            if deadline is not None and deadline.expired("stt"):
+                raise DeadlineExceeded("stt") from e
+            if raise_errors:
+                raise
             return ""
     
     def transcribe_chunks_generator(
         self,
         audio_path: str,
         chunk_duration: int = DEFAULT_CHUNK_DURATION,
-        prompt: Optional[str] = None
+        prompt: Optional[str] = None,
+        cancel_token: Optional[CancelToken] = None,
+        deadline: Optional[Deadline] = None,
+        quality: Optional[str] = None,
     ) -> Generator[Tuple[int, float, float, str], None, None]:
         """
         Transcribe audio theo từng chunk (STREAMING MODE).
@@ -172,38 +282,59 @@ class SpeechToText:
             audio_path: Đường dẫn file audio
             chunk_duration: Độ dài mỗi chunk (giây)
             prompt: Context prompt
+            cancel_token: Dừng trước chunk kế tiếp khi bị huỷ (optional)
+            deadline: Hết ngân sách "stt" → chunk còn lại không gửi, error = STAGE_TIMEOUT (optional)
+            quality: Mức chất lượng model ("fast" | "accurate", mặc định self.model)
             
         Yields:
-            Tuple (chunk_index, start_time, end_time, transcript_text)
+            Tuple (chunk_index, start_time, end_time, transcript_text, error)
         """
         if not PYDUB_AVAILABLE:
             raise RuntimeError("Cần cài pydub để dùng streaming mode: pip install pydub")
         
         # Load audio
-        audio = AudioSegment.from_file(audio_path)
+        with span("decode"):
+            audio = AudioSegment.from_file(audio_path)
         chunk_ms = chunk_duration * 1000
+        # Ngân sách hedge của phiên này: tỉ lệ STT_HEDGE_BUDGET trên số chunk
+        hedge_budget = HedgeBudget.for_requests(math.ceil(len(audio) / chunk_ms)) if STT_HEDGE_ENABLED else None
         
         chunk_index = 0
         
         for start_ms in range(0, len(audio), chunk_ms):
+            if cancel_token is not None and cancel_token.cancelled:
+                # Bỏ các chunk chưa gửi + nhả audio đã decode ngay
+                _count_saved_requests(len(audio) - start_ms, chunk_ms)
+                audio = None
+                return
             end_ms = min(start_ms + chunk_ms, len(audio))
             start_sec = start_ms / 1000
             end_sec = end_ms / 1000
             tmp_path = None
             
             try:
+                if deadline is not None and deadline.expired("stt"):
+                    # Hết ngân sách → không export / gửi nữa, chunk đánh dấu quá hạn
+                    raise DeadlineExceeded("stt")
+
                 chunk = audio[start_ms:end_ms]
                 
                 # Export chunk to temporary WAV file
-                with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
+                with span("chunk_export"), tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
                     chunk.export(tmp.name, format="wav")
                     tmp_path = tmp.name
                 
                 # Transcribe chunk
-                transcript = self.transcribe_file(tmp_path, prompt=prompt)
+                transcript = self.transcribe_file(
+                    tmp_path, prompt=prompt, deadline=deadline, hedge_budget=hedge_budget, quality=quality,
+                    raise_errors=True, cancel_token=cancel_token,
+                )
                 
                 yield (chunk_index, start_sec, end_sec, transcript, None)
                 
+            except DeadlineExceeded:
+                deadline.degrade("stt", "danh dau cac chunk con lai la qua han")
+                yield (chunk_index, start_sec, end_sec, "", STAGE_TIMEOUT)
             except Exception as e:
                 # Trả về lỗi thay vì crash
                 error_msg = str(e)
@@ -219,7 +350,10 @@ class SpeechToText:
         audio_bytes: bytes,
         filename: str = "audio.mp3",
         chunk_duration: int = DEFAULT_CHUNK_DURATION,
-        prompt: Optional[str] = None
+        prompt: Optional[str] = None,
+        cancel_token: Optional[CancelToken] = None,
+        deadline: Optional[Deadline] = None,
+        quality: Optional[str] = None,
     ) -> Generator[Tuple[int, float, float, str], None, None]:
         """
         Transcribe audio bytes theo từng chunk (cho Streamlit upload).
@@ -229,9 +363,12 @@ class SpeechToText:
             filename: Tên file gốc (để detect format)
             chunk_duration: Độ dài mỗi chunk (giây)
             prompt: Context prompt
+            cancel_token: Dừng trước chunk kế tiếp khi bị huỷ (optional)
+            deadline: Hết ngân sách "stt" → chunk còn lại không gửi, error = STAGE_TIMEOUT (optional)
+            quality: Mức chất lượng model ("fast" | "accurate", mặc định self.model)
             
         Yields:
-            Tuple (chunk_index, start_time, end_time, transcript_text)
+            Tuple (chunk_index, start_time, end_time, transcript_text, error)
         """
         # Runtime import — tránh lỗi PYDUB_AVAILABLE=False do Python 3.13 module-level caching
         try:
@@ -245,30 +382,48 @@ class SpeechToText:
             ext = "mp4"  # pydub uses mp4 for m4a
         
         # Load audio from bytes
-        audio = _AudioSegment.from_file(io.BytesIO(audio_bytes), format=ext)
+        with span("decode"):
+            audio = _AudioSegment.from_file(io.BytesIO(audio_bytes), format=ext)
         chunk_ms = chunk_duration * 1000
+        # Ngân sách hedge của phiên này: tỉ lệ STT_HEDGE_BUDGET trên số chunk
+        hedge_budget = HedgeBudget.for_requests(math.ceil(len(audio) / chunk_ms)) if STT_HEDGE_ENABLED else None
         
         chunk_index = 0
         
         for start_ms in range(0, len(audio), chunk_ms):
+            if cancel_token is not None and cancel_token.cancelled:
+                # Bỏ các chunk chưa gửi + nhả audio đã decode ngay
+                _count_saved_requests(len(audio) - start_ms, chunk_ms)
+                audio = None
+                return
             end_ms = min(start_ms + chunk_ms, len(audio))
             start_sec = start_ms / 1000
             end_sec = end_ms / 1000
             tmp_path = None
             
             try:
+                if deadline is not None and deadline.expired("stt"):
+                    # Hết ngân sách → không export / gửi nữa, chunk đánh dấu quá hạn
+                    raise DeadlineExceeded("stt")
+
                 chunk = audio[start_ms:end_ms]
                 
                 # Export chunk to temporary WAV file
-                with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
+                with span("chunk_export"), tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
                     chunk.export(tmp.name, format="wav")
                     tmp_path = tmp.name
                 
                 # Transcribe chunk
-                transcript = self.transcribe_file(tmp_path, prompt=prompt)
+                transcript = self.transcribe_file(
+                    tmp_path, prompt=prompt, deadline=deadline, hedge_budget=hedge_budget, quality=quality,
+                    raise_errors=True, cancel_token=cancel_token,
+                )
                 
                 yield (chunk_index, start_sec, end_sec, transcript, None)
                 
+            except DeadlineExceeded:
+                deadline.degrade("stt", "danh dau cac chunk con lai la qua han")
+                yield (chunk_index, start_sec, end_sec, "", STAGE_TIMEOUT)
             except Exception as e:
                 # Trả về lỗi thay vì crash
                 error_msg = str(e)
@@ -286,7 +441,8 @@ class SpeechToText:
             ext = Path(filename).suffix.lower().lstrip(".")
             if ext == "m4a":
                 ext = "mp4"
-            audio = _AudioSegment.from_file(io.BytesIO(audio_bytes), format=ext)
+            with span("decode"):
+                audio = _AudioSegment.from_file(io.BytesIO(audio_bytes), format=ext)
             return len(audio) / 1000
         except Exception:
             return 0.0
@@ -296,15 +452,25 @@ class SpeechToText:
 # HELPER FUNCTIONS
 # =========================
 
+def _count_saved_requests(remaining_ms: int, chunk_ms: int) -> None:
+    """Ghi nhận số request STT không cần gửi nữa vì pipeline đã bị huỷ."""
+    saved = math.ceil(remaining_ms / chunk_ms)
+    inc("stt_requests_saved_total", saved)
+    print(f"[INFO] Analysis cancelled - skipped {saved} STT request(s)")
+
+
 # Singleton instance
 _stt_instance: Optional[SpeechToText] = None
+_stt_lock = threading.Lock()
 
 
 def get_stt_client() -> SpeechToText:
     """Lấy singleton instance của SpeechToText."""
     global _stt_instance
     if _stt_instance is None:
-        _stt_instance = SpeechToText()
+        with _stt_lock:
+            if _stt_instance is None:
+                _stt_instance = SpeechToText()
     return _stt_instance
 
 
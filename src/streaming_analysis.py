@@ -0,0 +1,323 @@
+# src/streaming_analysis.py
+"""
+Chế độ phân tích STREAMING cho cuộc gọi đang diễn ra.
+
+Khác với run_analysis() (cần file hoàn chỉnh), StreamingAnalyzer nhận
+PCM frames ngay khi chúng tới, cắt thành chunk DEFAULT_CHUNK_DURATION giây
+và chạy lại đúng pipeline cũ cho từng chunk:
+
+    PCM frames ──feed()──► buffer ──đủ 1 chunk──► WAV bytes
+        → SpeechToText.transcribe_bytes()          [worker thread]
+        → chunk_result_from_text()  (keywords.json + MultilabelPredictor)
+        → aggregate_score() trên các chunk đã có   [theo đúng thứ tự]
+        → on_update({...})                         [cảnh báo cho người dùng]
+
+Độ trễ cảnh báo (alert latency) = thời điểm on_update được gọi
+  − thời điểm frame cuối cùng của chunk tới. Mục tiêu: <= latency_budget_s.
+Backlog = số chunk đã cắt nhưng chưa phát kết quả.
+
+Ngân sách được ÉP, không chỉ đo:
+    - mỗi chunk có Deadline(latency_budget_s) tính từ lúc cắt → request STT
+      có timeout = phần còn lại; chờ trong pool quá hạn → không gửi nữa
+    - đã có max_backlog chunk đang chờ STT → chunk mới bị bỏ ngay, không gửi
+    - chunk quá hạn / bị bỏ → "timed_out": True; STT lỗi → "error": "...";
+      cả 2 vẫn phát lên timeline nhưng không tính vào điểm tổng (verdict_scores)
+
+Stand-in cục bộ (không cần micro / tổng đài):
+    python -m src.streaming_analysis path/to/call.wav [--speed 1.0]
+→ đọc WAV và feed theo đúng tốc độ thời gian thực, in từng cảnh báo
+  và báo cáo độ trễ / backlog khi kết thúc.
+
+Cấu hình qua biến môi trường:
+    STREAM_LATENCY_BUDGET_S  mục tiêu độ trễ cảnh báo (mặc định 5)
+    STREAM_WORKERS           số request STT song song  (mặc định 2)
+    STREAM_MAX_BACKLOG       số chunk tối đa đang chờ STT; quá → bỏ chunk mới (mặc định 6)
+
+Metrics:
+    stream_chunks_dropped_total{reason="backlog|late|error"}
+"""
+
+from __future__ import annotations
+
+import io
+import os
+import threading
+import time
+import wave
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from .analysis_engine import aggregate_score, chunk_result_from_text, missing_chunk_result, verdict_scores
+from .deadline import STAGE_TIMEOUT, Deadline, DeadlineExceeded
+from .metrics import inc, observe, set_gauge, span
+from .multilabel_predictor import get_multilabel_predictor
+from .speech_to_text import DEFAULT_CHUNK_DURATION, get_stt_client
+
+
+STREAM_LATENCY_BUDGET_S = float(os.getenv("STREAM_LATENCY_BUDGET_S", "5"))
+STREAM_WORKERS          = int(os.getenv("STREAM_WORKERS", "2"))
+STREAM_MAX_BACKLOG      = int(os.getenv("STREAM_MAX_BACKLOG", "6"))
+
+
+def _pcm_to_wav(pcm: bytes, sample_rate: int, sample_width: int, channels: int) -> bytes:
+    """Bọc PCM thô thành file WAV trong bộ nhớ (không cần ffmpeg)."""
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(sample_width)
+        wf.setframerate(sample_rate)
+        wf.writeframes(pcm)
+    return buf.getvalue()
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+class StreamingAnalyzer:
+    """
+    Nhận PCM liên tục, phát điểm từng chunk + điểm tổng cập nhật.
+
+    on_update nhận dict:
+        {
+            "chunk":         ChunkResult (như analysis_engine),
+            "chunk_scores":  List[ChunkResult] tới thời điểm hiện tại,
+            "diem_nghi_ngo": float (aggregate_score trên các chunk đã có),
+            "latency_s":     float (độ trễ cảnh báo của chunk này),
+            "backlog":       int   (chunk đang chờ phát kết quả),
+        }
+    Callback chạy trên thread emitter — không gọi st.* trực tiếp trong đó.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        sample_width: int = 2,
+        channels: int = 1,
+        chunk_duration: int = DEFAULT_CHUNK_DURATION,
+        on_update: Optional[Callable[[Dict], None]] = None,
+        latency_budget_s: float = STREAM_LATENCY_BUDGET_S,
+        workers: int = STREAM_WORKERS,
+        max_backlog: int = STREAM_MAX_BACKLOG,
+    ):
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self.channels = channels
+        self.chunk_duration = chunk_duration
+        self.on_update = on_update
+        self.latency_budget_s = latency_budget_s
+        self.backlog_limit = max(1, max_backlog)
+
+        self._chunk_bytes = sample_rate * sample_width * channels * chunk_duration
+        self._buffer = bytearray()
+        self._next_start_sec = 0.0
+        self._chunk_idx = 0
+
+        self._stt = get_stt_client()
+        self._predictor = get_multilabel_predictor()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="stream-stt")
+
+        # Hàng đợi future theo thứ tự chunk → emitter phát đúng thứ tự thời gian
+        self._pending: Deque[Tuple[Future, float, float, float]] = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._emitter = threading.Thread(target=self._emit_loop, name="stream-emitter", daemon=True)
+        self._emitter.start()
+
+        self.chunk_scores: List[Dict] = []
+        self.latencies: List[float] = []
+        self.max_backlog = 0
+        self.over_budget = 0
+        self.dropped: Dict[str, int] = {"backlog": 0, "late": 0, "error": 0}
+
+    # ── Ingestion ────────────────────────────────────────────────────────
+    def feed(self, pcm: bytes) -> None:
+        """Nhận thêm PCM frames (interleaved, little-endian)."""
+        if self._closed:
+            raise RuntimeError("StreamingAnalyzer đã đóng")
+        self._buffer.extend(pcm)
+        while len(self._buffer) >= self._chunk_bytes:
+            chunk = bytes(self._buffer[:self._chunk_bytes])
+            del self._buffer[:self._chunk_bytes]
+            self._submit(chunk)
+
+    def close(self) -> Dict:
+        """Đẩy phần audio còn lại, đợi mọi chunk phát xong, trả về báo cáo."""
+        if self._buffer:
+            self._submit(bytes(self._buffer))
+            self._buffer.clear()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._emitter.join()
+        self._pool.shutdown(wait=True)
+        return self.report()
+
+    def _submit(self, pcm: bytes) -> None:
+        ready_at = time.perf_counter()
+        n_frames = len(pcm) // (self.sample_width * self.channels)
+        start_sec = self._next_start_sec
+        end_sec = start_sec + n_frames / self.sample_rate
+        self._next_start_sec = end_sec
+
+        # Ngân sách độ trễ tính từ lúc chunk đủ dữ liệu (gồm cả thời gian chờ worker)
+        deadline = Deadline(self.latency_budget_s, budgets={}) if self.latency_budget_s > 0 else None
+        with self._cond:
+            # Chỉ đếm chunk còn đang chờ / gọi STT (chunk đã bỏ không giữ PCM hay worker)
+            shed = sum(1 for f, *_ in self._pending if not f.done()) >= self.backlog_limit
+        if shed:
+            # Backlog đầy → bỏ chunk ngay thay vì xếp hàng vô hạn sau request chậm
+            future: Future = Future()
+            future.set_exception(DeadlineExceeded("backlog"))
+        else:
+            future = self._pool.submit(self._process, self._chunk_idx, start_sec, end_sec, pcm, deadline)
+        self._chunk_idx += 1
+        with self._cond:
+            self._pending.append((future, ready_at, start_sec, end_sec))
+            self.max_backlog = max(self.max_backlog, len(self._pending))
+            set_gauge("stream_backlog_chunks", len(self._pending))
+            self._cond.notify_all()
+
+    # ── Worker: STT + chấm điểm 1 chunk ──────────────────────────────────
+    def _process(self, idx: int, start_sec: float, end_sec: float, pcm: bytes,
+                 deadline: Optional[Deadline]) -> Dict:
+        if deadline is not None:
+            deadline.check("stt")   # chờ trong pool đã quá ngân sách → không gửi STT
+        with span("chunk_export"):
+            wav = _pcm_to_wav(pcm, self.sample_rate, self.sample_width, self.channels)
+        text = self._stt.transcribe_bytes(
+            wav, filename=f"stream_{idx}.wav", deadline=deadline, raise_errors=True,
+        )
+        return chunk_result_from_text(start_sec, end_sec, text, self._predictor)
+
+    def _failed_chunk(self, start_sec: float, end_sec: float, error: Exception) -> Dict:
+        """Chunk không có transcript: quá hạn / bị bỏ → timed_out, STT lỗi → error."""
+        if isinstance(error, DeadlineExceeded):
+            reason = "backlog" if error.stage == "backlog" else "late"
+            chunk = missing_chunk_result(start_sec, end_sec, STAGE_TIMEOUT)
+        else:
+            reason = "error"
+            print(f"[WARN] Streaming chunk failed: {error}")
+            chunk = missing_chunk_result(start_sec, end_sec, str(error))
+        self.dropped[reason] += 1
+        inc("stream_chunks_dropped_total", reason=reason)
+        return chunk
+
+    # ── Emitter: phát kết quả theo thứ tự, đo độ trễ ─────────────────────
+    def _emit_loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending and self._closed:
+                    return
+                future, ready_at, start_sec, end_sec = self._pending[0]
+
+            try:
+                chunk = future.result()
+            except Exception as e:
+                chunk = self._failed_chunk(start_sec, end_sec, e)
+
+            with self._cond:
+                self._pending.popleft()
+                backlog = len(self._pending)
+            set_gauge("stream_backlog_chunks", backlog)
+
+            self.chunk_scores.append(chunk)
+            with span("aggregation"):
+                diem_tong = aggregate_score(verdict_scores(self.chunk_scores))
+
+            latency = time.perf_counter() - ready_at
+            self.latencies.append(latency)
+            observe("stream_alert_latency_seconds", latency)
+            if latency > self.latency_budget_s:
+                self.over_budget += 1
+                inc("stream_latency_budget_exceeded_total")
+
+            if self.on_update:
+                try:
+                    self.on_update({
+                        "chunk":         chunk,
+                        "chunk_scores":  list(self.chunk_scores),
+                        "diem_nghi_ngo": diem_tong,
+                        "latency_s":     latency,
+                        "backlog":       backlog,
+                    })
+                except Exception as e:
+                    print(f"[WARN] Streaming on_update failed: {e}")
+
+    # ── Báo cáo ──────────────────────────────────────────────────────────
+    def report(self) -> Dict:
+        """Độ trễ cảnh báo + backlog đo được trong phiên streaming."""
+        return {
+            "chunks":            len(self.chunk_scores),
+            "latency_budget_s":  self.latency_budget_s,
+            "latency_p50_s":     round(_percentile(self.latencies, 50), 3),
+            "latency_p95_s":     round(_percentile(self.latencies, 95), 3),
+            "latency_max_s":     round(max(self.latencies, default=0.0), 3),
+            "over_budget":       self.over_budget,
+            "max_backlog":       self.max_backlog,
+            "dropped":           dict(self.dropped),
+            "diem_nghi_ngo":     aggregate_score(verdict_scores(self.chunk_scores)),
+        }
+
+
+# ── Stand-in: phát WAV theo thời gian thực ──────────────────────────────────
+
+def feed_wav_realtime(
+    wav_path: str,
+    on_update: Optional[Callable[[Dict], None]] = None,
+    frame_ms: int = 20,
+    speed: float = 1.0,
+    chunk_duration: int = DEFAULT_CHUNK_DURATION,
+) -> Dict:
+    """
+    Giả lập cuộc gọi trực tiếp: đọc WAV và feed từng frame frame_ms mili-giây
+    đúng nhịp thời gian thực (speed > 1 để tua nhanh). Trả về report().
+    """
+    with wave.open(wav_path, "rb") as wf:
+        analyzer = StreamingAnalyzer(
+            sample_rate=wf.getframerate(),
+            sample_width=wf.getsampwidth(),
+            channels=wf.getnchannels(),
+            chunk_duration=chunk_duration,
+            on_update=on_update,
+        )
+        frames_per_read = max(1, wf.getframerate() * frame_ms // 1000)
+        interval = frame_ms / 1000 / speed
+        next_tick = time.perf_counter()
+        while True:
+            pcm = wf.readframes(frames_per_read)
+            if not pcm:
+                break
+            analyzer.feed(pcm)
+            next_tick += interval
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+    return analyzer.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Phát WAV theo thời gian thực qua StreamingAnalyzer")
+    parser.add_argument("wav_path")
+    parser.add_argument("--speed", type=float, default=1.0, help="hệ số tua (1.0 = thời gian thực)")
+    args = parser.parse_args()
+
+    def _print_update(u: Dict) -> None:
+        c = u["chunk"]
+        print(
+            f"[{c['time_range']}] diem={c['diem']:.2f} tong={u['diem_nghi_ngo']:.2f} "
+            f"latency={u['latency_s']:.2f}s backlog={u['backlog']} kw={c['keywords'][:5]}"
+        )
+
+    report = feed_wav_realtime(args.wav_path, on_update=_print_update, speed=args.speed)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
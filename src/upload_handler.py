@@ -11,6 +11,7 @@ Chức năng:
 ────────────────────────────────────────────────────────────────
 """
 
+import hashlib
 import streamlit as st
 
 # ── Cấu hình ──────────────────────────────────────────────────────────────
@@ -127,6 +128,8 @@ def render_upload_widget(uploader_key: str = "audio_uploader") -> None:
         st.session_state["upload_error"] = ""
         st.session_state["filename"] = uploaded_file.name
         st.session_state["uploaded_file"] = uploaded_file
+        # Hash nội dung — dùng làm key cho job nền / cache kết quả
+        st.session_state["audio_sha256"] = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
         st.session_state["page"] = "analysis"
         st.rerun()
 
@@ -138,5 +141,5 @@ def get_upload_error() -> str:
 
 def clear_upload_state() -> None:
     """Xóa toàn bộ trạng thái upload (dùng khi quay về Home)."""
-    for key in ("filename", "uploaded_file", "upload_error", "audio_uploader"):
+    for key in ("filename", "uploaded_file", "upload_error", "audio_uploader", "audio_sha256"):
         st.session_state.pop(key, None)
\ No newline at end of file
@@ -0,0 +1,138 @@
+# src/warmup.py
+"""
+Warm-up nền khi server khởi động: lần phân tích đầu tiên sau deploy
+không phải trả chi phí nạp model / dựng matcher / tạo Groq client.
+
+Các bước (chạy tuần tự trong 1 daemon thread):
+    import_pipeline   import analysis_engine (numpy, joblib, pydub, groq)
+    keyword_matcher   _load_predefined_keywords() + dựng trie từ khoá
+    models            get_multilabel_predictor() → load_models()
+    groq_client       get_stt_client().client (import groq + tạo client)
+
+Bước lỗi (thiếu model, thiếu GROQ_API_KEY, ...) chỉ được ghi lại —
+pipeline vẫn tự khởi tạo lười như cũ khi cần.
+
+Readiness cho load balancer:
+    GET /ready   (http_sidecar)  → 200 khi warm-up xong, 503 khi chưa
+    is_ready() / warmup_status() trong code
+
+Khởi động:
+    python serve.py             → warm-up + sidecar chạy NGAY khi process start
+    streamlit run app.py        → warm-up bắt đầu ở session đầu tiên (không chặn trang home)
+
+Cấu hình qua biến môi trường:
+    WARMUP_ENABLED   "0" → tắt warm-up (process luôn báo ready)
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .http_sidecar import register_route, send_bytes
+from .metrics import set_gauge, span
+
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") != "0"
+
+_ready = threading.Event()
+_started = False
+_start_lock = threading.Lock()
+_steps: Dict[str, Dict] = {}
+_started_at: Optional[float] = None
+_finished_at: Optional[float] = None
+
+
+# ── Các bước warm-up (import lười — module này phải nhẹ) ─────────────────────
+
+def _import_pipeline() -> None:
+    from . import analysis_engine  # noqa: F401 — chỉ cần import
+
+
+def _warm_keyword_matcher() -> None:
+    from .analysis_engine import _get_keyword_trie, _match_keywords_with_spans
+    _get_keyword_trie()
+    _match_keywords_with_spans("công an chuyển tiền")
+
+
+def _warm_models() -> None:
+    from .multilabel_predictor import get_multilabel_predictor
+    get_multilabel_predictor()
+
+
+def _warm_groq_client() -> None:
+    from .speech_to_text import get_stt_client
+    get_stt_client().client
+
+
+_STEPS: List[Tuple[str, Callable[[], None]]] = [
+    ("import_pipeline", _import_pipeline),
+    ("keyword_matcher", _warm_keyword_matcher),
+    ("models",          _warm_models),
+    ("groq_client",     _warm_groq_client),
+]
+
+
+def _run() -> None:
+    global _started_at, _finished_at
+    _started_at = time.perf_counter()
+    for name, step in _STEPS:
+        start = time.perf_counter()
+        try:
+            with span(f"warmup_{name}"):
+                step()
+            _steps[name] = {"ok": True, "seconds": round(time.perf_counter() - start, 3)}
+        except Exception as e:
+            _steps[name] = {"ok": False, "seconds": round(time.perf_counter() - start, 3), "error": str(e)}
+            print(f"[WARN] Warm-up step {name} failed: {e}")
+    _finished_at = time.perf_counter()
+    set_gauge("warmup_seconds", _finished_at - _started_at)
+    set_gauge("warmup_ready", 1)
+    _ready.set()
+    print(f"[OK] Warm-up xong sau {_finished_at - _started_at:.2f}s: "
+          + ", ".join(f"{k}={v['seconds']}s{'' if v['ok'] else ' (loi)'}" for k, v in _steps.items()))
+
+
+def start_warmup() -> None:
+    """Chạy warm-up trong daemon thread. Gọi nhiều lần (mỗi rerun) vẫn an toàn."""
+    global _started
+    if _started:
+        return
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+        if not WARMUP_ENABLED:
+            _ready.set()
+            return
+        set_gauge("warmup_ready", 0)
+        threading.Thread(target=_run, name="warmup", daemon=True).start()
+
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+
+def wait_ready(timeout: Optional[float] = None) -> bool:
+    return _ready.wait(timeout)
+
+
+def warmup_status() -> Dict:
+    return {
+        "ready":   _ready.is_set(),
+        "enabled": WARMUP_ENABLED,
+        "started": _started,
+        "seconds": round(_finished_at - _started_at, 3) if _finished_at and _started_at else None,
+        "steps":   dict(_steps),
+    }
+
+
+def _ready_route(req) -> None:
+    body = json.dumps(warmup_status(), ensure_ascii=False).encode("utf-8")
+    send_bytes(req, body, "application/json; charset=utf-8", status=200 if _ready.is_set() else 503)
+
+
+register_route("/ready", _ready_route)
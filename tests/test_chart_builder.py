@@ -0,0 +1,70 @@
+"""Downsample biểu đồ: giữ 2 đầu + mọi chunk nguy hiểm, chỉ số tăng dần, bucket phủ kín [0, n)."""
+
+import random
+
+import pytest
+
+from src.chart_builder import (
+    DANGER_THRESHOLD, _bucket_bounds, _lttb_indices, build_line_chart_html, downsample_indices,
+)
+
+
+def _chunks(n: int, seed: int, danger_ratio: float = 0.05):
+    rng = random.Random(seed)
+    return [
+        {"diem": rng.uniform(DANGER_THRESHOLD, 1.0) if rng.random() < danger_ratio else rng.uniform(0, 0.5),
+         "time_label": f"{i // 2:02d}:{(i % 2) * 30:02d}", "text": "", "loai": []}
+        for i in range(n)
+    ]
+
+
+CASES = [(n, max_points, seed) for n in (5, 241, 1000, 5000) for max_points in (3, 50, 240) for seed in (1, 2)]
+
+
+@pytest.mark.parametrize("n,threshold", [(10, 3), (100, 7), (1000, 240), (241, 240)])
+def test_lttb_keeps_endpoints_and_is_increasing(n, threshold):
+    rng = random.Random(n)
+    values = [rng.random() for _ in range(n)]
+    picked = _lttb_indices(values, threshold)
+    assert len(picked) == threshold
+    assert picked[0] == 0 and picked[-1] == n - 1
+    assert all(a < b for a, b in zip(picked, picked[1:]))
+
+
+def test_lttb_returns_everything_when_not_reducing():
+    assert _lttb_indices([0.1, 0.2, 0.3], 5) == [0, 1, 2]
+    assert _lttb_indices([0.1] * 10, 2) == list(range(10))
+
+
+@pytest.mark.parametrize("n,max_points,seed", CASES)
+def test_downsample_keeps_endpoints_and_danger(n, max_points, seed):
+    chunks = _chunks(n, seed)
+    drawn = downsample_indices(chunks, max_points)
+
+    assert drawn[0] == 0 and drawn[-1] == n - 1
+    assert all(a < b for a, b in zip(drawn, drawn[1:]))
+    danger = {i for i, c in enumerate(chunks) if c["diem"] >= DANGER_THRESHOLD}
+    assert danger <= set(drawn)
+    if n > max_points:
+        assert len(drawn) <= max(max_points, len(danger) + 3)
+
+
+def test_downsample_keeps_every_danger_chunk_beyond_budget():
+    chunks = [{"diem": 0.9 if i % 3 == 0 else 0.1} for i in range(600)]
+    drawn = downsample_indices(chunks, 50)
+    assert {i for i in range(600) if i % 3 == 0} <= set(drawn)
+
+
+@pytest.mark.parametrize("n,max_points,seed", CASES)
+def test_buckets_cover_range_without_gaps(n, max_points, seed):
+    drawn = downsample_indices(_chunks(n, seed), max_points)
+    bounds = _bucket_bounds(drawn, n)
+
+    assert bounds[0][0] == 0 and bounds[-1][1] == n
+    assert all(prev[1] == nxt[0] for prev, nxt in zip(bounds, bounds[1:]))
+    assert all(lo <= i < hi for i, (lo, hi) in zip(drawn, bounds))   # điểm nằm trong bucket của nó
+
+
+def test_chart_html_draws_downsampled_points():
+    html = build_line_chart_html(_chunks(1000, 3), max_points=60)
+    assert "<svg" in html
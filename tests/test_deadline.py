@@ -0,0 +1,126 @@
+"""Deadline: ngân sách theo stage, check/degrade, và đường chấm rule-based khi hết ngân sách "scoring"."""
+
+import pytest
+
+from src import deadline as deadline_mod
+from src.analysis_engine import aggregate_score, verdict_scores
+from src.deadline import Deadline, DeadlineExceeded
+from src.multilabel_predictor import MultilabelPredictor
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(deadline_mod.time, "perf_counter", clock)
+    return clock
+
+
+def test_stage_charges_only_time_spent_inside(clock):
+    dl = Deadline(total_s=0, budgets={"stt": 5.0})
+    with dl.stage("stt"):
+        clock.now += 2.0
+    clock.now += 10.0                       # ngoài stage → không tính
+    with dl.stage("stt"):
+        clock.now += 1.0
+
+    assert dl.remaining("stt") == pytest.approx(2.0)
+    assert not dl.expired("stt")
+    assert dl.report()["stages"]["stt"]["spent_s"] == pytest.approx(3.0)
+
+
+def test_stage_overrun_is_reported(clock):
+    dl = Deadline(total_s=0, budgets={"stt": 1.0})
+    with dl.stage("stt"):
+        clock.now += 1.5
+    assert dl.expired("stt")
+    assert dl.report()["stages"]["stt"]["overrun"] is True
+    assert not dl.degraded()                # vượt ngân sách ≠ đã xuống cấp
+
+
+def test_check_caps_and_raises(clock):
+    dl = Deadline(total_s=10.0, budgets={})
+    assert dl.check("llm", cap=3.0) == pytest.approx(3.0)
+    clock.now += 8.0
+    assert dl.check("llm", cap=3.0) == pytest.approx(2.0)   # phần còn lại của deadline tổng
+    clock.now += 2.0
+    with pytest.raises(DeadlineExceeded) as exc:
+        dl.check("llm", cap=3.0)
+    assert exc.value.stage == "llm"
+
+
+def test_unlimited_deadline_never_expires(clock):
+    dl = Deadline(total_s=0, budgets={})
+    clock.now += 1e6
+    assert dl.timeout("stt") is None
+    assert dl.check("stt") is None
+    assert not dl.expired()
+
+
+def test_degrade_counts_and_marks_overrun(clock):
+    dl = Deadline(total_s=0, budgets={"scoring": 1.0})
+    dl.degrade("scoring", "cham diem rule-based")
+    dl.degrade("scoring", "cham diem rule-based")
+    stage = dl.report()["stages"]["scoring"]
+    assert dl.degraded()
+    assert stage["degraded"] == 2
+    assert stage["overrun"] is True
+
+
+def _predictor() -> MultilabelPredictor:
+    """Predictor "đã load" với model giả: nếu đường ML bị gọi, test sẽ lỗi."""
+    predictor = MultilabelPredictor()
+    predictor._loaded = True
+    predictor.tfidf = object()
+    predictor.mo_hinh = {0: {"loai_ten": "gia_danh_cong_an"}}
+    predictor.tu_khoa_dac_trung = {"gia_danh_cong_an": ["công_an", "bắt_giam", "chuyển_tiền"]}
+    predictor._predict_ml = lambda text, nguong: pytest.fail("het ngan sach van goi ML")
+    return predictor
+
+
+def test_predictor_degrades_to_rule_based_when_scoring_budget_spent(clock):
+    dl = Deadline(total_s=0, budgets={"scoring": 1.0})
+    with dl.stage("scoring"):
+        clock.now += 2.0
+
+    result = _predictor().predict(keywords=["công an", "bắt giam", "chuyển tiền"], deadline=dl)
+
+    assert result["degraded"] is True
+    assert result["nguon"] == "rule_based"
+    assert result["diem_nghi_ngo"] > 0
+    assert dl.report()["stages"]["scoring"]["degraded"] == 1
+
+
+def test_predictor_uses_ml_while_budget_left(clock):
+    predictor = _predictor()
+    predictor._predict_ml = lambda text, nguong: {"diem_nghi_ngo": 0.9, "nguon": "ml_model"}
+    dl = Deadline(total_s=0, budgets={"scoring": 1.0})
+
+    result = predictor.predict(keywords=["công an", "bắt giam", "chuyển tiền"], deadline=dl)
+
+    assert result["nguon"] == "ml_model"
+    assert "degraded" not in result
+    assert not dl.degraded()
+
+
+def test_verdict_keeps_degraded_chunks_and_drops_missing_ones():
+    chunks = [
+        {"diem": 0.2},
+        {"diem": 0.9, "degraded": True},          # điểm rule-based thật → vẫn tính
+        {"diem": 0.0, "timed_out": True},
+        {"diem": 0.0, "error": "503"},
+    ]
+    assert verdict_scores(chunks) == [0.2, 0.9]
+    assert aggregate_score(verdict_scores(chunks)) > aggregate_score([0.2])
+
+
+def test_verdict_falls_back_when_every_chunk_is_missing():
+    chunks = [{"diem": 0.0, "timed_out": True}, {"diem": 0.0, "error": "503"}]
+    assert verdict_scores(chunks) == [0.0, 0.0]
@@ -0,0 +1,72 @@
+"""LLMCache: key theo endpoint, TTL, xoá LRU theo dung lượng, đếm hit/miss."""
+
+import pytest
+
+from src import llm_cache
+from src.llm_cache import LLMCache
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(llm_cache.time, "time", clock)
+    return clock
+
+
+def _key(prompt, base_url=None):
+    return LLMCache.make_key("llama", "system", prompt, 0.1, 200, base_url)
+
+
+def test_key_depends_on_base_url():
+    assert _key("p") == _key("p", "")
+    assert _key("p") != _key("p", "http://127.0.0.1:8787")
+    assert _key("p", "http://127.0.0.1:8787") != _key("p", "http://127.0.0.1:9999")
+
+
+def test_hit_miss_counting(tmp_path, clock):
+    cache = LLMCache(tmp_path / "llm.sqlite3")
+    assert cache.get(_key("a")) is None
+    cache.put(_key("a"), "llama", '{"x": 1}', prompt_tokens=30, completion_tokens=10)
+    assert cache.get(_key("a")) == '{"x": 1}'
+    assert cache.get(_key("a")) == '{"x": 1}'
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 1)
+    assert stats["hit_rate"] == pytest.approx(2 / 3)
+    assert stats["tokens_saved"] == 80
+    assert stats["entries"] == 1
+
+
+def test_expired_entries_are_ignored_and_evicted(tmp_path, clock):
+    cache = LLMCache(tmp_path / "llm.sqlite3", ttl_s=60)
+    cache.put(_key("old"), "llama", "old")
+    clock.now += 30
+    assert cache.get(_key("old")) == "old"
+    clock.now += 31
+    assert cache.get(_key("old")) is None       # quá TTL → bỏ qua khi đọc
+
+    cache.put(_key("new"), "llama", "new")      # ghi → xoá bản hết hạn
+    assert cache.stats()["entries"] == 1
+
+
+def test_size_limit_evicts_least_recently_used(tmp_path, clock):
+    cache = LLMCache(tmp_path / "llm.sqlite3", max_mb=250 / (1024 * 1024))   # 250 byte
+    for name in ("a", "b"):
+        cache.put(_key(name), "llama", name * 100)
+        clock.now += 1
+    cache.get(_key("a"))                         # a mới được đọc → b là LRU
+    clock.now += 1
+    cache.put(_key("c"), "llama", "c" * 100)
+
+    assert cache.get(_key("b")) is None
+    assert cache.get(_key("a")) == "a" * 100
+    assert cache.get(_key("c")) == "c" * 100
+    assert cache.stats()["size_bytes"] == 200
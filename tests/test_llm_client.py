@@ -0,0 +1,86 @@
+"""JsonFieldStream (field lời khuyên stream lên UI) + kiểm tra timeout Groq lúc load."""
+
+import json
+
+import pytest
+
+from src import http_pool
+from src.llm_client import JsonFieldStream
+
+
+def _feed_all(pieces):
+    """Feed lần lượt; trả về [(vị trí piece, field, value)] theo thứ tự phát ra."""
+    fs = JsonFieldStream()
+    emitted = []
+    for i, piece in enumerate(pieces):
+        emitted.extend((i, k, v) for k, v in fs.feed(piece).items())
+    return fs, emitted
+
+
+def test_field_emitted_when_its_string_closes():
+    fs, emitted = _feed_all(['{"summary": "Cuộc gọi ', 'lừa đảo.", "reason"', ': "Đòi OTP"}'])
+    assert emitted == [(1, "summary", "Cuộc gọi lừa đảo."), (2, "reason", "Đòi OTP")]
+    assert fs.fields == {"summary": "Cuộc gọi lừa đảo.", "reason": "Đòi OTP"}
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7])
+def test_fields_split_at_any_boundary(size):
+    obj = {"summary": "Giả danh \"công an\"", "reason": "a\\b\nc", "recommendation": "Gác máy /\u00e9"}
+    text = json.dumps(obj, ensure_ascii=False)
+    fs, emitted = _feed_all([text[i:i + size] for i in range(0, len(text), size)])
+    assert fs.fields == obj
+    assert [k for _, k, _ in emitted] == list(obj)       # mỗi field phát đúng 1 lần, đúng thứ tự
+
+
+def test_escaped_quote_split_between_backslash_and_quote():
+    fs, emitted = _feed_all(['{"summary": "nói \\', '"chuyển tiền\\', '" ngay"}'])
+    assert fs.fields == {"summary": 'nói "chuyển tiền" ngay'}
+    assert emitted == [(2, "summary", 'nói "chuyển tiền" ngay')]
+
+
+def test_escaped_backslash_before_closing_quote():
+    fs, _ = _feed_all(['{"path": "C:\\\\', '", "next": "x"}'])
+    assert fs.fields == {"path": "C:\\", "next": "x"}
+
+
+def test_nested_values_are_skipped():
+    text = ('{"meta": {"summary": "bên trong", "deep": {"reason": "x"}}, '
+            '"signals": ["otp", {"reason": "y"}], "score": 0.9, "ok": true, '
+            '"summary": "bên ngoài"}')
+    fs, _ = _feed_all([text])
+    assert fs.fields == {"summary": "bên ngoài"}
+
+
+def test_key_after_nested_object_is_still_read():
+    fs, _ = _feed_all(['{"meta": {"a": "b"}', ', "reason": "sau object lồng"}'])
+    assert fs.fields == {"reason": "sau object lồng"}
+
+
+def test_prose_before_object_is_ignored():
+    fs, _ = _feed_all(['Đây là kết quả "JSON": ', '{"summary": "ok"}'])
+    assert fs.fields == {"summary": "ok"}
+
+
+@pytest.mark.parametrize("text,fields", [
+    ('{"summary": "chưa đóng', {}),                          # stream bị cắt giữa chừng
+    ('{"summary" "thiếu dấu hai chấm"}', {}),
+    ('{"summary": "a" "b", "reason": "c"}', {"summary": "a", "reason": "c"}),
+    ('{"summary": "lỗi \\q escape", "reason": "c"}', {"reason": "c"}),
+    ('} ] {"summary": "ngoặc thừa phía trước"}', {"summary": "ngoặc thừa phía trước"}),
+    ('', {}),
+])
+def test_malformed_streams_do_not_raise(text, fields):
+    fs, _ = _feed_all([text[i:i + 4] for i in range(0, len(text), 4)])
+    assert fs.fields == fields
+
+
+@pytest.mark.parametrize("value", ["0", "-1", "nan"])
+def test_timeout_env_rejects_non_positive(monkeypatch, value):
+    monkeypatch.setenv("GROQ_READ_TIMEOUT_S", value)
+    with pytest.raises(ValueError):
+        http_pool._timeout_env("GROQ_READ_TIMEOUT_S", "60")
+
+
+def test_timeout_env_default(monkeypatch):
+    monkeypatch.delenv("GROQ_READ_TIMEOUT_S", raising=False)
+    assert http_pool._timeout_env("GROQ_READ_TIMEOUT_S", "60") == 60.0
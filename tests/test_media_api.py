@@ -0,0 +1,59 @@
+"""Audio qua sidecar: đăng ký 1 lần theo sha256, hỗ trợ HTTP Range."""
+
+import urllib.error
+import urllib.request
+
+import pytest
+
+from src import http_sidecar, media_api
+
+
+@pytest.fixture
+def sidecar(monkeypatch):
+    server = http_sidecar.ThreadingHTTPServer(("127.0.0.1", 0), http_sidecar._Handler)
+    server.daemon_threads = True
+    http_sidecar.threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(http_sidecar, "_server", server)
+    monkeypatch.setattr(media_api, "_files", media_api.OrderedDict())
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _get(url, byte_range=None):
+    req = urllib.request.Request(url, headers={"Range": byte_range} if byte_range else {})
+    try:
+        with urllib.request.urlopen(req) as resp:
+            return resp.status, resp.read(), resp.headers.get("Content-Range")
+    except urllib.error.HTTPError as e:
+        return e.code, b"", e.headers.get("Content-Range")
+
+
+def test_no_sidecar_returns_empty_url(monkeypatch):
+    monkeypatch.setattr(http_sidecar, "_server", None)
+    assert media_api.publish_audio("abc", "wav", "audio/wav", lambda: b"x") == ""
+
+
+def test_audio_is_read_once_per_hash(sidecar):
+    reads = []
+
+    def read():
+        reads.append(1)
+        return b"RIFF" + bytes(100)
+
+    first = media_api.publish_audio("abc", "wav", "audio/wav", read)
+    assert media_api.publish_audio("abc", "wav", "audio/wav", read) == first
+    assert len(reads) == 1
+    assert first.endswith("/media/abc.wav")
+
+
+def test_range_requests(sidecar):
+    data = bytes(range(256)) * 4
+    url = media_api.publish_audio("abc", "wav", "audio/wav", lambda: data)
+
+    assert _get(url) == (200, data, None)
+    assert _get(url, "bytes=0-99") == (206, data[:100], "bytes 0-99/1024")
+    assert _get(url, "bytes=1000-") == (206, data[1000:], "bytes 1000-1023/1024")
+    assert _get(url, "bytes=-10") == (206, data[-10:], "bytes 1014-1023/1024")
+    assert _get(url, "bytes=5000-")[::2] == (416, "bytes */1024")
+    assert _get(url.replace("abc", "missing"))[0] == 404
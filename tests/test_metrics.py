@@ -0,0 +1,48 @@
+"""metrics: escape label Prometheus, ghi file atomic, StageTimeline đi theo request sang thread pool."""
+
+import os
+import threading
+
+from src import metrics, request_hedging
+from src.metrics import MetricsRegistry, span, stage_timeline, write_metrics_file
+from src.request_hedging import HedgeBudget, hedged_call
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.inc("errors_total", reason='bad "quote" \\ path\nnext')
+    line = registry.render_prometheus().splitlines()[-1]
+    assert line == 'errors_total{reason="bad \\"quote\\" \\\\ path\\nnext"} 1'
+
+
+def test_write_metrics_file_uses_unique_temp_files(tmp_path, monkeypatch):
+    target = tmp_path / "app.prom"
+    seen = []
+    replace = os.replace
+
+    def spy(src, dst):
+        seen.append(src)
+        replace(src, dst)
+
+    monkeypatch.setattr(metrics.os, "replace", spy)
+    threads = [threading.Thread(target=write_metrics_file, args=(str(target),)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(set(seen)) == 8                     # mỗi lần ghi 1 file tạm riêng
+    assert target.read_text(encoding="utf-8").startswith("# ")
+    assert [p.name for p in tmp_path.iterdir()] == ["app.prom"]   # không sót file tạm
+
+
+def test_timeline_follows_hedged_request_into_pool(monkeypatch):
+    monkeypatch.setattr(request_hedging, "hedge_delay", lambda model="": 10.0)
+
+    def fn():
+        with span("stt_request"):
+            return "ok"
+
+    with stage_timeline() as tl:
+        assert hedged_call(fn, HedgeBudget(1)) == "ok"
+    assert tl.as_dict()["stt_request"]["count"] == 1
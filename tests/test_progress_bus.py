@@ -0,0 +1,89 @@
+"""ProgressBus / ProgressSubscription: throttle, chỉ gửi field đã đổi, ETA theo EWMA."""
+
+import pytest
+
+from src import progress_bus
+from src.progress_bus import ProgressBus, _round_eta
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(progress_bus.time, "perf_counter", clock)
+    return clock
+
+
+def test_poll_is_throttled_to_min_interval(clock):
+    bus = ProgressBus()
+    sub = bus.subscribe(min_interval=1.0)
+
+    bus.publish(1, 10)
+    assert sub.poll() is not None
+    bus.publish(2, 10)
+    clock.now += 0.5
+    assert sub.poll() is None          # chưa tới nhịp gửi
+    clock.now += 0.5
+    assert sub.poll()["percent"] == 20  # tới nhịp → bản mới nhất, update giữa chừng bị gộp
+
+
+def test_force_bypasses_throttle(clock):
+    bus = ProgressBus()
+    sub = bus.subscribe(min_interval=1.0)
+    bus.publish(1, 10)
+    sub.poll()
+    bus.publish(2, 10)
+    assert sub.poll(force=True)["percent"] == 20
+
+
+def test_poll_returns_only_changed_fields(clock):
+    bus = ProgressBus()
+    sub = bus.subscribe(min_interval=0.0)
+
+    bus.publish(0, 10, "Đang tải audio...")
+    first = sub.poll()
+    assert set(first) == {"percent", "status", "eta_s"}
+
+    bus.publish(0, 10, "Đang tải audio...")   # version mới nhưng giá trị y hệt
+    assert sub.poll() is None
+
+    bus.publish(0, 10, "Đang nhận dạng giọng nói...")
+    assert sub.poll() == {"status": "Đang nhận dạng giọng nói..."}
+    assert sub.current() == {"percent": 0, "status": "Đang nhận dạng giọng nói...", "eta_s": None}
+
+
+def test_eta_uses_ewma_of_chunk_interval(clock):
+    bus = ProgressBus()
+    assert bus.snapshot()["eta_s"] is None   # chưa có chunk nào xong
+
+    clock.now += 2.0
+    bus.publish(1, 11)                       # mẫu đầu: 2 s/chunk
+    assert bus.snapshot()["eta_s"] == _round_eta(10 * 2.0)
+
+    clock.now += 12.0
+    bus.publish(3, 11)                       # 2 chunk trong 12 s → mẫu 6 s/chunk
+    latency = 0.3 * 6.0 + 0.7 * 2.0          # = 3.2
+    assert bus.snapshot()["eta_s"] == _round_eta(8 * latency)
+
+
+def test_eta_rounding():
+    assert _round_eta(1) == 5
+    assert _round_eta(42) == 40
+    assert _round_eta(59) == 60
+    assert _round_eta(170) == 180
+
+
+def test_eta_cleared_when_done(clock):
+    bus = ProgressBus()
+    clock.now += 1.0
+    bus.publish(5, 5)
+    snap = bus.snapshot()
+    assert snap["eta_s"] is None
+    assert snap["percent"] == 99   # 100% chỉ khi job thật sự xong
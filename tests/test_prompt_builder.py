@@ -0,0 +1,89 @@
+"""build_transcript_excerpt: ranh giới ngân sách token, bỏ chunk STT lỗi / quá hạn."""
+
+import random
+
+import pytest
+
+from src.prompt_builder import _GAP, build_transcript_excerpt, estimate_tokens
+
+
+def _chunk(i, diem=0.1, text=None, **extra):
+    return {
+        "time_range": f"{i // 2:02d}:{(i % 2) * 30:02d}-{(i + 1) // 2:02d}:{((i + 1) % 2) * 30:02d}",
+        "text": text if text is not None else f"câu thoại số {i} " * 3,
+        "diem": diem,
+        "keywords": [],
+        **extra,
+    }
+
+
+def test_whole_call_within_budget_is_sent_verbatim():
+    chunks = [_chunk(i) for i in range(6)]
+    full = build_transcript_excerpt(chunks, token_budget=10**6)[1]["full_tokens"]
+
+    text, info = build_transcript_excerpt(chunks, token_budget=full)
+    assert _GAP not in text
+    assert info["selected"] == info["total"] == 6
+    assert info["tokens"] <= full
+
+
+def test_one_token_over_budget_switches_to_excerpt():
+    chunks = [_chunk(i) for i in range(6)]
+    full = build_transcript_excerpt(chunks, token_budget=10**6)[1]["full_tokens"]
+
+    text, info = build_transcript_excerpt(chunks, token_budget=full - 1)
+    assert info["selected"] < 6
+    assert _GAP in text
+    assert info["tokens"] <= full - 1
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_excerpt_never_exceeds_budget(seed):
+    rng = random.Random(seed)
+    chunks = [
+        _chunk(i, diem=rng.random(), text="x" * rng.randint(0, 120),
+               **({"timed_out": True} if rng.random() < 0.15 else {}))
+        for i in range(40)
+    ]
+    for budget in range(0, 700, 7):
+        for neighbors in (0, 1, 2):
+            text, info = build_transcript_excerpt(chunks, token_budget=budget, neighbors=neighbors)
+            assert estimate_tokens(text) == info["tokens"] <= budget
+
+
+def test_most_suspicious_chunk_is_kept_with_context():
+    chunks = [_chunk(i) for i in range(20)]
+    chunks[12]["diem"] = 0.95
+    cost = estimate_tokens(f"[{chunks[12]['time_range']}] {chunks[12]['text']}") + 1
+
+    text, info = build_transcript_excerpt(chunks, token_budget=4 * cost, neighbors=1)
+    assert chunks[11]["text"] in text and chunks[12]["text"] in text and chunks[13]["text"] in text
+    assert info["selected"] == 3
+
+
+def test_failed_and_timed_out_chunks_are_never_sent():
+    chunks = [
+        _chunk(0),
+        _chunk(1, diem=0.0, text="", error="Error code: 503"),
+        _chunk(2, diem=0.0, text="", timed_out=True),
+        _chunk(3),
+    ]
+    text, info = build_transcript_excerpt(chunks, token_budget=10**6)
+    lines = text.split("\n")
+    assert lines == [f"[{chunks[0]['time_range']}] {chunks[0]['text']}", _GAP,
+                     f"[{chunks[3]['time_range']}] {chunks[3]['text']}"]
+    assert info["selected"] == 2 and info["total"] == 4
+
+
+def test_context_does_not_jump_over_failed_chunk():
+    chunks = [_chunk(0), _chunk(1, diem=0.0, text="", timed_out=True), _chunk(2, diem=0.9), _chunk(3)]
+    cost = estimate_tokens(f"[{chunks[2]['time_range']}] {chunks[2]['text']}") + 1
+
+    text, _ = build_transcript_excerpt(chunks, token_budget=3 * cost, neighbors=2)
+    assert chunks[0]["text"] not in text
+    assert chunks[2]["text"] in text and chunks[3]["text"] in text
+
+
+def test_all_chunks_failed_gives_empty_transcript():
+    chunks = [_chunk(i, diem=0.0, text="", error="401") for i in range(3)]
+    assert build_transcript_excerpt(chunks)[0] == ""
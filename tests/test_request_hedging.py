@@ -0,0 +1,131 @@
+"""Hedged request STT: khi nào gửi bản sao, bản nào thắng, job huỷ / hết ngân sách thì không hedge."""
+
+import threading
+
+import pytest
+
+from src import request_hedging
+from src.cancellation import CancelToken
+from src.metrics import get_registry
+from src.request_hedging import HedgeBudget, hedged_call
+
+
+@pytest.fixture(autouse=True)
+def fresh_windows(monkeypatch):
+    monkeypatch.setattr(request_hedging, "request_latency", request_hedging._ModelWindows())
+    monkeypatch.setattr(request_hedging, "chunk_latency", request_hedging._ModelWindows())
+    monkeypatch.setattr(request_hedging, "STT_HEDGE_MIN_SAMPLES", 3)
+    monkeypatch.setattr(request_hedging, "STT_HEDGE_MIN_DELAY_S", 0.05)
+
+
+def _warm(model: str, seconds: float = 0.01, n: int = 3) -> None:
+    for _ in range(n):
+        request_hedging.request_latency.get(model).add(seconds)
+
+
+class _SlowFirst:
+    """Lần gọi đầu chờ tới khi release(); các lần sau trả ngay."""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+            n = self.calls
+        if n == 1:
+            assert self.release.wait(5)
+            return "primary"
+        return "hedge"
+
+
+def _skipped(reason: str) -> float:
+    return get_registry().counter_value("stt_hedge_skipped_total", reason=reason)
+
+
+def test_no_hedge_before_enough_samples():
+    fn = _SlowFirst()
+    fn.release.set()
+    assert hedged_call(fn, HedgeBudget(1), model="whisper") == "primary"
+    assert fn.calls == 1
+
+
+def test_slow_primary_is_hedged_and_hedge_wins():
+    _warm("whisper")
+    fn = _SlowFirst()
+    won = request_hedging.hedge_stats()["hedges_won"]
+    budget = HedgeBudget(1)
+    try:
+        assert hedged_call(fn, budget, model="whisper") == "hedge"
+    finally:
+        fn.release.set()   # bản thua chạy nốt trong thread riêng
+    assert fn.calls == 2
+    assert budget.used == 1
+    assert request_hedging.hedge_stats()["hedges_won"] == won + 1
+
+
+def test_primary_wins_when_it_finishes_first():
+    _warm("whisper")
+    hedge_started = threading.Event()
+    release_hedge = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) == 1:
+            assert hedge_started.wait(5)   # bản sao đã gửi rồi bản gốc mới về
+            return "primary"
+        hedge_started.set()
+        release_hedge.wait(5)
+        return "hedge"
+
+    try:
+        assert hedged_call(fn, HedgeBudget(1), model="whisper") == "primary"
+    finally:
+        release_hedge.set()
+    assert len(calls) == 2
+
+
+def test_both_failing_raises():
+    _warm("whisper")
+
+    def fn():
+        raise RuntimeError("503")
+
+    with pytest.raises(RuntimeError):
+        hedged_call(fn, HedgeBudget(1), model="whisper")
+
+
+def test_cancelled_job_is_not_hedged():
+    _warm("whisper")
+    token = CancelToken()
+    token.cancel()
+    fn = _SlowFirst()
+    before = _skipped("cancelled")
+    threading.Timer(0.2, fn.release.set).start()
+
+    assert hedged_call(fn, HedgeBudget(1), token, model="whisper") == "primary"
+    assert fn.calls == 1
+    assert _skipped("cancelled") == before + 1
+
+
+def test_exhausted_budget_is_not_hedged():
+    _warm("whisper")
+    fn = _SlowFirst()
+    before = _skipped("budget")
+    threading.Timer(0.2, fn.release.set).start()
+
+    assert hedged_call(fn, HedgeBudget(0), model="whisper") == "primary"
+    assert fn.calls == 1
+    assert _skipped("budget") == before + 1
+
+
+def test_latency_windows_are_per_model():
+    _warm("whisper-fast", seconds=0.01)
+    _warm("whisper-large", seconds=2.0)
+
+    assert request_hedging.hedge_delay("whisper-fast") == pytest.approx(0.05)   # chặn bởi MIN_DELAY
+    assert request_hedging.hedge_delay("whisper-large") == pytest.approx(2.0)
+    assert request_hedging.hedge_delay("whisper-other") is None                  # chưa có mẫu riêng
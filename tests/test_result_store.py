@@ -0,0 +1,88 @@
+"""Kết quả phân tích chỉ được lưu vào result_store khi đầy đủ (không có chunk STT lỗi)."""
+
+import io
+import wave
+
+from src import analysis_engine
+from src.result_store import ResultStore, incomplete_reason
+from src.speech_to_text import SpeechToText
+
+
+class _Transcriptions:
+    def __init__(self, fail: bool):
+        self.fail = fail
+
+    def create(self, **kwargs):
+        if self.fail:
+            raise RuntimeError("Error code: 503 - service unavailable")
+        return "xin chào, tôi gọi từ ngân hàng"
+
+
+class _FakeGroq:
+    def __init__(self, fail: bool):
+        self.audio = type("Audio", (), {"transcriptions": _Transcriptions(fail)})()
+
+    def with_options(self, **kwargs):
+        return self
+
+
+def _wav(seconds: int) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(8000)
+        w.writeframes(b"\x00\x00" * 8000 * seconds)
+    return buf.getvalue()
+
+
+def _analyze(monkeypatch, fail: bool):
+    stt = SpeechToText(api_key="test")
+    stt._client = _FakeGroq(fail)
+    monkeypatch.setattr(analysis_engine, "get_stt_client", lambda: stt)
+    return analysis_engine.analyze_audio(_wav(25), "call.wav")
+
+
+def test_failed_stt_run_is_not_cached(tmp_path, monkeypatch):
+    result = _analyze(monkeypatch, fail=True)
+
+    assert all(chunk.get("error") for chunk in result["chunk_scores"])
+    assert incomplete_reason(result) == "stt_error"
+    store = ResultStore(tmp_path / "results.sqlite3")
+    assert store.put("abc", 10, result) is False
+    assert store.get("abc", 10) is None
+
+
+def test_complete_run_is_cached(tmp_path, monkeypatch):
+    result = _analyze(monkeypatch, fail=False)
+
+    assert incomplete_reason(result) is None
+    store = ResultStore(tmp_path / "results.sqlite3")
+    assert store.put("abc", 10, result) is True
+    assert store.get("abc", 10)["chunk_scores"] == result["chunk_scores"]
+
+
+def test_fast_preview_is_not_cached(tmp_path, monkeypatch):
+    stt = SpeechToText(api_key="test")
+    stt._client = _FakeGroq(fail=False)
+    monkeypatch.setattr(analysis_engine, "get_stt_client", lambda: stt)
+    preview = analysis_engine.analyze_audio(_wav(25), "call.wav", quality="fast")
+
+    assert incomplete_reason(preview) == "preview"
+    store = ResultStore(tmp_path / "results.sqlite3")
+    assert store.put("abc", 10, preview) is False
+
+
+def test_refine_with_failed_chunks_stays_preview(monkeypatch):
+    stt = SpeechToText(api_key="test")
+    stt._client = _FakeGroq(fail=False)
+    monkeypatch.setattr(analysis_engine, "get_stt_client", lambda: stt)
+    preview = analysis_engine.analyze_audio(_wav(25), "call.wav", quality="fast")
+
+    stt._client = _FakeGroq(fail=True)   # lượt 2 lỗi hết → vẫn là bản xem trước
+    refined = analysis_engine.refine_audio(_wav(25), "call.wav", preview)
+    assert incomplete_reason(refined) == "preview"
+
+    stt._client = _FakeGroq(fail=False)
+    refined = analysis_engine.refine_audio(_wav(25), "call.wav", preview)
+    assert incomplete_reason(refined) is None
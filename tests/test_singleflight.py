@@ -0,0 +1,137 @@
+"""Singleflight: cùng file ở nhiều session chỉ phân tích 1 lần; huỷ 1 session không huỷ session kia."""
+
+import threading
+import time
+
+import pytest
+
+from src import job_runner, llm_advice, singleflight
+from src.job_runner import CANCELLED, DONE, JobRunner
+from src.singleflight import FlightLock
+
+
+class _FakeAnalyze:
+    """analyze_audio giả: chờ release() (hoặc job bị huỷ), đếm số lần chạy."""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self._lock = threading.Lock()
+
+    def __call__(self, audio_bytes, filename, chunk_duration, cancel_token=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+        self.started.set()
+        while not self.release.is_set():
+            if cancel_token.wait(0.01):
+                cancel_token.raise_if_cancelled()
+        return {"chunk_scores": [], "diem_nghi_ngo": 0.0, "filename": filename}
+
+
+@pytest.fixture
+def fake_analyze(monkeypatch):
+    fake = _FakeAnalyze()
+    monkeypatch.setattr(job_runner, "analyze_audio", fake)
+    monkeypatch.setattr(job_runner, "get_result_store", lambda: None)
+    monkeypatch.setattr(job_runner, "TWO_PASS", False)
+    monkeypatch.setattr(llm_advice, "LLM_ADVICE_ENABLED", False)
+    yield fake
+    fake.release.set()
+
+
+def _wait_finished(job, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not job.is_finished():
+        assert time.monotonic() < end, f"job van {job.status}"
+        time.sleep(0.01)
+
+
+def test_same_file_in_two_sessions_runs_once(fake_analyze):
+    runner = JobRunner(max_workers=2)
+    job_a = runner.submit("session-a", "hash1", b"audio", "call.wav", 30)
+    assert fake_analyze.started.wait(5)
+    job_b = runner.submit("session-b", "hash1", b"audio", "call.wav", 30)
+
+    assert job_b is job_a
+    fake_analyze.release.set()
+    _wait_finished(job_a)
+
+    assert fake_analyze.calls == 1
+    assert job_a.status == DONE
+    assert runner.get("session-b", "hash1").latest_result()[1]["filename"] == "call.wav"
+    stats = runner.singleflight_stats()
+    assert stats["leader"] == 1 and stats["attached"] == 1 and stats["in_flight"] == 0
+
+
+def test_different_chunk_duration_is_a_separate_flight(fake_analyze):
+    runner = JobRunner(max_workers=2)
+    job_a = runner.submit("session-a", "hash1", b"audio", "call.wav", 30)
+    job_b = runner.submit("session-b", "hash1", b"audio", "call.wav", 15)
+    assert job_b is not job_a
+    fake_analyze.release.set()
+    _wait_finished(job_a)
+    _wait_finished(job_b)
+    assert fake_analyze.calls == 2
+
+
+def test_cancelling_one_session_keeps_the_shared_job_running(fake_analyze):
+    runner = JobRunner(max_workers=2)
+    job = runner.submit("session-a", "hash1", b"audio", "call.wav", 30)
+    assert fake_analyze.started.wait(5)
+    runner.submit("session-b", "hash1", b"audio", "call.wav", 30)
+
+    runner.cancel("session-a", "hash1")
+    assert not job.cancel_token.cancelled
+    assert runner.get("session-a", "hash1") is None
+    assert runner.get("session-b", "hash1") is job
+
+    fake_analyze.release.set()
+    _wait_finished(job)
+    assert job.status == DONE
+    assert fake_analyze.calls == 1
+
+
+def test_job_cancelled_when_last_session_leaves(fake_analyze):
+    runner = JobRunner(max_workers=2)
+    job = runner.submit("session-a", "hash1", b"audio", "call.wav", 30)
+    assert fake_analyze.started.wait(5)
+    runner.submit("session-b", "hash1", b"audio", "call.wav", 30)
+
+    runner.cancel("session-a", "hash1")
+    runner.cancel("session-b", "hash1")
+    _wait_finished(job)
+    assert job.status == CANCELLED
+
+
+def test_attach_after_cancel_starts_a_new_run(fake_analyze):
+    runner = JobRunner(max_workers=2)
+    job = runner.submit("session-a", "hash1", b"audio", "call.wav", 30)
+    assert fake_analyze.started.wait(5)
+    runner.cancel("session-a", "hash1")
+
+    fresh = runner.submit("session-b", "hash1", b"audio", "call.wav", 30)   # không gắn vào job đã huỷ
+    assert fresh is not job
+    fake_analyze.release.set()
+    _wait_finished(fresh)
+    assert fresh.status == DONE
+
+
+@pytest.mark.skipif(singleflight.fcntl is None, reason="flock chỉ có trên POSIX")
+def test_flight_lock_is_exclusive_per_file(tmp_path):
+    first = FlightLock(tmp_path / "h-30.lock")
+    second = FlightLock(tmp_path / "h-30.lock")
+
+    assert first.try_acquire()
+    assert first.try_acquire()            # gọi lại khi đang giữ → True
+    assert not second.try_acquire()
+    assert FlightLock(tmp_path / "h-15.lock").try_acquire()
+
+    first.release()
+    assert second.try_acquire()
+    second.release()
+
+
+def test_flight_lock_disabled_without_dir(monkeypatch):
+    monkeypatch.setattr(singleflight, "SINGLEFLIGHT_LOCK_DIR", "")
+    assert singleflight.flight_lock("h", 30) is None
@@ -0,0 +1,100 @@
+"""StreamingAnalyzer: PCM tổng hợp qua feed()/close(), phát theo thứ tự, bỏ chunk khi backlog đầy."""
+
+import threading
+
+import pytest
+
+from src import streaming_analysis
+from src.analysis_engine import _load_predefined_keywords
+from src.multilabel_predictor import MultilabelPredictor
+from src.streaming_analysis import StreamingAnalyzer
+
+SAMPLE_RATE = 8000
+BYTES_PER_SEC = SAMPLE_RATE * 2   # 16-bit mono
+
+
+class _FakeSTT:
+    """transcribe_bytes giả: text theo số thứ tự chunk; có thể chặn tới khi release()."""
+
+    def __init__(self, texts, block=False, fail_on=()):
+        self.texts = texts
+        self.fail_on = set(fail_on)
+        self.release = threading.Event()
+        if not block:
+            self.release.set()
+        self.calls = []
+
+    def transcribe_bytes(self, wav, filename="", deadline=None, raise_errors=False):
+        idx = int(filename.split("_")[1].split(".")[0])
+        self.calls.append(idx)
+        assert wav[:4] == b"RIFF"
+        assert self.release.wait(5)
+        if idx in self.fail_on:
+            raise RuntimeError("Error code: 503")
+        return self.texts.get(idx, "")
+
+
+@pytest.fixture
+def make_analyzer(monkeypatch):
+    monkeypatch.setattr(streaming_analysis, "get_multilabel_predictor", MultilabelPredictor)
+
+    def make(stt, **kwargs):
+        monkeypatch.setattr(streaming_analysis, "get_stt_client", lambda: stt)
+        updates = []
+        analyzer = StreamingAnalyzer(
+            sample_rate=SAMPLE_RATE, chunk_duration=1, on_update=updates.append,
+            latency_budget_s=0, **kwargs,
+        )
+        return analyzer, updates
+
+    return make
+
+
+def _feed_seconds(analyzer, seconds, frame_ms=20):
+    frame = b"\x00\x01" * (SAMPLE_RATE * frame_ms // 1000)
+    for _ in range(int(seconds * 1000 / frame_ms)):
+        analyzer.feed(frame)
+
+
+def test_feed_and_close_emit_every_chunk_in_order(make_analyzer):
+    keyword = next(k for k in _load_predefined_keywords() if " " in k)
+    stt = _FakeSTT({1: f"xin chào, {keyword} ngay"})
+    analyzer, updates = make_analyzer(stt, workers=2, max_backlog=10)
+
+    _feed_seconds(analyzer, 3.5)
+    report = analyzer.close()
+
+    assert report["chunks"] == 4                               # 3 chunk đủ + phần dư lúc close()
+    assert [u["chunk"]["time_label"] for u in updates] == ["00:00", "00:01", "00:02", "00:03"]
+    assert keyword in updates[1]["chunk"]["keywords"]
+    assert updates[1]["chunk"]["spans"]
+    assert len(updates[-1]["chunk_scores"]) == 4
+    assert report["dropped"] == {"backlog": 0, "late": 0, "error": 0}
+    with pytest.raises(RuntimeError):
+        analyzer.feed(b"\x00\x00")
+
+
+def test_full_backlog_sheds_new_chunks(make_analyzer):
+    stt = _FakeSTT({0: "xin chào"}, block=True)
+    analyzer, updates = make_analyzer(stt, workers=1, max_backlog=1)
+
+    _feed_seconds(analyzer, 3)          # chunk 0 đang chờ STT → chunk 1, 2 bị bỏ ngay
+    stt.release.set()
+    report = analyzer.close()
+
+    assert stt.calls == [0]             # chunk bị bỏ không gửi STT
+    assert report["dropped"]["backlog"] == 2
+    assert [bool(u["chunk"].get("timed_out")) for u in updates] == [False, True, True]
+    assert report["max_backlog"] >= 2
+
+
+def test_stt_error_becomes_error_chunk(make_analyzer):
+    stt = _FakeSTT({0: "xin chào"}, fail_on={1})
+    analyzer, updates = make_analyzer(stt, workers=1, max_backlog=10)
+
+    _feed_seconds(analyzer, 2)
+    report = analyzer.close()
+
+    assert report["dropped"]["error"] == 1
+    assert updates[1]["chunk"]["error"] == "Error code: 503"
+    assert updates[1]["chunk"]["diem"] == 0.0
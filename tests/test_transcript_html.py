@@ -0,0 +1,92 @@
+"""Transcript: trie khớp từ khoá đúng như regex word-boundary cũ, HTML transcript luôn được escape."""
+
+import random
+import re
+
+import pytest
+
+from src.analysis_engine import _load_predefined_keywords, _match_keywords_with_spans
+from views.analysis_page import _highlight_spans, _highlight_text, _transcript_row_html
+
+_WORD = "a-zA-ZÀ-ỹ"
+
+
+@pytest.fixture(scope="module")
+def patterns():
+    """Pattern regex cũ cho từng từ khoá (compile trước — ~1.4k pattern vượt cache của re)."""
+    return [
+        (kw, re.compile(rf"(?<![{_WORD}])(?=({re.escape(kw.lower())})(?![{_WORD}]))"))
+        for kw in _load_predefined_keywords()
+    ]
+
+
+def _regex_matches(text, patterns):
+    """Cài đặt regex cũ (1 pattern mỗi từ khoá) + mọi vị trí khớp, kể cả chồng nhau."""
+    text_lower = text.lower()
+    keywords, seen, hits = [], set(), set()
+    for kw, pattern in patterns:
+        kw_lower = kw.lower()
+        found = [(m.start(1), m.end(1)) for m in pattern.finditer(text_lower)]
+        if found and kw_lower not in seen:
+            keywords.append(kw)
+            seen.add(kw_lower)
+        hits.update((s, e, kw_lower) for s, e in found)
+    return keywords, hits
+
+
+def _texts(n, seed):
+    rng = random.Random(seed)
+    keywords = _load_predefined_keywords()
+    filler = ["anh", "chị", "khan", "tiềnn", "ok", "vâng", "ngân", "hàng", "123", "xin chào"]
+    for _ in range(n):
+        words = []
+        for _ in range(rng.randint(3, 25)):
+            word = rng.choice(keywords) if rng.random() < 0.4 else rng.choice(filler)
+            if rng.random() < 0.2:
+                word = word.upper() if rng.random() < 0.5 else word.capitalize()
+            if rng.random() < 0.1:
+                word = rng.choice("xyđ") + word          # dính chữ bên trái → không được khớp
+            words.append(word)
+        yield rng.choice([" ", ", ", ". ", "! ", "\n"]).join(words)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_trie_matches_old_regex(seed, patterns):
+    for text in _texts(20, seed):
+        keywords, spans = _match_keywords_with_spans(text)
+        ref_keywords, ref_hits = _regex_matches(text, patterns)
+
+        assert keywords == ref_keywords
+        hits = {(s, e, keywords[k].lower()) for s, e, k in spans}
+        assert hits == ref_hits
+        assert len(spans) == len(hits)                   # không trùng span
+        for s, e, k in spans:
+            assert text[s:e].lower() == keywords[k].lower()
+
+
+def test_no_match_inside_word():
+    kw = next(k for k in _load_predefined_keywords() if " " not in k and len(k) <= 6)
+    assert _match_keywords_with_spans(f"x{kw} {kw}x")[0] == []
+    assert _match_keywords_with_spans(f"({kw.upper()})")[0] == [kw]
+
+
+def test_highlight_spans_escapes_text_between_and_inside_spans():
+    text = '<img src=x onerror="alert(1)"> chuyển <b>tiền</b> & xong'
+    s = text.index("chuyển")
+    html = _highlight_spans(text, [[s, s + len("chuyển"), 0]])
+    assert "<img" not in html and "<b>" not in html
+    assert '&lt;img src=x onerror=&quot;alert(1)&quot;&gt;' in html
+    assert '<span class="kw-hl">chuyển</span>' in html
+    assert "&amp; xong" in html
+
+    inner = _highlight_spans("a<b>c", [[0, 5, 0]])
+    assert inner == '<span class="kw-hl">a&lt;b&gt;c</span>'
+
+
+def test_transcript_row_escapes_without_spans():
+    chunk = {"time_range": "00:00-00:30", "text": "<script>x()</script> công an", "keywords": ["công an"]}
+    assert "<script>" not in _transcript_row_html(0, {**chunk, "spans": []})
+    legacy = _transcript_row_html(0, chunk)   # ChunkResult cũ chưa có spans
+    assert "<script>" not in legacy
+    assert '<span class="kw-hl">công an</span>' in legacy
+    assert _highlight_text("", ["x"]) == ""
@@ -6,14 +6,64 @@ Trang 2 – Kết quả phân tích: CSS, HTML và logic render.
 """
 
 import re
+import json
+import time
 import base64
+import hashlib
+from html import escape
 import streamlit as st
 
 from src.assets_loader import icon
-from src.analysis_engine import run_analysis, get_chunk_scores, is_analysis_done
+from src.analysis_engine import (
+    aggregate_score, count_keywords, get_chunk_scores, is_analysis_done,
+    store_result_in_session, verdict_scores,
+)
 from src.chart_builder import build_line_chart_html
-from src.upload_handler import clear_upload_state
-from src.loading_screen import LoadingScreen, estimate_chunks
+from src.job_runner import CANCELLED, DONE, FAILED, JobQueueFull, get_job_runner, get_session_id
+from src.llm_advice import AdviceTask
+from src.media_api import publish_audio
+from src.result_store import get_result_store
+from src.speech_to_text import DEFAULT_CHUNK_DURATION
+from src.loading_screen import LoadingScreen, format_eta
+from src.metrics import observe, set_gauge, timed
+from src.progress_bus import PROGRESS_MIN_INTERVAL_S
+from src.page_template import PageTemplate
+from src.render_cache import RenderCache, content_hash
+from src.result_api import publish_result, register_view, view_url
+
+# Chu kỳ poll lời khuyên LLM / lượt tinh chỉnh (giây); tiến độ job poll theo
+# PROGRESS_MIN_INTERVAL_S — nhanh hơn nhịp throttle của progress_bus là thừa
+JOB_POLL_INTERVAL = 0.5
+
+# Khoảng cách tối thiểu giữa 2 lần gửi lại dashboard tạm khi có chunk mới (giây)
+PARTIAL_REFRESH_INTERVAL = 5.0
+
+# Tăng khi đổi CSS / cấu trúc HTML → fragment cũ trong cache tự hết hiệu lực
+LAYOUT_VERSION = 4
+
+# Transcript ảo hoá: chỉ dựng DOM cho dòng trong khung nhìn + overscan,
+# các dòng còn lại được fetch theo trang từ result_api khi cuộn tới
+TRANSCRIPT_PAGE_SIZE = 50
+TRANSCRIPT_OVERSCAN  = 6
+TRANSCRIPT_ROW_EST_PX = 64   # chiều cao ước lượng trước khi đo được dòng thật
+
+# URL audio gắn với session nên không nằm trong HTML cache — thay vào lúc render
+_AUDIO_SRC_SLOT = "%%AUDIO_SRC%%"
+
+_dashboard_cache = RenderCache("analysis_page")
+
+# Template dashboard biên dịch lần đầu dùng (cần đọc icon từ assets/)
+_dashboard_template = None
+
+
+def _get_dashboard_template():
+    global _dashboard_template
+    if _dashboard_template is None:
+        _dashboard_template = PageTemplate(DASHBOARD_HTML, name="analysis", static={
+            "css":       CSS,
+            "icon_home": icon("icon_home_heart.svg"),
+        })
+    return _dashboard_template
 
 # ── CSS ───────────────────────────────────────────────────────────────────
 CSS = """
@@ -83,17 +133,22 @@ menu, ol, ul { list-style-type: none; }
 .advice-rec-box { background:#fce8e8; border-radius:10px; padding:14px 16px; display:flex; flex-direction:column; gap:10px; flex-shrink:0; box-sizing:border-box; }
 .advice-rec-title { color:#c0392b; font-family:"Poppins",sans-serif; font-size:13px; font-weight:700; line-height:1.4; }
 .advice-rec-body { color:#c0392b; font-family:"Poppins",sans-serif; font-size:13px; font-weight:700; line-height:1.5; }
+.advice-note { color:#8a94a6; font-family:"Poppins",sans-serif; font-size:12px; font-style:italic; line-height:1.4; align-self:stretch; flex-shrink:0; }
 .advice-rec-why { color:#c0392b; font-family:"Poppins",sans-serif; font-size:13px; font-weight:700; line-height:1.5; margin-top:2px; }
 .conv-card { background:#ffffff; border-radius:16px; padding:20px 22px; display:flex; flex-direction:column; gap:14px; flex:2; min-width:300px; box-sizing:border-box; }
 .tbl { border-radius:8px; display:flex; flex-direction:column; align-self:stretch; overflow:hidden; border:1px solid #e8edf4; }
 .tbl-hdr { background:#e3eefc; display:grid; grid-template-columns:130px 1fr; align-items:center; border-bottom:1px solid #d3e3f9; }
 .th-cell { padding:11px 14px; color:#222222; font-size:14px; font-weight:600; font-family:"Poppins",sans-serif; }
-.tbl-body { display:flex; flex-direction:column; max-height:460px; overflow-y:auto; scrollbar-width:thin; scrollbar-color:#c7d9f0 #f5f8fc; }
+.tbl-body { display:block; position:relative; max-height:460px; overflow-y:auto; scrollbar-width:thin; scrollbar-color:#c7d9f0 #f5f8fc; }
+.tr-spacer { position:relative; width:100%; }
+.tr-window { position:absolute; left:0; right:0; top:0; }
 .tbl-body::-webkit-scrollbar { width:5px; }
 .tbl-body::-webkit-scrollbar-track { background:#f5f8fc; }
 .tbl-body::-webkit-scrollbar-thumb { background:#c7d9f0; border-radius:4px; }
 .tr-row { display:grid; grid-template-columns:130px 1fr; align-items:baseline; border-top:1px solid #e8edf4; }
 .tr-row:first-child { border-top:none; }
+.tr-row.tr-active { background:#fff7e6; }
+.tr-row.tr-pending .td-content { color:#9b9797; }
 .td-time { padding:11px 14px; color:#2c6dee; font-size:13px; font-weight:500; font-family:"Poppins",sans-serif; white-space:nowrap; }
 .td-content { padding:11px 14px 11px 0; color:#333333; font-size:13.5px; font-weight:400; font-family:"Poppins",sans-serif; line-height:1.55; }
 .kw-hl { background:#ffd6cc; color:#c0392b; font-weight:600; border-radius:4px; padding:1px 4px; }
@@ -115,116 +170,9 @@ menu, ol, ul { list-style-type: none; }
 </style>
 """
 
-
-# ── Helpers ───────────────────────────────────────────────────────────────
-def _highlight_text(text, keywords):
-    if not keywords or not text:
-        return text or ""
-    result = text
-    for kw in sorted(keywords, key=len, reverse=True):
-        pattern = re.compile(re.escape(kw), re.IGNORECASE)
-        result = pattern.sub(lambda m: f'<span class="kw-hl">{m.group(0)}</span>', result)
-    return result
-
-
-def _kw_tag(label, count, hidden=False):
-    style = ' style="display:none;"' if hidden else ''
-    cls   = 'kw-tag kw-extra' if hidden else 'kw-tag'
-    return (
-        f'<div class="{cls}"{style}>'
-        f'<div class="kw-label">{label}</div>'
-        f'<div class="kw-count"><div class="kw-num">{count}</div></div>'
-        f'</div>'
-    )
-
-
-def _build_audio_src(uploaded_file, filename):
-    if uploaded_file is None:
-        return ""
-    mime_map = {"mp3":"audio/mpeg","wav":"audio/wav","m4a":"audio/x-m4a",
-                "ogg":"audio/ogg","mp4":"audio/mp4","mpeg4":"audio/mp4"}
-    ext  = filename.rsplit(".", 1)[-1].lower() if "." in filename else "mp3"
-    mime = mime_map.get(ext, "audio/mpeg")
-    b64  = base64.b64encode(uploaded_file.getvalue()).decode("utf-8")
-    return f"data:{mime};base64,{b64}"
-
-
-def _badge_style(raw_score):
-    if raw_score < 0.30:
-        return "#22c55e", "#dcfce7", "#22c55e", "An toàn"
-    elif raw_score < 0.60:
-        return "#f59e0b", "#fef3c7", "#f59e0b", "Nghi ngờ"
-    return "#f50000", "#ffd7d7", "#f50000", "Dấu hiệu lừa đảo"
-
-
-# ── Render function ───────────────────────────────────────────────────────
-def render_analysis():
-    filename      = st.session_state.get("filename", "File name upload")
-    uploaded_file = st.session_state.get("uploaded_file")
-    icon_home     = icon("icon_home_heart.svg")
-
-    # ── Bước 1: Hiện LoadingScreen rồi chạy analysis ────────────────────
-    if not is_analysis_done() and uploaded_file is not None:
-        audio_bytes  = uploaded_file.getvalue()
-        total_chunks = estimate_chunks(audio_bytes, filename, chunk_duration=10)
-
-        loader = LoadingScreen(total_chunks=total_chunks)
-        loader.show(status_text=f"Đang chuẩn bị phân tích '{filename}'...")
-
-        def _on_progress(done, total):
-            loader.update(
-                done=done,
-                total=total,
-                status_text=f"Đang xử lý đoạn {done}/{total}...",
-            )
-
-        run_analysis(
-            audio_bytes=audio_bytes,
-            filename=filename,
-            progress_callback=_on_progress,
-        )
-        loader.done()
-        st.rerun()
-
-    # ── Bước 2: Đọc data ──────────────────────────────────────────────────
-    chunk_scores = get_chunk_scores()
-    raw_score    = st.session_state.get("diem_nghi_ngo", 0.0)
-    kw_list      = st.session_state.get("keywords_count", [])
-
-    transcript = [(c["time_range"], c["text"], c["keywords"][:5]) for c in chunk_scores]
-
-    # ── Bước 3: Build các thành phần HTML ─────────────────────────────────
-    audio_src   = _build_audio_src(uploaded_file, filename)
-    pct_color, badge_bg, badge_color, badge_label = _badge_style(raw_score)
-    pct_display = f"{raw_score:.0%}"
-    chart_html  = build_line_chart_html(chunk_scores)
-
-    VISIBLE_KW      = 5
-    kw_tags_html    = "".join(_kw_tag(l, c) for l, c in kw_list[:VISIBLE_KW])
-    kw_tags_html   += "".join(_kw_tag(l, c, hidden=True) for l, c in kw_list[VISIBLE_KW:])
-    kw_hidden_count = max(0, len(kw_list) - VISIBLE_KW)
-    kw_more_label   = f"Xem thêm {kw_hidden_count} từ khóa" if kw_hidden_count > 0 else ""
-
-    rows_html = "".join(
-        f'<div class="tr-row"><div class="td-time">{t}</div>'
-        f'<div class="td-content">{_highlight_text(txt, kws)}</div></div>'
-        for t, txt, kws in transcript
-    )
-
-    # TODO: thay bằng st.session_state.get("llm_advice", {...})
-    advice_warning     = "Cảnh báo cao! Cuộc gọi này có nhiều dấu hiệu lừa đảo:"
-    advice_bullets     = ["Mạo danh cơ quan công quyền (công an)", "Tạo áp lực khẩn cấp để nạn nhân không kịp suy nghĩ", "Yêu cầu chuyển tiền và cung cấp mã OTP", "Đe dọa bắt giữ nếu không hợp tác"]
-    advice_rec_body    = "KHÔNG chuyển tiền, KHÔNG cung cấp mã OTP. Liên hệ trực tiếp cơ quan công an qua số 113 để xác minh."
-    advice_rec_bullets = ["Cơ quan công an KHÔNG bao giờ yêu cầu chuyển tiền qua điện thoại", "Nếu có vấn đề pháp lý, họ sẽ gửi giấy tờ chính thức hoặc mời trực tiếp", "Tạo áp lực khẩn cấp là chiêu thức điển hình của tội phạm", "Kẻ lừa đảo sợ bạn có thời gian để xác minh thông tin họ"]
-
-    def bullets_html(items):
-        return "".join(f'<div class="advice-bullet"><span class="advice-bullet-dot">•</span><span class="advice-bullet-txt">{b}</span></div>' for b in items)
-
-    kw_more_html = f'<div class="kw-more" id="kw-more-btn" onclick="toggleKwMore()">{kw_more_label}</div>' if kw_more_label else ""
-
-    # ── Bước 4: Render HTML ───────────────────────────────────────────────
-    html = f"""
-{CSS}
+# ── HTML (template: {slot} thay lúc render, {{ }} là ngoặc nhọn thật) ──────
+DASHBOARD_HTML = """
+{css}
 <div class="desktop-2">
   <div class="topbar">
     <div class="topbar-left">
@@ -268,6 +216,7 @@ def render_analysis():
         audio.addEventListener('ended',function(){{iconPlay.style.display='';iconPause.style.display='none';}});
         window.apToggle=function(){{if(audio.paused){{audio.play();iconPlay.style.display='none';iconPause.style.display='';}}else{{audio.pause();iconPlay.style.display='';iconPause.style.display='none';}}}};
         window.apSeek=function(v){{if(audio.duration)audio.currentTime=v/100*audio.duration;}};
+        window.addEventListener('lc-jump',function(e){{audio.currentTime=e.detail.t||0;upd();}});
       }})();
     </script>
   </div>
@@ -311,19 +260,20 @@ def render_analysis():
       </div>
       <div class="advice-card">
         <div class="poppins-title">Lời khuyên</div>
+        {advice_note_html}
         <div class="advice-scroll">
           <div class="advice-box">
             <div class="advice-warning">
               <span class="advice-warning-icon"></span>
               <span class="advice-warning-txt">{advice_warning}</span>
             </div>
-            <div class="advice-bullets">{bullets_html(advice_bullets)}</div>
+            <div class="advice-bullets">{advice_bullets_html}</div>
           </div>
           <div class="advice-rec-box">
             <div class="advice-rec-title">✓ Khuyến nghị:</div>
             <div class="advice-rec-body">{advice_rec_body}</div>
             <div class="advice-rec-why">Tại sao?</div>
-            <div class="advice-bullets">{bullets_html(advice_rec_bullets)}</div>
+            <div class="advice-bullets">{advice_rec_bullets_html}</div>
           </div>
         </div>
       </div>
@@ -335,11 +285,581 @@ def render_analysis():
           <div class="th-cell">Thời gian</div>
           <div class="th-cell">Nội dung</div>
         </div>
-        <div class="tbl-body">{rows_html}</div>
+        {transcript_html}
       </div>
     </div>
   </div>
 </div>
 """
 
-    st.components.v1.html(html, height=900, scrolling=True)
\ No newline at end of file
+
+# ── Helpers ───────────────────────────────────────────────────────────────
+def _highlight_text(text, keywords):
+    """Text transcript → HTML (đã escape), từ khoá bọc trong <span class="kw-hl">."""
+    if not text:
+        return ""
+    result = escape(text)
+    if not keywords:
+        return result
+    for kw in sorted(keywords, key=len, reverse=True):
+        pattern = re.compile(re.escape(escape(kw)), re.IGNORECASE)
+        result = pattern.sub(lambda m: f'<span class="kw-hl">{m.group(0)}</span>', result)
+    return result
+
+
+def _highlight_spans(text, spans, max_keywords=5):
+    """
+    Highlight theo vị trí khớp engine đã ghi (ChunkResult["spans"]):
+    gộp các span chồng nhau rồi cắt text 1 lượt — không regex, không
+    khớp nhầm vào markup <span> của lần thay trước. Text giữa / trong các
+    span được escape (transcript do STT sinh ra, không phải HTML tin cậy).
+    """
+    if not text:
+        return ""
+    if not spans:
+        return escape(text)
+    ranges = sorted((s, e) for s, e, k in spans if k < max_keywords)
+    parts, pos = [], 0
+    cur_s = cur_e = None
+    for s, e in ranges + [(len(text) + 1, len(text) + 1)]:
+        if cur_e is not None and s <= cur_e:
+            cur_e = max(cur_e, e)
+            continue
+        if cur_e is not None:
+            parts.append(escape(text[pos:cur_s]))
+            parts.append(f'<span class="kw-hl">{escape(text[cur_s:cur_e])}</span>')
+            pos = cur_e
+        cur_s, cur_e = s, e
+    parts.append(escape(text[pos:]))
+    return "".join(parts)
+
+
+def _transcript_row_html(idx, chunk):
+    spans = chunk.get("spans")
+    if spans is None:   # ChunkResult cũ chưa có spans
+        content = _highlight_text(chunk["text"], chunk["keywords"][:5])
+    else:
+        content = _highlight_spans(chunk["text"], spans)
+    return (
+        f'<div class="tr-row" data-idx="{idx}"><div class="td-time">{chunk["time_range"]}</div>'
+        f'<div class="td-content">{content}</div></div>'
+    )
+
+
+def _transcript_rows(chunks, offset):
+    """View "transcript" của result_api: HTML cho 1 trang dòng transcript."""
+    return [_transcript_row_html(offset + k, c) for k, c in enumerate(chunks)]
+
+
+register_view("transcript", _transcript_rows)
+
+
+def _kw_tag(label, count, hidden=False):
+    style = ' style="display:none;"' if hidden else ''
+    cls   = 'kw-tag kw-extra' if hidden else 'kw-tag'
+    return (
+        f'<div class="{cls}"{style}>'
+        f'<div class="kw-label">{label}</div>'
+        f'<div class="kw-count"><div class="kw-num">{count}</div></div>'
+        f'</div>'
+    )
+
+
+# Vị trí "element" của audio trong media manager (mỗi session chỉ giữ 1 file)
+_AUDIO_MEDIA_COORDINATES = "analysis_page.audio"
+
+
+def _build_audio_src(uploaded_file, filename):
+    """
+    URL cho thẻ <audio> thay vì nhúng base64 vào HTML — player chỉ tải phần
+    cần seek tới (HTTP Range), payload trang không phình theo file.
+
+    Sidecar chạy → URL theo sha256 nội dung (src/media_api.py): đăng ký 1 lần,
+    rerun không copy / hash lại file. Không có sidecar → media endpoint của
+    Streamlit qua API công khai media_file_mgr.add() (bị dọn sau mỗi lần chạy
+    cả script nên phải add lại mỗi lần vẽ — chỉ xảy ra ở lần chạy đầy đủ,
+    fragment poll không vẽ lại dashboard). Ngoài Streamlit runtime → data URI.
+    """
+    if uploaded_file is None:
+        return ""
+    mime_map = {"mp3":"audio/mpeg","wav":"audio/wav","m4a":"audio/x-m4a",
+                "ogg":"audio/ogg","mp4":"audio/mp4","mpeg4":"audio/mp4"}
+    ext  = filename.rsplit(".", 1)[-1].lower() if "." in filename else "mp3"
+    mime = mime_map.get(ext, "audio/mpeg")
+    audio_hash = st.session_state.get("audio_sha256")
+    if audio_hash:
+        url = publish_audio(audio_hash, ext, mime, uploaded_file.getvalue)
+        if url:
+            return url
+    try:
+        from streamlit import runtime
+        if runtime.exists():
+            url = runtime.get_instance().media_file_mgr.add(
+                uploaded_file.getvalue(), mime, _AUDIO_MEDIA_COORDINATES, file_name=filename,
+            )
+            base_path = (st.get_option("server.baseUrlPath") or "").strip("/")
+            return f"/{base_path}{url}" if base_path else url
+    except Exception as e:
+        print(f"[WARN] Media endpoint unavailable, embedding audio inline: {e}")
+    b64  = base64.b64encode(uploaded_file.getvalue()).decode("utf-8")
+    return f"data:{mime};base64,{b64}"
+
+
+def _badge_style(raw_score):
+    if raw_score < 0.30:
+        return "#22c55e", "#dcfce7", "#22c55e", "An toàn"
+    elif raw_score < 0.60:
+        return "#f59e0b", "#fef3c7", "#f59e0b", "Nghi ngờ"
+    return "#f50000", "#ffd7d7", "#f50000", "Dấu hiệu lừa đảo"
+
+
+# ── Render function ───────────────────────────────────────────────────────
+def _run_job_and_poll(uploaded_file, filename):
+    """
+    Submit job phân tích nền (hoặc gắn lại vào job đang chạy) rồi poll tiến độ.
+
+    Job sống ngoài script run → rerun / reconnect không làm mất tiến độ.
+    Poll bằng fragment chạy lại mỗi PROGRESS_MIN_INTERVAL_S → script thread không
+    bị giữ trong vòng lặp sleep, tương tác của người dùng được xử lý ngay.
+    Job lỗi → ghi vào session_state, KHÔNG tự submit lại cho tới khi người dùng bấm thử lại.
+    """
+    session_id = get_session_id()
+    audio_hash = st.session_state.get("audio_sha256")
+    if not audio_hash:
+        audio_hash = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+        st.session_state["audio_sha256"] = audio_hash
+
+    failure = st.session_state.get("analysis_failed")
+    if failure and failure["audio_sha256"] == audio_hash:
+        st.error(f"Phân tích thất bại: {failure['error']}")
+        if st.button("Thử lại"):
+            st.session_state.pop("analysis_failed", None)
+            st.rerun()
+        return
+
+    runner = get_job_runner()
+    job = runner.get(session_id, audio_hash)
+    if job is None:
+        # File đã phân tích trước đó (bởi bất kỳ ai) → lấy lại ngay, không chạy pipeline
+        store = get_result_store()
+        cached = store.get(audio_hash, DEFAULT_CHUNK_DURATION) if store else None
+        if cached is not None:
+            store_result_in_session(cached)
+            st.rerun()
+
+        try:
+            job = runner.submit(session_id, audio_hash, uploaded_file.getvalue(), filename)
+        except JobQueueFull as e:
+            st.error(str(e))
+            return
+
+    # Lời khuyên LLM của job chạy song song với STT — trang chỉ đọc, không chờ
+    st.session_state["advice_task"] = job.advice
+
+    # Phần nặng (overlay / dashboard tạm) vẽ 1 lần ở lần chạy đầy đủ; fragment
+    # chỉ gửi lại vài element tiến độ nhỏ và gọi st.rerun() khi có chunk mới
+    poll = st.session_state.get("job_poll")
+    if poll is None or poll["job"] is not job:
+        # Update gộp theo nhịp PROGRESS_MIN_INTERVAL_S, giữ qua các nhịp fragment
+        poll = st.session_state["job_poll"] = {"job": job, "progress_sub": job.progress_bus.subscribe()}
+    poll["progress_sub"].poll(force=True)
+    partial = job.partial_chunks()
+    advice_version, advice = job.advice.get()
+    poll["shown"] = (len(partial), advice_version)
+    poll["shown_at"] = time.perf_counter()
+    if not partial:
+        LoadingScreen(total_chunks=job.total).show_frame()
+        _poll_job(filename)
+        return
+
+    _poll_job(filename)
+    _render_dashboard(
+        partial, aggregate_score(verdict_scores(partial)),
+        count_keywords(partial), filename, uploaded_file, advice=advice, partial=True,
+    )
+
+
+@st.fragment(run_every=PROGRESS_MIN_INTERVAL_S)
+def _poll_job(filename):
+    """
+    1 nhịp poll job đang chạy: chỉ vẽ field tiến độ (vòng % / trạng thái / ETA
+    trên overlay, hoặc thanh progress trên dashboard tạm).
+
+    Element trong fragment không được gửi lại ở nhịp sau sẽ bị Streamlit xoá,
+    nên mỗi nhịp gửi lại các field này (vài trăm byte) — khung overlay và
+    iframe dashboard nằm ngoài fragment, chỉ gửi lại khi dữ liệu tạm thật sự đổi.
+    """
+    session_id = get_session_id()
+    audio_hash = st.session_state.get("audio_sha256")
+    runner = get_job_runner()
+    job = runner.get(session_id, audio_hash)
+    poll = st.session_state.get("job_poll")
+    if job is None or poll is None or poll["job"] is not job:
+        st.rerun()   # job đã bị bỏ (hết hạn / huỷ) / đổi job → để render_analysis quyết định lại
+    if job.is_finished():
+        _finish_job(runner, job, session_id, audio_hash)
+        return
+
+    progress_sub = poll["progress_sub"]
+    progress_sub.poll()
+    current = progress_sub.current()
+    shown_chunks = poll["shown"][0]
+    changed = (len(job.partial_chunks()), job.advice.get()[0]) != poll["shown"]
+    if changed and (shown_chunks == 0 or time.perf_counter() - poll["shown_at"] >= PARTIAL_REFRESH_INTERVAL):
+        st.rerun()   # chunk / lời khuyên mới → lần chạy đầy đủ vẽ lại dashboard tạm
+
+    if shown_chunks == 0:
+        LoadingScreen.render_fields({
+            "percent": current.get("percent", 0),
+            "status":  current.get("status") or f"Đang chuẩn bị phân tích '{filename}'...",
+            "eta_s":   current.get("eta_s"),
+        })
+        return
+    eta_text = format_eta(current.get("eta_s"))
+    st.progress(
+        current.get("percent", 0) / 100,
+        text=current.get("status", "") + (f" · {eta_text}" if eta_text else ""),
+    )
+
+
+def _finish_job(runner, job, session_id, audio_hash):
+    """Job xong: ghi kết quả / lỗi vào session_state rồi chạy lại cả trang."""
+    st.session_state.pop("job_poll", None)
+    st.session_state.pop("partial_dashboard", None)
+    if job.status == DONE and job.refining:
+        # Chế độ 2 lượt: đã có kết luận từ bản nhanh, lượt 2 còn chạy → bước 3 poll tiếp
+        st.session_state["refine_job"] = job
+    else:
+        runner.discard(session_id, audio_hash)
+    if job.status == FAILED:
+        st.session_state["analysis_failed"] = {"audio_sha256": audio_hash, "error": job.error}
+    elif job.status == DONE:
+        store_result_in_session(job.result)
+    elif job.status == CANCELLED:
+        return   # session đã rời trang / đổi file — không ghi kết quả dở vào session_state
+    st.rerun()
+
+
+def render_analysis():
+    filename      = st.session_state.get("filename", "File name upload")
+    uploaded_file = st.session_state.get("uploaded_file")
+
+    # ── Bước 1: Chạy analysis nền + poll tiến độ ─────────────────────────
+    if not is_analysis_done() and uploaded_file is not None:
+        _run_job_and_poll(uploaded_file, filename)
+        return
+
+    # ── Bước 2: Đọc data ──────────────────────────────────────────────────
+    chunk_scores = get_chunk_scores()
+    task = _get_advice_task(chunk_scores)
+    if task is None and st.session_state.get("refine_job") is None:
+        _render_result(filename, uploaded_file, st.session_state.get("llm_advice"))
+        return
+
+    # ── Bước 3: Lời khuyên LLM / lượt tinh chỉnh chưa xong → kết quả vẽ 1 lần,
+    #            fragment poll và chạy lại trang khi đổi ─────────────────────
+    refine_job = st.session_state.get("refine_job")
+    refining = refine_job is not None and refine_job.refining
+    if refine_job is not None:
+        version, result = refine_job.latest_result()
+        if version != st.session_state.get("refine_version"):
+            st.session_state["refine_version"] = version
+            store_result_in_session(result)
+    advice_version, latest = task.get() if task is not None else (None, st.session_state.get("llm_advice"))
+    st.session_state["followup_shown"] = (st.session_state.get("refine_version"), advice_version)
+    _poll_followups()
+    if refining:
+        st.caption("Kết luận nhanh — đang tinh chỉnh transcript bằng model chính xác…")
+    _render_result(filename, uploaded_file, latest)
+
+
+def _render_result(filename, uploaded_file, advice):
+    _render_dashboard(
+        get_chunk_scores(),
+        st.session_state.get("diem_nghi_ngo", 0.0),
+        st.session_state.get("keywords_count", []),
+        filename,
+        uploaded_file,
+        result_hash=st.session_state.get("result_hash"),
+        advice=advice,
+    )
+
+
+@st.fragment(run_every=JOB_POLL_INTERVAL)
+def _poll_followups():
+    """
+    1 nhịp poll lời khuyên LLM + lượt tinh chỉnh. Fragment không vẽ gì:
+    có version mới → chạy lại cả trang (dashboard gửi lại đúng 1 lần);
+    xong hết → chốt vào session_state rồi chạy lại lần cuối.
+    """
+    task = st.session_state.get("advice_task")
+    refine_job = st.session_state.get("refine_job")
+    refining = refine_job is not None and refine_job.refining
+    refine_version = refine_job.latest_result()[0] if refine_job is not None else st.session_state.get("refine_version")
+    advice_version = task.get()[0] if task is not None else None
+    finished = task is None or task.is_finished()
+    if (refine_version, advice_version) != st.session_state.get("followup_shown"):
+        st.rerun()
+    if not finished or refining:
+        return
+
+    if refine_job is not None:
+        # job.key là của session đã tạo job — job singleflight có thể do session khác tạo
+        get_job_runner().discard(get_session_id(), st.session_state.get("audio_sha256"))
+        st.session_state.pop("refine_job", None)
+        st.session_state.pop("refine_version", None)
+    if task is not None:
+        st.session_state["llm_advice"] = task.get()[1]
+        st.session_state.pop("advice_task", None)
+    st.session_state.pop("followup_shown", None)
+    st.rerun()   # dừng fragment — lần chạy sau render tĩnh, không poll nữa
+
+
+def _get_advice_task(chunk_scores):
+    """AdviceTask của kết quả hiện tại; None khi lời khuyên đã chốt trong session."""
+    if "llm_advice" in st.session_state:
+        return None
+    task = st.session_state.get("advice_task")
+    if task is None:
+        # Kết quả lấy từ result_store (không qua job) → giải thích ngay trên toàn bộ chunk
+        task = AdviceTask()
+        task.update(chunk_scores, final=True)
+        st.session_state["advice_task"] = task
+    return task
+
+
+def _render_dashboard(chunk_scores, raw_score, kw_list, filename, uploaded_file, result_hash=None, advice=None,
+                      partial=False):
+    """
+    Render dashboard; HTML được memo theo (hash kết quả, filename, LAYOUT_VERSION, lời khuyên)
+    → rerun không đổi dữ liệu chỉ tra cache, không build lại f-string.
+
+    partial=True (kết quả tạm khi job đang chạy): mỗi chunk mới là 1 key mới
+    không bao giờ được đọc lại → không đưa vào RenderCache dùng chung (sẽ đẩy
+    trang kết quả của session khác ra) và không publish lên result_api; chỉ
+    nhớ bản gần nhất trong session, dữ liệu chunk nhúng thẳng vào HTML.
+    """
+    start = time.perf_counter()
+    result_hash = result_hash or content_hash(chunk_scores, raw_score, kw_list)
+    key = (result_hash, filename, LAYOUT_VERSION, content_hash(advice) if advice else None)
+    if partial:
+        memo = st.session_state.get("partial_dashboard")
+        html = memo[1] if memo is not None and memo[0] == key else None
+    else:
+        # Luôn publish (rẻ) — iframe từ HTML cache vẫn fetch được chunk gốc
+        publish_result(result_hash, chunk_scores)
+        html = _dashboard_cache.get(key)
+    cache_state = "hit"
+    if html is None:
+        cache_state = "miss"
+        if partial:
+            html = _build_dashboard_html(chunk_scores, raw_score, kw_list, filename, advice=advice)
+            st.session_state["partial_dashboard"] = (key, html)
+        else:
+            html = _build_dashboard_html(
+                chunk_scores, raw_score, kw_list, filename,
+                view_url(result_hash, "chunks"), view_url(result_hash, "transcript"), advice,
+            )
+            _dashboard_cache.put(key, html)
+    html = html.replace(_AUDIO_SRC_SLOT, _build_audio_src(uploaded_file, filename), 1)
+    observe("page_render_seconds", time.perf_counter() - start, page="analysis", cache=cache_state)
+    set_gauge("page_payload_bytes", len(html.encode("utf-8")), page="analysis")
+    st.components.v1.html(html, height=900, scrolling=True)
+
+
+TRANSCRIPT_HTML = """
+<div class="tbl-body" id="tr-body">
+  <div class="tr-spacer" id="tr-spacer"><div class="tr-window" id="tr-window"></div></div>
+</div>
+<script>
+(function() {{
+  var TOTAL = {n_rows}, PAGE = {transcript_page_size}, OVERSCAN = {transcript_overscan}, EST = {transcript_row_est_px};
+  var SRC   = {src_json};
+  var INIT  = {init_json};
+  var body = document.getElementById('tr-body'),
+      spacer = document.getElementById('tr-spacer'),
+      win = document.getElementById('tr-window');
+  var rows = {{}}, loading = {{}}, heights = [], tops = [], active = -1, queued = false;
+  INIT.forEach(function(h, i) {{ rows[i] = h; }});
+  for (var i = 0; i < TOTAL; i++) heights.push(EST);
+
+  function relayout() {{
+    var o = 0;
+    for (var i = 0; i < TOTAL; i++) {{ tops[i] = o; o += heights[i]; }}
+    spacer.style.height = o + 'px';
+  }}
+  function rowAt(y) {{
+    var lo = 0, hi = TOTAL - 1;
+    while (lo < hi) {{ var mid = (lo + hi + 1) >> 1; if (tops[mid] <= y) lo = mid; else hi = mid - 1; }}
+    return lo;
+  }}
+  function fetchPage(p) {{
+    if (!SRC || loading[p]) return;
+    loading[p] = true;
+    fetch(SRC + '?lo=' + p * PAGE + '&hi=' + (p + 1) * PAGE)
+      .then(function(r) {{ return r.ok ? r.json() : null; }})
+      .then(function(d) {{
+        if (!d) {{ loading[p] = false; return; }}
+        d.items.forEach(function(h, k) {{ rows[d.lo + k] = h; }});
+        schedule();
+      }})
+      .catch(function() {{ loading[p] = false; }});
+  }}
+  function draw() {{
+    queued = false;
+    if (!TOTAL) return;
+    var first = Math.max(0, rowAt(body.scrollTop) - OVERSCAN),
+        last  = Math.min(TOTAL, rowAt(body.scrollTop + body.clientHeight) + 1 + OVERSCAN);
+    var html = '';
+    for (var i = first; i < last; i++) {{
+      if (rows[i] !== undefined) {{ html += rows[i]; continue; }}
+      fetchPage(Math.floor(i / PAGE));
+      html += '<div class="tr-row tr-pending" data-idx="' + i + '" style="height:' + EST + 'px">' +
+              '<div class="td-time"></div><div class="td-content">Đang tải…</div></div>';
+    }}
+    win.innerHTML = html;
+    // Đo chiều cao thật của các dòng đã có nội dung → cập nhật layout
+    var changed = false;
+    for (var k = 0; k < win.children.length; k++) {{
+      var idx = first + k, h = win.children[k].offsetHeight;
+      if (rows[idx] !== undefined && h && h !== heights[idx]) {{ heights[idx] = h; changed = true; }}
+    }}
+    if (changed) relayout();
+    win.style.top = tops[first] + 'px';
+    var el = active >= 0 && win.querySelector('[data-idx="' + active + '"]');
+    if (el) el.classList.add('tr-active');
+  }}
+  function schedule() {{
+    if (queued) return;
+    queued = true;
+    window.requestAnimationFrame(draw);
+  }}
+
+  relayout();
+  draw();
+  body.addEventListener('scroll', schedule, {{passive: true}});
+  window.addEventListener('resize', schedule);
+  window.addEventListener('lc-jump', function(e) {{
+    active = Math.min(Math.max(0, e.detail.idx), TOTAL - 1);
+    body.scrollTop = tops[active];
+    draw();
+    body.scrollTop = tops[active];   // layout có thể đổi sau khi đo dòng thật
+    draw();
+    body.scrollIntoView({{block: 'nearest', behavior: 'smooth'}});
+  }});
+}})();
+</script>"""
+
+_TRANSCRIPT_TEMPLATE = PageTemplate(TRANSCRIPT_HTML, name="analysis_transcript", static={
+    "transcript_page_size":   str(TRANSCRIPT_PAGE_SIZE),
+    "transcript_overscan":    str(TRANSCRIPT_OVERSCAN),
+    "transcript_row_est_px":  str(TRANSCRIPT_ROW_EST_PX),
+})
+
+
+def _build_transcript_html(n_rows, initial_rows, rows_url):
+    """
+    Bảng transcript ảo hoá (chiều cao dòng thay đổi được):
+      - spacer cao bằng tổng chiều cao ước lượng/đo được của mọi dòng
+      - window tuyệt đối chỉ chứa dòng trong khung nhìn ± overscan
+      - dòng chưa có HTML → placeholder, fetch trang TRANSCRIPT_PAGE_SIZE dòng từ rows_url
+      - event "lc-jump" (click điểm trên chart) → cuộn tới dòng + đánh dấu
+    """
+    # "</" trong câu thoại không được đóng sớm thẻ <script>
+    init_json = json.dumps(initial_rows, ensure_ascii=False).replace("</", "<\\/")
+    src_json  = json.dumps(rows_url)
+    return _TRANSCRIPT_TEMPLATE.render(n_rows=n_rows, src_json=src_json, init_json=init_json)
+
+
+# Lời khuyên mặc định khi chưa có / không gọi được LLM
+DEFAULT_ADVICE_WARNING     = "Cảnh báo cao! Cuộc gọi này có nhiều dấu hiệu lừa đảo:"
+DEFAULT_ADVICE_BULLETS     = ["Mạo danh cơ quan công quyền (công an)", "Tạo áp lực khẩn cấp để nạn nhân không kịp suy nghĩ", "Yêu cầu chuyển tiền và cung cấp mã OTP", "Đe dọa bắt giữ nếu không hợp tác"]
+DEFAULT_ADVICE_REC_BODY    = "KHÔNG chuyển tiền, KHÔNG cung cấp mã OTP. Liên hệ trực tiếp cơ quan công an qua số 113 để xác minh."
+DEFAULT_ADVICE_REC_BULLETS = ["Cơ quan công an KHÔNG bao giờ yêu cầu chuyển tiền qua điện thoại", "Nếu có vấn đề pháp lý, họ sẽ gửi giấy tờ chính thức hoặc mời trực tiếp", "Tạo áp lực khẩn cấp là chiêu thức điển hình của tội phạm", "Kẻ lừa đảo sợ bạn có thời gian để xác minh thông tin họ"]
+_ADVICE_PENDING            = "…"   # field chưa stream tới
+
+
+def _advice_fields(advice):
+    """
+    Lời khuyên LLM (llm_advice) → (warning, bullets, rec_body, rec_bullets, note) đã escape HTML.
+    Thiếu field nào thì dùng nội dung mặc định của field đó.
+    """
+    if not advice:
+        return (DEFAULT_ADVICE_WARNING, DEFAULT_ADVICE_BULLETS,
+                DEFAULT_ADVICE_REC_BODY, DEFAULT_ADVICE_REC_BULLETS, "")
+    if advice.get("partial"):
+        # Đang stream lượt đầu: field chưa tới → chỗ trống, không trộn với nội dung mặc định
+        return (
+            escape(advice.get("summary") or _ADVICE_PENDING),
+            [],
+            escape(advice.get("recommendation") or _ADVICE_PENDING),
+            _split_sentences(advice.get("reason")),
+            "Đang tạo lời khuyên…",
+        )
+    bullets = advice.get("signals") or advice.get("loai_lua_dao") or []
+    if advice.get("degraded"):
+        note = "Lời khuyên tự động theo từ khoá — AI chưa kịp phân tích trong thời gian cho phép."
+    elif advice.get("provisional"):
+        note = f"Nhận định tạm từ {advice.get('n_chunks', 0)} đoạn đầu — đang cập nhật…"
+    else:
+        note = ""
+    return (
+        escape(advice.get("summary") or DEFAULT_ADVICE_WARNING),
+        [escape(str(b)) for b in bullets] or DEFAULT_ADVICE_BULLETS,
+        escape(advice.get("recommendation") or DEFAULT_ADVICE_REC_BODY),
+        _split_sentences(advice.get("reason")) or DEFAULT_ADVICE_REC_BULLETS,
+        note,
+    )
+
+
+def _split_sentences(text):
+    return [escape(r) for r in re.split(r"(?<=[.!?])\s+", text or "") if r.strip()]
+
+
+@timed("html_analysis_page")
+def _build_dashboard_html(chunk_scores, raw_score, kw_list, filename, data_url="", rows_url="", advice=None):
+    # ── Bước 3: Build các thành phần HTML ─────────────────────────────────
+    audio_src   = _AUDIO_SRC_SLOT
+    pct_color, badge_bg, badge_color, badge_label = _badge_style(raw_score)
+    pct_display = f"{raw_score:.0%}"
+    chart_html  = build_line_chart_html(chunk_scores, data_url=data_url)
+
+    VISIBLE_KW      = 5
+    kw_tags_html    = "".join(_kw_tag(l, c) for l, c in kw_list[:VISIBLE_KW])
+    kw_tags_html   += "".join(_kw_tag(l, c, hidden=True) for l, c in kw_list[VISIBLE_KW:])
+    kw_hidden_count = max(0, len(kw_list) - VISIBLE_KW)
+    kw_more_label   = f"Xem thêm {kw_hidden_count} từ khóa" if kw_hidden_count > 0 else ""
+
+    # Có sidecar → chỉ nhúng trang đầu, phần còn lại fetch khi cuộn tới;
+    # không có → nhúng đủ dòng (payload theo độ dài cuộc gọi, DOM vẫn cố định)
+    n_rows       = len(chunk_scores)
+    initial_rows = _transcript_rows(chunk_scores[:TRANSCRIPT_PAGE_SIZE] if rows_url else chunk_scores, 0)
+    transcript_html = _build_transcript_html(n_rows, initial_rows, rows_url)
+
+    advice_warning, advice_bullets, advice_rec_body, advice_rec_bullets, advice_note = _advice_fields(advice)
+
+    def bullets_html(items):
+        return "".join(f'<div class="advice-bullet"><span class="advice-bullet-dot">•</span><span class="advice-bullet-txt">{b}</span></div>' for b in items)
+
+    kw_more_html = f'<div class="kw-more" id="kw-more-btn" onclick="toggleKwMore()">{kw_more_label}</div>' if kw_more_label else ""
+
+    # ── Bước 4: Render HTML ───────────────────────────────────────────────
+    return _get_dashboard_template().render(
+        audio_src=audio_src,
+        filename=filename,
+        pct_color=pct_color,
+        pct_display=pct_display,
+        badge_bg=badge_bg,
+        badge_color=badge_color,
+        badge_label=badge_label,
+        chart_html=chart_html,
+        kw_tags_html=kw_tags_html,
+        kw_more_html=kw_more_html,
+        kw_hidden_count=kw_hidden_count,
+        advice_note_html=f'<div class="advice-note">{advice_note}</div>' if advice_note else "",
+        advice_warning=advice_warning,
+        advice_bullets_html=bullets_html(advice_bullets),
+        advice_rec_body=advice_rec_body,
+        advice_rec_bullets_html=bullets_html(advice_rec_bullets),
+        transcript_html=transcript_html,
+    )
@@ -8,6 +8,8 @@ Trang 1 – Home: CSS, HTML và logic render.
 import streamlit as st
 from src.assets_loader import icon, deco
 from src.upload_handler import render_upload_widget, get_upload_error
+from src.metrics import set_gauge, span
+from src.page_template import PageTemplate
 
 # ── CSS ───────────────────────────────────────────────────────────────────
 CSS = """
@@ -177,16 +179,30 @@ HTML = """
 """
 
 
+# ── Template biên dịch 1 lần mỗi process ──────────────────────────────────
+# Trang home không có slot động: CSS + asset được gộp và minify sẵn
+_template = None
+
+
+def _get_template() -> PageTemplate:
+    global _template
+    if _template is None:
+        _template = PageTemplate(HTML, name="home", static={
+            "css":         CSS,
+            "icon_upload": icon("icon_upload.svg"),
+            "deco_purple": deco("deco_purple.png", mime="image/png"),
+            "deco_green":  deco("deco_green.png",  mime="image/png"),
+            "deco_orange": deco("deco_orange.png", mime="image/png"),
+        })
+    return _template
+
+
 # ── Render function ───────────────────────────────────────────────────────
 def render_home():
-    html = HTML.format(
-        css=CSS,
-        icon_upload=icon("icon_upload.svg"),
-        deco_purple=deco("deco_purple.png", mime="image/png"),
-        deco_green=deco("deco_green.png",   mime="image/png"),
-        deco_orange=deco("deco_orange.png", mime="image/png"),
-    )
+    with span("html_home_page"):
+        html = _get_template().render()
 
+    set_gauge("page_payload_bytes", len(html.encode("utf-8")), page="home")
     st.components.v1.html(html, height=900, scrolling=True)
     render_upload_widget()
 